@@ -1,9 +1,8 @@
 import streamlit as st
-from utils.pdf_upload import process_document
+from utils.ingestion import ingestion_queue, ACTIVE_STATUSES
 from utils.request_rag import initialize_rag_instance
 from utils.request_rag import call_rag_api
 from utils.chat import (
-    summarize_document, 
     get_chat_response,
     document_based_qa_with_memory, 
     stream_chat_response_with_memory,
@@ -11,7 +10,7 @@ from utils.chat import (
     process_rag_response
 )
 from utils.sidebar import render_sidebar, save_message_to_db, save_document_to_db, load_session_data
-import requests
+from utils.http_client import upstage_client
 import json
 import time
 import os
@@ -23,6 +22,7 @@ load_dotenv()
 if 'initialized' not in st.session_state:
     st.session_state.initialized = True
     initialize_rag_instance()
+    ingestion_queue.start()
 
 # Page & Session setup
 st.set_page_config(
@@ -38,6 +38,10 @@ if "processed_pdf" not in st.session_state:
     st.session_state.processed_pdf = None
 if "pdf_summary" not in st.session_state:
     st.session_state.pdf_summary = None
+if "document_id" not in st.session_state:
+    st.session_state.document_id = None
+if "pending_ingestions" not in st.session_state:
+    st.session_state.pending_ingestions = {}  # {세션 ID: PDF 처리 작업과 처리가 끝난 뒤 이어서 할 일}
 
 # 사이드바 렌더링
 render_sidebar()
@@ -54,15 +58,220 @@ if "current_session_id" in st.session_state:
 
 # API 설정
 API_KEY = os.getenv("UPSTAGE_API_KEY")
-API_URL = os.getenv("UPSTAGE_API_URL", "https://api.upstage.ai/v1")
 
 if not API_KEY:
     st.error("UPSTAGE_API_KEY 환경 변수가 설정되지 않았습니다.")
     st.stop()
 
+JOB_POLL_INTERVAL = 1.0  # PDF 처리 작업 상태 조회 간격(초)
+
+def start_ingestion(uploaded_file, force_ocr, query=None, use_streaming=True, use_rag=True):
+    """
+    PDF 처리 작업을 등록하고, 처리가 끝난 뒤 이어서 할 일을 세션 상태에 저장합니다.
+    query가 있으면 처리가 끝난 뒤 그 질문에 답변하고, 없으면 문서 요약을 안내합니다.
+    """
+    session_id = st.session_state.current_session_id
+    job_id = ingestion_queue.enqueue(session_id, uploaded_file.name, uploaded_file.read(), force_ocr)
+    st.session_state.pending_ingestions[session_id] = {
+        "job_id": job_id,
+        "query": query,
+        "history_length": len(st.session_state.messages) - 1,  # 업로드 메시지 이전까지의 대화
+        "use_streaming": use_streaming,
+        "use_rag": use_rag
+    }
+
+def check_ingestion(session_id):
+    """
+    세션의 PDF 처리 작업 상태를 한 번 조회합니다. (기다리지 않음 - 진행 중이면 다음 실행에서 다시 조회)
+    
+    Returns:
+        tuple: (처리 중인 작업 - 없으면 None, 끝난 작업의 (작업, 이어서 할 일) - 없으면 None)
+    """
+    if not session_id:
+        return None, None
+    
+    pending = st.session_state.pending_ingestions.get(session_id)
+    if pending:
+        job = ingestion_queue.get_job(pending["job_id"])
+    else:
+        # 새로고침 등으로 세션 상태가 초기화된 경우 DB에 남아 있는 작업을 이어서 표시
+        job = ingestion_queue.get_active_job(session_id)
+        if job is None:
+            return None, None
+        pending = {"job_id": job["job_id"], "resumed": True}
+        st.session_state.pending_ingestions[session_id] = pending
+    
+    if job and job["status"] in ACTIVE_STATUSES:
+        return job, None
+    del st.session_state.pending_ingestions[session_id]
+    return None, (job, pending)
+
+def show_ingestion_progress(job):
+    """
+    백그라운드 PDF 처리 작업의 현재 진행률을 표시합니다.
+    (작업은 worker에서 처리되므로 새로고침이나 연결 종료로 중단되지 않음)
+    """
+    if job['status'] == "queued":
+        st.text(f"⏳ 처리 대기 중: {job['filename']}")
+    else:
+        st.text(job['message'] or f"📄 PDF 분석 중: {job['filename']}")
+    st.progress(min(job['progress'] or 0.0, 1.0))
+
+def load_ingested_document(job):
+    """완료된 작업의 문서를 현재 세션 상태로 불러옵니다. 실패하면 None을 반환합니다."""
+    if not job or job['status'] != "done":
+        return None
+    
+    from utils.database import db
+    document = db.get_document_by_id(job['document_id'])
+    if document:
+        st.session_state.processed_pdf = document['content']
+        st.session_state.pdf_summary = document['summary']
+        st.session_state.document_id = document['id']
+    return document
+
+def show_finished_ingestion(job, pending, document):
+    """끝난 PDF 처리 작업의 경고/오류를 표시하고, 성공했으면 이어서 질문에 답변하거나 문서 요약을 안내합니다."""
+    if pending.get("resumed") and document and not job['notices']:
+        return
+    
+    with st.chat_message("assistant"):
+        if job:
+            for notice in job['notices']:
+                st.warning(notice)
+        if not document:
+            st.error(f"PDF 처리 중 오류가 발생했습니다: {job['error'] if job and job['error'] else '작업을 찾을 수 없습니다.'}")
+            return
+        
+        try:
+            if pending.get("query"):
+                history = st.session_state.messages[:pending["history_length"]]
+                answer_user_input(history, pending["query"], pending["use_streaming"], pending["use_rag"])
+            elif not pending.get("resumed"):
+                announce_ingested_document(document)
+        except Exception as e:
+            st.error(f"처리 중 오류가 발생했습니다: {str(e)}")
+
+def announce_ingested_document(document):
+    """처리가 끝난 문서의 요약과 안내 메시지를 표시하고 대화 기록에 저장합니다."""
+    summary = document['summary']
+    
+    # 자동 응답 생성
+    auto_response = f"""📄 **PDF 분석 완료!**
+
+**파일:** {document['filename']}
+
+**문서 요약:**
+{summary}
+
+이제 이 문서에 대해 질문하실 수 있습니다. 예를 들어:
+- "이 문서의 핵심 내용을 설명해줘"
+- "주요 결론이 무엇인가요?"
+- "이 문서에서 중요한 데이터는?"
+
+RAG 기능이 활성화되어 관련된 다른 자료도 함께 검색하여 답변드립니다."""
+
+    st.markdown(auto_response)
+
+    st.session_state.messages.append({
+        "role": "assistant", 
+        "content": auto_response
+    })
+    save_message_to_db("assistant", auto_response)
+
+def answer_user_input(history, user_input, use_streaming, use_rag):
+    """
+    사용자 질문에 대한 답변을 생성하여 표시하고 대화 기록에 저장합니다.
+    
+    Args:
+        history: 이전 대화 기록 (현재 질문 제외)
+        user_input: 사용자 질문
+        use_streaming: 스트리밍 응답 여부
+        use_rag: RAG 사용 여부
+    """
+    if use_streaming:
+        # 기본 시스템 프롬프트 정의
+        system_prompt = """당신은 도움이 되는 AI 어시스턴트입니다. 
+이전 대화 내용을 참고하여 사용자의 질문에 정확하고 유용한 답변을 한국어로 제공해주세요.
+대화의 맥락을 이해하고 연속성 있는 답변을 해주세요.
+모르는 내용에 대해서는 솔직하게 모른다고 답변해주세요."""
+
+        # 채팅 응답 생성 (RAG 포함)
+        response_placeholder = st.empty()
+        full_response = ""
+
+        with st.spinner("답변을 생성하는 중..."):
+            st.session_state.turn_timings = {}
+            for chunk in stream_chat_response_with_memory(
+                history,
+                system_prompt,
+                user_input,
+                use_rag=use_rag,
+                pdf_summary=st.session_state.processed_pdf if hasattr(st.session_state, 'processed_pdf') else None,
+                timings=st.session_state.turn_timings,
+                session_id=st.session_state.get("current_session_id"),
+                document_id=st.session_state.get("document_id")
+            ):
+                full_response += chunk
+                response_placeholder.markdown(full_response + "▌")
+
+        response_placeholder.markdown(full_response)
+        show_turn_timings(st.session_state.turn_timings)
+
+        st.session_state.messages.append({
+            "role": "assistant", 
+            "content": full_response
+        })
+        save_message_to_db("assistant", full_response)
+    else:
+        # 일반 응답
+        with st.spinner("답변을 생성하는 중..."):
+            system_prompt = """당신은 도움이 되는 AI 어시스턴트입니다. 
+이전 대화 내용을 참고하여 사용자의 질문에 정확하고 유용한 답변을 한국어로 제공해주세요.
+대화의 맥락을 이해하고 연속성 있는 답변을 해주세요.
+모르는 내용에 대해서는 솔직하게 모른다고 답변해주세요."""
+
+            st.session_state.turn_timings = {}
+
+            response = get_chat_response(
+                history,
+                system_prompt,
+                user_input,
+                use_rag=use_rag,
+                pdf_summary=st.session_state.processed_pdf if hasattr(st.session_state, 'processed_pdf') else None,
+                timings=st.session_state.turn_timings,
+                session_id=st.session_state.get("current_session_id"),
+                document_id=st.session_state.get("document_id")
+            )
+
+            if response:
+                full_response = response["response"]
+                if response["reference"]:
+                    full_response += f"\n\n---\n\n참조 문서 요약:\n{response['reference']}"
+
+                st.markdown(full_response)
+
+                st.session_state.messages.append({
+                    "role": "assistant", 
+                    "content": full_response
+                })
+                save_message_to_db("assistant", full_response)
+            else:
+                st.error("응답을 생성하는 중에 오류가 발생했습니다.")
+
+def show_turn_timings(timings):
+    """스트리밍 응답의 첫 토큰까지 걸린 시간과 전체 시간을 표시합니다."""
+    if "first_token" in timings:
+        st.caption(f"⏱️ 첫 응답 {timings['first_token']:.1f}초 · 전체 {timings.get('total', 0):.1f}초")
+
 def main():
     st.title("🤖 AI Document Assistant")
     
+    # PDF 처리 작업 상태를 한 번 조회 (끝났으면 문서를 불러와 아래 문서 상태바에 반영)
+    current_session_id = st.session_state.get("current_session_id")
+    active_job, finished = check_ingestion(current_session_id)
+    finished_document = load_ingested_document(finished[0]) if finished else None
+    
     # 현재 활성 문서 상태 표시
     if hasattr(st.session_state, 'processed_pdf') and st.session_state.processed_pdf:
         # 현재 세션의 문서 정보 가져오기
@@ -109,6 +318,16 @@ def main():
         for message in st.session_state.messages:
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
+        
+        # PDF 처리 작업 진행률 또는 처리가 끝난 뒤의 답변/안내
+        if active_job:
+            with st.chat_message("assistant"):
+                show_ingestion_progress(active_job)
+        elif finished:
+            show_finished_ingestion(*finished, finished_document)
+    
+    # 처리 중인 작업이 있으면 화면을 모두 그린 뒤 다시 실행하여 상태 갱신 (파일 끝에서)
+    st.session_state.poll_ingestion = active_job is not None
 
     # 입력 폼
     with st.form("chat_pdf_form", clear_on_submit=True):
@@ -183,98 +402,14 @@ def main():
             })
             save_message_to_db("user", user_message)
             
-            with st.chat_message("assistant"):
-                try:
-                    # PDF 처리 (새로 업로드된 경우)
-                    if uploaded_file:
-                        with st.spinner("Analyzing PDF..."):
-                            file_bytes = uploaded_file.read()
-                            plain_text, error = process_document(file_bytes, force_ocr)
-                            
-                            if error:
-                                st.error(f"PDF 처리 중 오류가 발생했습니다: {error}")
-                                st.stop()
-                            
-                            if plain_text:
-                                st.session_state.processed_pdf = plain_text
-                                # 기존 요약 함수 사용
-                                summary = summarize_document(plain_text)
-                                st.session_state.pdf_summary = summary
-                                
-                                # 문서 정보를 DB에 저장
-                                current_session_id = st.session_state.get("current_session_id")
-                                if current_session_id:
-                                    from utils.database import db
-                                    db.save_document(
-                                        session_id=current_session_id,
-                                        filename=uploaded_file.name,
-                                        content=plain_text,
-                                        summary=summary
-                                    )
-                    
-                    # 문서 기반 질문 답변
-                    if use_streaming:
-                        # 기본 시스템 프롬프트 정의
-                        system_prompt = """당신은 도움이 되는 AI 어시스턴트입니다. 
-이전 대화 내용을 참고하여 사용자의 질문에 정확하고 유용한 답변을 한국어로 제공해주세요.
-대화의 맥락을 이해하고 연속성 있는 답변을 해주세요.
-모르는 내용에 대해서는 솔직하게 모른다고 답변해주세요."""
-                        
-                        # 채팅 응답 생성 (RAG 포함)
-                        response_placeholder = st.empty()
-                        full_response = ""
-                        
-                        with st.spinner("답변을 생성하는 중..."):
-                            for chunk in stream_chat_response_with_memory(
-                                st.session_state.messages[:-1], 
-                                system_prompt, 
-                                user_input,
-                                use_rag=use_rag,
-                                pdf_summary=st.session_state.processed_pdf if hasattr(st.session_state, 'processed_pdf') else None
-                            ):
-                                full_response += chunk
-                                response_placeholder.markdown(full_response + "▌")
-                        
-                        response_placeholder.markdown(full_response)
-                        
-                        st.session_state.messages.append({
-                            "role": "assistant", 
-                            "content": full_response
-                        })
-                        save_message_to_db("assistant", full_response)
-                    else:
-                        # 일반 응답
-                        with st.spinner("문서 기반 답변을 생성하는 중..."):
-                            system_prompt = """당신은 도움이 되는 AI 어시스턴트입니다. 
-이전 대화 내용을 참고하여 사용자의 질문에 정확하고 유용한 답변을 한국어로 제공해주세요.
-대화의 맥락을 이해하고 연속성 있는 답변을 해주세요.
-모르는 내용에 대해서는 솔직하게 모른다고 답변해주세요."""
-                            
-                            response = get_chat_response(
-                                st.session_state.messages[:-1],
-                                system_prompt,
-                                user_input,
-                                use_rag=use_rag,
-                                pdf_summary=st.session_state.processed_pdf if hasattr(st.session_state, 'processed_pdf') else None
-                            )
-                            
-                            if response:
-                                full_response = response["response"]
-                                if response["reference"]:
-                                    full_response += f"\n\n---\n\n참조 문서 요약:\n{response['reference']}"
-                                
-                                st.markdown(full_response)
-                                
-                                st.session_state.messages.append({
-                                    "role": "assistant", 
-                                    "content": full_response
-                                })
-                                save_message_to_db("assistant", full_response)
-                            else:
-                                st.error("응답을 생성하는 중에 오류가 발생했습니다.")
-                    
-                except Exception as e:
-                    st.error(f"처리 중 오류가 발생했습니다: {str(e)}")
+            # PDF 처리는 백그라운드 작업으로 등록 (파싱/요약 후 DB에 저장) - 진행 상황은 다음 실행부터 표시
+            try:
+                start_ingestion(uploaded_file, force_ocr, query=user_input, use_streaming=use_streaming, use_rag=use_rag)
+            except Exception as e:
+                with st.chat_message("assistant"):
+                    st.error(f"PDF 처리 중 오류가 발생했습니다: {str(e)}")
+            else:
+                st.rerun()
         
         elif not has_pdf and has_text:
             # 케이스 2: 텍스트만 입력
@@ -289,66 +424,7 @@ def main():
             
             with st.chat_message("assistant"):
                 try:
-                    if use_streaming:
-                        # 기본 시스템 프롬프트 정의
-                        system_prompt = """당신은 도움이 되는 AI 어시스턴트입니다. 
-이전 대화 내용을 참고하여 사용자의 질문에 정확하고 유용한 답변을 한국어로 제공해주세요.
-대화의 맥락을 이해하고 연속성 있는 답변을 해주세요.
-모르는 내용에 대해서는 솔직하게 모른다고 답변해주세요."""
-                        
-                        # 채팅 응답 생성 (RAG 포함)
-                        response_placeholder = st.empty()
-                        full_response = ""
-                        
-                        with st.spinner("답변을 생성하는 중..."):
-                            for chunk in stream_chat_response_with_memory(
-                                st.session_state.messages[:-1],
-                                system_prompt,
-                                user_input,
-                                use_rag=use_rag,
-                                pdf_summary=st.session_state.processed_pdf if hasattr(st.session_state, 'processed_pdf') else None
-                            ):
-                                full_response += chunk
-                                response_placeholder.markdown(full_response + "▌")
-                        
-                        response_placeholder.markdown(full_response)
-                        
-                        st.session_state.messages.append({
-                            "role": "assistant", 
-                            "content": full_response
-                        })
-                        save_message_to_db("assistant", full_response)
-                    else:
-                        # 일반 응답
-                        with st.spinner("답변을 생성하는 중..."):
-                            system_prompt = """당신은 도움이 되는 AI 어시스턴트입니다. 
-이전 대화 내용을 참고하여 사용자의 질문에 정확하고 유용한 답변을 한국어로 제공해주세요.
-대화의 맥락을 이해하고 연속성 있는 답변을 해주세요.
-모르는 내용에 대해서는 솔직하게 모른다고 답변해주세요."""
-                            
-                            response = get_chat_response(
-                                st.session_state.messages[:-1],
-                                system_prompt,
-                                user_input,
-                                use_rag=use_rag,
-                                pdf_summary=st.session_state.processed_pdf if hasattr(st.session_state, 'processed_pdf') else None
-                            )
-                            
-                            if response:
-                                full_response = response["response"]
-                                if response["reference"]:
-                                    full_response += f"\n\n---\n\n참조 문서 요약:\n{response['reference']}"
-                                
-                                st.markdown(full_response)
-                                
-                                st.session_state.messages.append({
-                                    "role": "assistant", 
-                                    "content": full_response
-                                })
-                                save_message_to_db("assistant", full_response)
-                            else:
-                                st.error("응답을 생성하는 중에 오류가 발생했습니다.")
-                    
+                    answer_user_input(st.session_state.messages[:-1], user_input, use_streaming, use_rag)
                 except Exception as e:
                     st.error(f"처리 중 오류가 발생했습니다: {str(e)}")
         
@@ -364,61 +440,14 @@ def main():
             })
             save_message_to_db("user", user_message)
             
-            with st.chat_message("assistant"):
-                try:
-                    # PDF 처리
-                    with st.spinner("PDF 분석 중..."):
-                        file_bytes = uploaded_file.read()
-                        plain_text, error = process_document(file_bytes, force_ocr)
-                        
-                        if error:
-                            st.error(f"PDF 처리 중 오류가 발생했습니다: {error}")
-                            st.stop()
-                        
-                        if plain_text:
-                            st.session_state.processed_pdf = plain_text
-                            # 문서 요약 생성
-                            summary = summarize_document(plain_text)
-                            st.session_state.pdf_summary = summary
-                            
-                            # 문서 정보를 DB에 저장
-                            current_session_id = st.session_state.get("current_session_id")
-                            if current_session_id:
-                                from utils.database import db
-                                db.save_document(
-                                    session_id=current_session_id,
-                                    filename=uploaded_file.name,
-                                    content=plain_text,
-                                    summary=summary
-                                )
-                            
-                            # 자동 응답 생성
-                            auto_response = f"""📄 **PDF 분석 완료!**
-
-**파일:** {uploaded_file.name}
-
-**문서 요약:**
-{summary}
-
-이제 이 문서에 대해 질문하실 수 있습니다. 예를 들어:
-- "이 문서의 핵심 내용을 설명해줘"
-- "주요 결론이 무엇인가요?"
-- "이 문서에서 중요한 데이터는?"
-
-RAG 기능이 활성화되어 관련된 다른 자료도 함께 검색하여 답변드립니다."""
-                            
-                            st.markdown(auto_response)
-                            
-                            st.session_state.messages.append({
-                                "role": "assistant", 
-                                "content": auto_response
-                            })
-                            save_message_to_db("assistant", auto_response)
-                        else:
-                            st.error("PDF에서 텍스트를 추출할 수 없습니다.")
-                    
-                except Exception as e:
+            # PDF 처리는 백그라운드 작업으로 등록 (파싱/요약 후 DB에 저장) - 진행 상황은 다음 실행부터 표시
+            try:
+                start_ingestion(uploaded_file, force_ocr)
+            except Exception as e:
+                with st.chat_message("assistant"):
                     st.error(f"PDF 처리 중 오류가 발생했습니다: {str(e)}")
+            else:
+                st.rerun()
         
         else:
             # 케이스 4: 아무것도 입력하지 않음
@@ -436,6 +465,7 @@ with col1:
         st.session_state.messages = []
         st.session_state.processed_pdf = None
         st.session_state.pdf_summary = None
+        st.session_state.document_id = None
         # DB에서도 현재 세션의 메시지만 삭제
         current_session_id = st.session_state.get("current_session_id")
         if current_session_id:
@@ -501,12 +531,8 @@ def search_rag_documents(query):
 def summarize_document_content(content):
     """문서 내용을 간단히 요약합니다."""
     try:
-        response = requests.post(
-            f"{API_URL}/chat/completions",
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            },
+        response = upstage_client.post(
+            "chat/completions",
             json={
                 "model": "solar-pro-preview",
                 "messages": [
@@ -524,3 +550,7 @@ def summarize_document_content(content):
     except Exception as e:
         return "문서 요약을 생성할 수 없습니다."
 
+# PDF 처리 작업이 진행 중이면 잠시 후 다시 실행 (실행 중 대기하지 않고 실행마다 한 번씩 상태 조회)
+if st.session_state.get("poll_ingestion"):
+    time.sleep(JOB_POLL_INTERVAL)
+    st.rerun()
@@ -1,3 +1,3 @@
-from .main import rag
+from .main import rag, load_documents_from_directory
 from .embedding_manager import EmbeddingManager
-__all__ = ['rag', 'EmbeddingManager']   
+__all__ = ['rag', 'EmbeddingManager', 'load_documents_from_directory']
\ No newline at end of file
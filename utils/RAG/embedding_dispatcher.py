@@ -0,0 +1,168 @@
+import time
+import random
+import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ..http_client import upstage_client
+from ..text_utils import estimate_tokens
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class EmbeddingDispatcher:
+    """
+    임베딩 API 배치 요청을 제한된 worker pool로 병렬 처리하는 디스패처
+
+    - 입력 수와 추정 토큰 수 기준으로 배치를 구성
+    - 429/5xx 및 연결 오류는 지터가 포함된 지수 백오프로 재시도 (Retry-After 헤더 우선)
+    - 배치가 끝날 때마다 on_batch_done 콜백을 호출하여 결과를 바로 저장할 수 있게 함
+      (EmbeddingManager는 이 콜백으로 저장소에 기록하므로 중단된 수집은 재실행 시 남은 배치만 처리)
+    """
+
+    def __init__(
+        self,
+        api_url,
+        api_key,
+        model,
+        max_workers=4,
+        max_batch_texts=100,
+        max_batch_tokens=200000,
+        max_retries=5,
+        backoff_base=1.0,
+        backoff_max=30.0,
+        timeout=60
+    ):
+        """
+        api_url: 임베딩 API 주소 (로컬 스텁 서버 주소로 교체 가능)
+        api_key: Upstage API 키
+        model: 임베딩 모델 이름
+        max_workers: 동시에 처리할 최대 요청 수
+        max_batch_texts: 배치당 최대 텍스트 수
+        max_batch_tokens: 배치당 최대 추정 토큰 수
+        max_retries: 배치당 최대 재시도 횟수
+        backoff_base, backoff_max: 재시도 대기 시간(초)의 기준값과 상한
+        timeout: 요청 타임아웃(초)
+        """
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.max_workers = max_workers
+        self.max_batch_texts = max_batch_texts
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+
+    def make_batches(self, texts):
+        """
+        텍스트 인덱스를 텍스트 수와 추정 토큰 수 제한에 맞춰 배치로 묶습니다.
+
+        Returns:
+            [[인덱스, ...], ...] 형태의 배치 리스트
+        """
+        batches = []
+        current = []
+        current_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (len(current) >= self.max_batch_texts or current_tokens + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _backoff(self, attempt, response=None):
+        """재시도 전 대기 시간 계산 (Retry-After 헤더가 있으면 우선 사용)"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def embed_batch(self, batch_texts):
+        """
+        배치 하나를 요청하고, 일시적 오류는 재시도합니다.
+
+        Returns:
+            임베딩 리스트 (입력 순서와 동일)
+
+        Raises:
+            RuntimeError: 재시도 후에도 실패한 경우
+        """
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                # 연결 풀은 공용 클라이언트와 공유하고, 재시도는 배치 단위로 여기서 처리
+                response = upstage_client.post(
+                    self.api_url,
+                    json={
+                        "model": self.model,
+                        "input": batch_texts
+                    },
+                    timeout=self.timeout,
+                    max_retries=0,
+                    api_key=self.api_key
+                )
+                if response.status_code == 200:
+                    data = sorted(response.json()["data"], key=lambda item: item.get("index", 0))
+                    return [item["embedding"] for item in data]
+                last_error = f"{response.status_code} - {response.text}"
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = str(e)
+
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                self.logger.warning(f"임베딩 요청 재시도 {attempt + 1}/{self.max_retries} ({delay:.1f}초 후): {last_error}")
+                time.sleep(delay)
+
+        raise RuntimeError(f"임베딩 생성 실패: {last_error}")
+
+    def embed(self, texts, on_batch_done=None):
+        """
+        텍스트들의 임베딩을 병렬로 생성합니다.
+
+        texts: 임베딩할 텍스트 리스트
+        on_batch_done: 배치 완료 시 호출되는 콜백 (batch_texts, batch_embeddings)
+
+        Returns:
+            입력과 같은 길이의 임베딩 리스트 (실패한 배치 위치는 None)
+        """
+        results = [None] * len(texts)
+        batches = self.make_batches(texts)
+        if not batches:
+            return results
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.embed_batch, [texts[i] for i in batch]): batch
+                for batch in batches
+            }
+            done = 0
+            for future in as_completed(futures):
+                batch = futures[future]
+                done += 1
+                try:
+                    embeddings = future.result()
+                except Exception as e:
+                    self.logger.error(f"배치 {done}/{len(batches)} 실패 ({len(batch)}개 청크): {e}")
+                    continue
+
+                for i, embedding in zip(batch, embeddings):
+                    results[i] = embedding
+                if on_batch_done is not None:
+                    on_batch_done([texts[i] for i in batch], embeddings)
+                self.logger.info(f"배치 처리 완료: {done} / {len(batches)} ({len(batch)}개 청크)")
+
+        return results
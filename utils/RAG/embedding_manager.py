@@ -1,115 +1,146 @@
-import requests
-import json
 import os
 import hashlib
 from .textsplitter import get_text_splitter
+from .embedding_store import EmbeddingStore, migrate_json_cache
+from .embedding_dispatcher import EmbeddingDispatcher
+from .query_cache import QueryEmbeddingCache
+from ..http_client import upstage_client
 import logging
 
 class EmbeddingManager:
-    def __init__(self, api_key, cache_dir="embedding_cache", create_embeddings=True):
+    def __init__(self, api_key, cache_dir="embedding_cache", create_embeddings=True, api_url=None, max_workers=4):
         """
         api_key: Upstage API 키
         cache_dir: 임베딩 캐시를 저장할 디렉토리
         create_embeddings: 새로운 임베딩 생성 여부
+        api_url: 임베딩 API 주소 (기본값: UPSTAGE_EMBEDDING_URL 환경 변수 또는 UPSTAGE_API_URL 기준 주소)
+        max_workers: 동시에 보낼 임베딩 배치 요청 수
         """
         self.api_key = api_key
-        self.api_url = "https://api.upstage.ai/v1/embeddings"
+        self.api_url = api_url or os.getenv("UPSTAGE_EMBEDDING_URL") or upstage_client.url("embeddings")
+        self.model = "embedding-passage"
         self.cache_dir = cache_dir
         self.create_embeddings = create_embeddings
         os.makedirs(cache_dir, exist_ok=True)
         
-        self.text_splitter = get_text_splitter(
-            'recursive',
-            separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],
-            chunk_size=1024,
-            chunk_overlap=128
-        )
-        
         # 로깅 설정
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
+        
+        # 바이너리 임베딩 저장소 (처음 실행 시 기존 JSON 캐시를 한 번 이전)
+        self.store = EmbeddingStore(cache_dir)
+        if not self.store.exists():
+            migrated = migrate_json_cache(cache_dir, self.store)
+            if migrated:
+                self.logger.info(f"JSON 임베딩 캐시 {migrated}개를 바이너리 저장소로 이전했습니다.")
+        
+        # 청크 분할 설정 (인덱스 스냅샷 fingerprint에도 사용)
+        self.splitter_params = {
+            'separators': ["\n\n", "\n", ".", "!", "?", ",", " ", ""],
+            'chunk_size': 1024,
+            'chunk_overlap': 128
+        }
+        self.text_splitter = get_text_splitter('recursive', **self.splitter_params)
+        
+        self.dispatcher = EmbeddingDispatcher(
+            self.api_url,
+            self.api_key,
+            self.model,
+            max_workers=max_workers
+        )
+        
+        # 프롬프트 임베딩은 문서 저장소와 분리된 크기 제한 캐시에 저장
+        self.query_cache = QueryEmbeddingCache(os.path.join(cache_dir, "query_cache.db"))
 
-    def get_cache_path(self, text, filename):
+    def get_text_hash(self, text):
         """
-        텍스트의 해시값을 기반으로 캐시 파일 경로 생성
-        각 문서별로 하위 폴더 생성
+        임베딩 저장소의 키로 사용할 텍스트 해시값 생성
         """
-        # 문서별 하위 폴더 생성
-        doc_cache_dir = os.path.join(self.cache_dir, filename)
-        os.makedirs(doc_cache_dir, exist_ok=True)
-        
-        # 텍스트의 해시값 생성
-        text_hash = hashlib.md5(text.encode()).hexdigest()
-        return os.path.join(doc_cache_dir, f"{text_hash}.json")
+        return hashlib.md5(text.encode()).hexdigest()
 
-    def get_embeddings(self, texts, filenames):
+    def get_embeddings(self, texts, filenames, return_stats=False):
         """
         배치 처리를 사용하여 텍스트들의 임베딩을 생성
-        캐시된 임베딩이 있으면 재사용
+        캐시된 임베딩이 있으면 재사용하고, 같은 내용의 청크는 한 번만 임베딩
         create_embeddings가 False인 경우 새로운 임베딩 생성하지 않음
+        
+        Returns:
+            texts와 같은 순서·길이의 임베딩 리스트 (생성하지 못한 위치는 None)
+            return_stats가 True이면 (임베딩 리스트, {"hits", "misses", "deduplicated", "failed"}) 반환
         """
-        # 최대 100개씩 배치 처리
-        batch_size = 100
-        all_embeddings = []
-        texts_to_embed = []
-        text_to_index = {}  # 임베딩할 텍스트와 원래 인덱스 매핑
+        all_embeddings = [None] * len(texts)
+        stats = {"hits": 0, "misses": 0, "deduplicated": 0, "failed": 0}
+        pending = {}  # 임베딩할 텍스트 해시 → 원래 인덱스 목록
         
         # 캐시 확인 및 미캐시된 텍스트 수집
         for i, (text, filename) in enumerate(zip(texts, filenames)):
             if i%1000 == 0:
                 print(f"{i} / {len(texts)}")
-            cache_path = self.get_cache_path(text, filename)
+            text_hash = self.get_text_hash(text)
+            embedding = self.store.get(text_hash)
 
-            if os.path.exists(cache_path):
-                with open(cache_path, 'r') as f:
-                    embedding = json.load(f)
-                all_embeddings.append(embedding)
+            if embedding is not None:
+                all_embeddings[i] = embedding
+                stats["hits"] += 1
+            elif text_hash in pending:
+                # 같은 내용의 청크는 한 번만 임베딩
+                pending[text_hash].append(i)
+                stats["deduplicated"] += 1
             else:
+                pending[text_hash] = [i]
+                stats["misses"] += 1
                 if self.create_embeddings:
-                    texts_to_embed.append(text)
-                    text_to_index[text] = i
                     print(f"파일 '{filename}'의 새로운 임베딩을 생성합니다.")
                 else:
                     print(f"파일 '{filename}'의 임베딩이 없어 처리하지 않습니다.")
         
         # 미캐시된 텍스트들에 대해 임베딩 생성 (create_embeddings가 True인 경우에만)
-        if self.create_embeddings and texts_to_embed:
-            for i in range(0, len(texts_to_embed), batch_size):
-                batch_texts = texts_to_embed[i:i + batch_size]
-                self.logger.info(f"배치 처리 중: {i+1}~{min(i+batch_size, len(texts_to_embed))} / {len(texts_to_embed)} 청크")
-                
-                response = requests.post(
-                    self.api_url,
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "embedding-passage",
-                        "input": batch_texts
-                    }
+        if self.create_embeddings and pending:
+            self.logger.info(f"임베딩 생성 중: {len(pending)} 청크")
+            
+            # 배치가 끝날 때마다 저장소에 기록 (중단되어도 다음 실행에서 남은 청크만 처리)
+            def save_batch(batch_texts, batch_embeddings):
+                self.store.add_many(
+                    [self.get_text_hash(text) for text in batch_texts],
+                    batch_embeddings
                 )
-                
-                if response.status_code == 200:
-                    batch_result = response.json()["data"]
-                    
-                    # 임베딩 결과 저장 및 캐시
-                    for text, result in zip(batch_texts, batch_result):
-                        embedding = result["embedding"]
-                        # 원본 텍스트의 인덱스를 찾아 해당하는 파일명 사용
-                        original_index = text_to_index[text]
-                        cache_path = self.get_cache_path(text, filenames[original_index])
-                        with open(cache_path, 'w') as f:
-                            json.dump(embedding, f)
-                        all_embeddings.append(embedding)
-                else:
-                    self.logger.error(f"임베딩 생성 실패: {response.status_code} - {response.text}")
+            
+            texts_to_embed = [texts[indices[0]] for indices in pending.values()]
+            new_embeddings = self.dispatcher.embed(texts_to_embed, on_batch_done=save_batch)
+            
+            # 원래 위치에 결과 배치
+            for indices, embedding in zip(pending.values(), new_embeddings):
+                if embedding is None:
+                    stats["failed"] += len(indices)
+                    continue
+                for i in indices:
+                    all_embeddings[i] = embedding
+        else:
+            stats["failed"] = sum(len(indices) for indices in pending.values())
         
+        self.logger.info(
+            f"임베딩 캐시: 적중 {stats['hits']}, 미적중 {stats['misses']}, "
+            f"중복 제거 {stats['deduplicated']}, 실패 {stats['failed']}"
+        )
+        if return_stats:
+            return all_embeddings, stats
         return all_embeddings
 
     def get_embedding_for_prompt(self, prompt):
-        """프롬프트의 임베딩을 생성"""
+        """프롬프트의 임베딩을 생성 (질문 임베딩 캐시를 먼저 확인)"""
         # 프롬프트를 청크로 분할
         prompt_chunks = self.text_splitter.split_text(prompt)
-        # 각 청크의 임베딩 생성 (프롬프트는 'prompt' 폴더에 저장)
-        return self.get_embeddings(prompt_chunks, ['prompt'] * len(prompt_chunks)) 
+        embeddings = [self.query_cache.get(chunk) for chunk in prompt_chunks]
+        
+        # 캐시에 없는 청크만 임베딩 생성
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing and self.create_embeddings:
+            new_embeddings = self.dispatcher.embed([prompt_chunks[i] for i in missing])
+            for i, embedding in zip(missing, new_embeddings):
+                if embedding is not None:
+                    self.query_cache.put(prompt_chunks[i], embedding)
+                    embeddings[i] = embedding
+        
+        self.logger.info(f"질문 임베딩 캐시 적중률: {self.query_cache.hit_rate():.1%}")
+        # 생성하지 못한 청크는 제외
+        return [embedding for embedding in embeddings if embedding is not None]
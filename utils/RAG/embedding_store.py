@@ -0,0 +1,234 @@
+import os
+import json
+import threading
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    float32 행렬 파일 하나와 해시→행 인덱스로 구성된 임베딩 저장소
+
+    - embeddings.f32: (행 수 × 차원) float32 행렬을 그대로 이어 붙인 바이너리 파일 (np.memmap으로 읽음)
+    - embeddings_index.s32: i번째 행의 텍스트 해시(md5 hex)를 32바이트씩 이어 붙인 바이너리 파일
+    - embeddings_meta.json: 차원, 행 수 등 메타데이터 (행 수가 커밋 기준 - 그 뒤에 남은 행/해시는 무시)
+
+    추가는 두 파일 끝에 덧붙이기만 하고, 메타데이터는 persist()에서 한 번에 교체합니다.
+    """
+
+    MATRIX_FILE = "embeddings.f32"
+    INDEX_FILE = "embeddings_index.s32"
+    META_FILE = "embeddings_meta.json"
+    HASH_BYTES = 32
+
+    def __init__(self, store_dir):
+        """
+        store_dir: 저장소 파일들을 둘 디렉토리
+        """
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.matrix_path = os.path.join(store_dir, self.MATRIX_FILE)
+        self.index_path = os.path.join(store_dir, self.INDEX_FILE)
+        self.meta_path = os.path.join(store_dir, self.META_FILE)
+
+        self._lock = threading.Lock()
+        self.dim = None
+        self._hashes = []
+        self._hash_to_row = {}
+        self._matrix = None
+        self._persisted_count = 0
+        self._load()
+
+    def exists(self):
+        """저장소가 디스크에 한 번이라도 기록되었는지 여부"""
+        return os.path.exists(self.meta_path)
+
+    def _load(self):
+        """메타데이터와 인덱스를 읽고 행렬 파일을 memory-map 합니다."""
+        if not self.exists():
+            return
+
+        with open(self.meta_path, 'r') as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        count = meta["count"]
+
+        hashes = np.fromfile(self.index_path, dtype=f'S{self.HASH_BYTES}', count=count)
+        self._hashes = [h.decode() for h in hashes]
+        self._hash_to_row = {h: i for i, h in enumerate(self._hashes)}
+        self._persisted_count = count
+        self._matrix = self._map(count)
+
+    def _map(self, count):
+        """행렬 파일의 앞 count개 행을 memory-map 합니다. (메타데이터의 행 수 뒤에 남은 행은 무시)"""
+        if not count:
+            return None
+        return np.memmap(
+            self.matrix_path,
+            dtype=np.float32,
+            mode='r',
+            shape=(count, self.dim)
+        )
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __contains__(self, text_hash):
+        return text_hash in self._hash_to_row
+
+    def get(self, text_hash):
+        """해시에 해당하는 임베딩 벡터(np.ndarray)를 반환하고, 없으면 None을 반환합니다."""
+        row = self._hash_to_row.get(text_hash)
+        if row is None:
+            return None
+        return np.array(self._matrix[row])
+
+    def get_many(self, text_hashes):
+        """여러 해시의 임베딩을 (n × dim) 행렬로 한 번에 반환합니다. 모두 저장되어 있어야 합니다."""
+        rows = [self._hash_to_row[h] for h in text_hashes]
+        return np.asarray(self._matrix[rows])
+
+    def add_many(self, text_hashes, embeddings, persist=True):
+        """
+        새 임베딩들을 저장소 끝에 추가합니다. 이미 있는 해시는 건너뜁니다.
+
+        text_hashes: 텍스트 해시 리스트
+        embeddings: 해시와 같은 순서의 임베딩 리스트
+        persist: 추가 후 메타데이터를 기록할지 여부
+                 (False이면 여러 번 추가한 뒤 persist()를 한 번 호출 - 그 전에 중단되면 추가분은 무시됨)
+        """
+        with self._lock:
+            new_hashes = []
+            new_rows = []
+            seen = set()
+            for text_hash, embedding in zip(text_hashes, embeddings):
+                if text_hash in self._hash_to_row or text_hash in seen:
+                    continue
+                seen.add(text_hash)
+                new_hashes.append(text_hash)
+                new_rows.append(embedding)
+
+            if not new_hashes:
+                return 0
+
+            matrix = np.asarray(new_rows, dtype=np.float32)
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"임베딩 차원 불일치: {matrix.shape[1]} != {self.dim}")
+
+            # 행렬과 인덱스 끝에 덧붙이기 (중단된 쓰기로 남은 뒷부분은 먼저 잘라냄)
+            count = len(self._hashes)
+            self._append(self.matrix_path, count * self.dim * 4, matrix.tobytes())
+            self._append(
+                self.index_path,
+                count * self.HASH_BYTES,
+                np.array([h.encode() for h in new_hashes], dtype=f'S{self.HASH_BYTES}').tobytes()
+            )
+
+            # 행렬을 먼저 늘린 뒤 새 행을 공개 (잠금 없이 읽는 get()이 범위 밖의 행을 보지 않도록)
+            self._matrix = self._map(count + len(new_hashes))
+            for text_hash in new_hashes:
+                self._hash_to_row[text_hash] = len(self._hashes)
+                self._hashes.append(text_hash)
+
+            if persist:
+                self._write_meta()
+            return len(new_hashes)
+
+    def add(self, text_hash, embedding):
+        """임베딩 하나를 추가합니다."""
+        return self.add_many([text_hash], [embedding])
+
+    def persist(self):
+        """persist=False로 추가한 임베딩까지 메타데이터에 기록합니다."""
+        with self._lock:
+            self._write_meta()
+
+    @staticmethod
+    def _append(path, offset, data):
+        """파일을 offset 길이로 자른 뒤 data를 덧붙이고 디스크에 반영합니다."""
+        with open(path, 'ab') as f:
+            f.truncate(offset)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_meta(self):
+        """메타데이터를 임시 파일에 쓴 뒤 교체합니다. (행 수가 바뀌지 않았으면 건너뜀)"""
+        count = len(self._hashes)
+        if count == self._persisted_count:
+            return
+        tmp_meta = self.meta_path + ".tmp"
+        with open(tmp_meta, 'w') as f:
+            json.dump({"dim": self.dim, "count": count, "dtype": "float32"}, f)
+        os.replace(tmp_meta, self.meta_path)
+        self._persisted_count = count
+
+
+def migrate_json_cache(cache_dir, store, batch_size=1000, remove_json=False):
+    """
+    기존 JSON 캐시 트리(cache_dir/<filename>/<md5>.json)를 EmbeddingStore로 옮깁니다.
+
+    cache_dir: 기존 JSON 캐시 디렉토리
+    store: 대상 EmbeddingStore
+    batch_size: 한 번에 저장소에 추가할 임베딩 수
+    remove_json: 이전이 끝나면 저장소에 옮긴 JSON 파일(과 빈 디렉토리)을 삭제할지 여부
+                 (기본값 False - 저장소에 포함된 JSON 캐시는 그대로 두고, 명령행에서 실행할 때만 삭제)
+
+    Returns:
+        새로 추가된 임베딩 수
+    """
+    added = 0
+    hashes = []
+    embeddings = []
+    migrated_paths = []  # 저장소에 들어간 JSON 파일 (메타데이터를 기록한 뒤 삭제)
+
+    for entry in sorted(os.listdir(cache_dir)):
+        doc_cache_dir = os.path.join(cache_dir, entry)
+        # 프롬프트 임베딩은 질문 캐시(query_cache.db)에서 따로 관리
+        if entry == "prompt" or not os.path.isdir(doc_cache_dir):
+            continue
+        for name in sorted(os.listdir(doc_cache_dir)):
+            if not name.endswith('.json'):
+                continue
+            text_hash = os.path.splitext(name)[0]
+            path = os.path.join(doc_cache_dir, name)
+            if text_hash in store or text_hash in hashes:
+                migrated_paths.append(path)
+                continue
+            try:
+                with open(path, 'r') as f:
+                    embeddings.append(json.load(f))
+                hashes.append(text_hash)
+                migrated_paths.append(path)
+            except Exception as e:
+                print(f"캐시 파일 {entry}/{name} 읽기 실패: {e}")
+                continue
+
+            if len(hashes) >= batch_size:
+                added += store.add_many(hashes, embeddings, persist=False)
+                hashes, embeddings = [], []
+
+    if hashes:
+        added += store.add_many(hashes, embeddings, persist=False)
+    store.persist()
+
+    if remove_json:
+        for path in migrated_paths:
+            os.remove(path)
+        for path in {os.path.dirname(path) for path in migrated_paths}:
+            if not os.listdir(path):
+                os.rmdir(path)
+    return added
+
+
+if __name__ == "__main__":
+    import sys
+
+    # 사용법: python -m utils.RAG.embedding_store [cache_dir] [--remove-json]
+    # --remove-json: 이전한 JSON 캐시 파일 삭제 (앱 시작 시 자동 이전에서는 삭제하지 않음)
+    args = [arg for arg in sys.argv[1:] if arg != "--remove-json"]
+    cache_dir = args[0] if args else "embedding_cache"
+    store = EmbeddingStore(cache_dir)
+    count = migrate_json_cache(cache_dir, store, remove_json="--remove-json" in sys.argv[1:])
+    print(f"{count}개 임베딩을 이전했습니다. (총 {len(store)}개, 차원 {store.dim})")
@@ -0,0 +1,84 @@
+import math
+import faiss
+
+# 모든 인덱스는 L2 정규화된 벡터의 내적(코사인 유사도)을 사용하므로 점수가 클수록 유사함
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+DEFAULT_INDEX_PARAMS = {
+    "flat": {},
+    "hnsw": {
+        "M": 32,                # 노드당 연결 수
+        "ef_construction": 200, # 구축 시 탐색 폭
+        "ef_search": 64         # 검색 시 탐색 폭
+    },
+    "ivfpq": {
+        "nlist": None,  # 클러스터 수 (None이면 벡터 수에 맞춰 자동 설정)
+        "m": 64,        # PQ 서브 벡터 수 (차원의 약수여야 함)
+        "nbits": 8,     # 서브 벡터당 코드 비트 수
+        "nprobe": 16    # 검색 시 탐색할 클러스터 수
+    }
+}
+
+
+def get_index_params(index_type, index_params=None):
+    """인덱스 종류의 기본 파라미터에 사용자 파라미터를 덮어써서 반환합니다."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"unsupported index type: {index_type}")
+    return {**DEFAULT_INDEX_PARAMS[index_type], **(index_params or {})}
+
+
+def create_index(index_type, dim, train_vectors=None, index_params=None):
+    """
+    내적 기반 FAISS 인덱스를 생성합니다. (벡터는 호출 전에 L2 정규화되어 있어야 함)
+
+    index_type: "flat", "hnsw", "ivfpq" 중 하나
+    dim: 벡터 차원
+    train_vectors: 학습이 필요한 인덱스(ivfpq)에 사용할 벡터 행렬
+    index_params: 인덱스별 파라미터 (DEFAULT_INDEX_PARAMS 참고)
+
+    Returns:
+        비어 있는 (학습된) FAISS 인덱스
+    """
+    params = get_index_params(index_type, index_params)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["M"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = params["ef_construction"]
+    elif index_type == "ivfpq":
+        n_train = 0 if train_vectors is None else len(train_vectors)
+        nlist = params["nlist"] or max(1, min(int(4 * math.sqrt(n_train)), n_train // 39))
+        # 학습 데이터가 부족하거나(FAISS 권장: 클러스터당 39개 이상) 차원이 맞지 않으면 정확한 flat 인덱스로 대체
+        if dim % params["m"] != 0 or n_train < 39 * max(nlist, 2 ** params["nbits"]):
+            print(f"IVF-PQ 학습 조건을 만족하지 않아 flat 인덱스를 사용합니다. (벡터 {n_train}개, 차원 {dim})")
+            return faiss.IndexFlatIP(dim)
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, params["m"], params["nbits"], faiss.METRIC_INNER_PRODUCT)
+        # polysemous 학습은 검색에 쓰지 않으면서 고차원에서 매우 느림
+        index.do_polysemous_training = False
+        index.train(train_vectors)
+    else:
+        index = faiss.IndexFlatIP(dim)
+
+    set_search_params(index, index_type, index_params)
+    return index
+
+
+def set_search_params(index, index_type, index_params=None):
+    """검색 시점 파라미터(ef_search, nprobe)를 인덱스에 적용합니다."""
+    params = get_index_params(index_type, index_params)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = params["ef_search"]
+    elif index_type == "ivfpq":
+        try:
+            faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+        except RuntimeError:
+            pass  # flat으로 대체된 경우
+
+
+def supports_removal(index):
+    """
+    langchain FAISS.delete로 제거할 수 있는 인덱스인지 여부
+    HNSW는 remove_ids를 지원하지 않고, IVF는 제거 후에도 기존 행 번호를 유지하여
+    행 번호를 다시 매기는 index_to_docstore_id와 어긋나므로 둘 다 다시 구성해야 합니다.
+    """
+    return not isinstance(index, (faiss.IndexHNSW, faiss.IndexIVF))
@@ -1,24 +1,130 @@
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores.utils import DistanceStrategy
 from .embedding_manager import EmbeddingManager
+from .index_factory import create_index, get_index_params, set_search_params, supports_removal
 from collections import defaultdict
+import hashlib
+import json
+import os
+import shutil
+import threading
+import numpy as np
+import faiss
+
+
+def load_documents_from_directory(directory_path):
+    """
+    디렉토리에서 txt 파일들을 읽어서 {filename, content} 형태의 딕셔너리 리스트로 반환
+    """
+    documents = []
+    
+    # 디렉토리 내의 모든 파일 검색
+    for filename in os.listdir(directory_path):
+        # txt 파일만 처리
+        if filename.endswith('.txt'):
+            file_path = os.path.join(directory_path, filename)
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                    # 확장자를 제외한 파일 이름
+                    name_without_ext = os.path.splitext(filename)[0]
+                    documents.append({
+                        "filename": name_without_ext,
+                        "content": content
+                    })
+            except Exception as e:
+                print(f"파일 {filename} 읽기 실패: {e}")
+    
+    return documents
+
+
+def normalize_embeddings(text_embeddings):
+    """
+    (텍스트, 임베딩) 리스트를 L2 정규화하여 (정규화된 리스트, 벡터 행렬)로 반환합니다.
+    langchain FAISS의 normalize_L2 옵션은 내적 거리와 함께 쓰면 경고가 나므로 여기서 직접 정규화합니다.
+    """
+    vectors = np.asarray([embedding for _, embedding in text_embeddings], dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return [(text, vector) for (text, _), vector in zip(text_embeddings, vectors)], vectors
 
 class rag:
-    def __init__(self, documents, api_key, create_embeddings=True):
+    # 인덱스 구성 방식이 바뀌면 올려서 기존 스냅샷을 무효화
+    INDEX_VERSION = 3
+
+    def __init__(self, documents, api_key, create_embeddings=True, index_dir="faiss_index",
+                 index_type="flat", index_params=None):
         """
         documents: [{"filename": "파일명", "content": "내용"}, ...] 형태의 리스트
         api_key: Upstage API 키
         create_embeddings: 새로운 임베딩 생성 여부
+        index_dir: FAISS 인덱스 스냅샷을 저장할 디렉토리
+        index_type: "flat"(정확한 내적), "hnsw", "ivfpq" 중 하나
+        index_params: 인덱스별 파라미터 (index_factory.DEFAULT_INDEX_PARAMS 참고)
+        
+        모든 인덱스는 정규화된 벡터의 내적(코사인 유사도)을 사용하므로 유사도 점수는 클수록 유사합니다.
         """
         self.embedding_manager = EmbeddingManager(api_key, create_embeddings=create_embeddings)
+        self.index_dir = index_dir
+        self.index_type = index_type
+        self.index_params = get_index_params(index_type, index_params)
+        self._lock = threading.RLock()  # 인덱스 변경과 검색 사이의 동기화
         self.update_documents(documents)
 
-    def update_documents(self, documents):
+    def get_fingerprint(self, documents):
         """
-        documents: [{"filename": "파일명", "content": "내용"}, ...] 형태의 리스트
+        코퍼스 내용, 청크 분할 설정, 임베딩 모델을 기반으로 인덱스 fingerprint 생성
+        """
+        hasher = hashlib.sha256()
+        hasher.update(json.dumps({
+            "version": self.INDEX_VERSION,
+            "model": self.embedding_manager.model,
+            "splitter": self.embedding_manager.splitter_params,
+            "index_type": self.index_type,
+            "index_params": self.index_params
+        }, sort_keys=True).encode())
+        for doc in sorted(documents, key=lambda d: d["filename"]):
+            hasher.update(doc["filename"].encode())
+            hasher.update(hashlib.md5(doc["content"].encode()).digest())
+        return hasher.hexdigest()
+
+    def load_snapshot(self, fingerprint):
+        """fingerprint에 해당하는 저장된 인덱스가 있으면 불러옵니다."""
+        snapshot_dir = os.path.join(self.index_dir, fingerprint)
+        if not os.path.exists(os.path.join(snapshot_dir, "index.faiss")):
+            return None
+        try:
+            vector_store = FAISS.load_local(
+                snapshot_dir,
+                self.embedding_manager,
+                allow_dangerous_deserialization=True,  # 직접 저장한 스냅샷만 읽음
+                distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+            )
+            set_search_params(vector_store.index, self.index_type, self.index_params)
+            return vector_store
+        except Exception as e:
+            print(f"인덱스 스냅샷 로드 실패, 다시 생성합니다: {e}")
+            return None
+
+    def save_snapshot(self, fingerprint):
+        """현재 인덱스를 fingerprint 이름으로 저장하고 이전 스냅샷은 삭제합니다."""
+        snapshot_dir = os.path.join(self.index_dir, fingerprint)
+        tmp_dir = snapshot_dir + ".tmp"
+        try:
+            self.vector_store.save_local(tmp_dir)
+            if os.path.exists(snapshot_dir):
+                shutil.rmtree(snapshot_dir)
+            os.replace(tmp_dir, snapshot_dir)
+            for name in os.listdir(self.index_dir):
+                if name != fingerprint:
+                    shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+        except Exception as e:
+            print(f"인덱스 스냅샷 저장 실패: {e}")
+
+    def split_documents(self, documents):
+        """
+        문서들을 청크로 분할하여 (texts, metadatas, filenames)를 반환
         """
-        self.documents = documents
-        
-        # 각 문서의 내용과 메타데이터 준비
         texts = []
         metadatas = []
         filenames = []
@@ -32,71 +138,266 @@ class rag:
             # 각 청크에 대한 파일명 추가
             filenames.extend([doc["filename"]] * len(chunks))
         
-        # 임베딩 생성
-        embeddings = self.embedding_manager.get_embeddings(texts, filenames)
+        return texts, metadatas, filenames
+
+    def embed_chunks(self, texts, metadatas, filenames):
+        """
+        청크들의 임베딩을 생성하고, 임베딩이 없는 청크는 제외한 (text_embeddings, metadatas)를 반환
+        """
+        embeddings = self.embedding_manager.get_embeddings(texts, filenames) if texts else []
+        text_embeddings = []
+        kept_metadatas = []
+        for text, embedding, metadata in zip(texts, embeddings, metadatas):
+            if embedding is None:
+                continue
+            text_embeddings.append((text, embedding))
+            kept_metadatas.append(metadata)
+        return text_embeddings, kept_metadatas
+
+    def update_documents(self, documents):
+        """
+        documents: [{"filename": "파일명", "content": "내용"}, ...] 형태의 리스트
+        fingerprint가 같은 스냅샷이 있으면 재구축 없이 불러옵니다.
+        """
+        with self._lock:
+            self.documents = list(documents)
+            self.fingerprint = self.get_fingerprint(self.documents)
+            
+            vector_store = self.load_snapshot(self.fingerprint)
+            if vector_store is not None:
+                print("저장된 인덱스 스냅샷을 불러왔습니다.")
+                self.vector_store = vector_store
+                self.build_chunk_ids()
+                return
+            
+            # 각 문서의 내용과 메타데이터 준비
+            texts, metadatas, filenames = self.split_documents(self.documents)
+            
+            # 임베딩 생성
+            text_embeddings, metadatas = self.embed_chunks(texts, metadatas, filenames)
+            
+            # FAISS에 저장
+            self.vector_store = self.build_vector_store(text_embeddings, metadatas)
+            self.build_chunk_ids()
+            self.save_snapshot(self.fingerprint)
+
+    def build_vector_store(self, text_embeddings, metadatas):
+        """
+        설정된 인덱스 종류로 FAISS 벡터 저장소를 생성합니다.
+        벡터는 L2 정규화 후 내적으로 검색하므로 점수는 코사인 유사도입니다.
+        """
+        if text_embeddings:
+            text_embeddings, vectors = normalize_embeddings(text_embeddings)
+            dim = vectors.shape[1]
+        else:
+            vectors = None
+            dim = self.embedding_manager.store.dim or 4096
+        
+        vector_store = FAISS(
+            embedding_function=self.embedding_manager,
+            index=create_index(self.index_type, dim, vectors, self.index_params),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+        if text_embeddings:
+            vector_store.add_embeddings(text_embeddings=text_embeddings, metadatas=metadatas)
+        return vector_store
+
+    def replace_chunks(self, stale_ids, new_text_embeddings, new_metadatas):
+        """
+        청크들을 인덱스에서 제거하고 새 청크를 추가합니다.
+        
+        flat 인덱스는 해당 행만 제거하고 새 벡터를 추가합니다.
+        행 번호를 유지한 채 제거할 수 없는 인덱스(HNSW, IVF-PQ)는 남은 벡터와 새 벡터로 인덱스 전체를 한 번에 다시 구성합니다.
+        이 비용은 제거하는 청크 수가 아니라 전체 벡터 수에 비례하므로(HNSW 그래프 재구축, IVF-PQ 재학습)
+        여러 문서의 변경은 apply_changes 한 번으로 모아서 반영해야 재구성이 한 번만 일어납니다.
+        """
+        if not stale_ids or supports_removal(self.vector_store.index):
+            if stale_ids:
+                self.vector_store.delete(stale_ids)
+            if new_text_embeddings:
+                self.vector_store.add_embeddings(
+                    text_embeddings=normalize_embeddings(new_text_embeddings)[0],
+                    metadatas=new_metadatas
+                )
+            return
         
-        # FAISS에 저장
-        self.vector_store = FAISS.from_embeddings(
-            text_embeddings=list(zip(texts, embeddings)),
-            metadatas=metadatas,
-            embedding=self.embedding_manager
+        stale = set(stale_ids)
+        index = self.vector_store.index
+        store = self.embedding_manager.store
+        vectors = None
+        text_embeddings = []
+        metadatas = []
+        for row, doc_id in sorted(self.vector_store.index_to_docstore_id.items()):
+            if doc_id in stale:
+                continue
+            doc = self.vector_store.docstore.search(doc_id)
+            # 저장소의 원본 임베딩 사용 (PQ 인덱스에서 복원한 벡터는 손실 압축됨)
+            embedding = store.get(self.embedding_manager.get_text_hash(doc.page_content))
+            if embedding is None:
+                if vectors is None:
+                    if isinstance(index, faiss.IndexIVF):
+                        index.make_direct_map()
+                    vectors = index.reconstruct_n(0, index.ntotal)
+                embedding = vectors[row]
+            text_embeddings.append((doc.page_content, embedding))
+            metadatas.append(doc.metadata)
+        self.vector_store = self.build_vector_store(
+            text_embeddings + list(new_text_embeddings), metadatas + list(new_metadatas)
         )
+
+    def build_chunk_ids(self):
+        """
+        docstore를 기준으로 검색용 조회 테이블을 만듭니다.
+        - chunk_ids: 파일명 → 청크 id 목록
+        - filenames / row_doc_codes: FAISS 행 번호 → 문서 번호 (NumPy 집계용)
+        - documents_by_name: 파일명 → 원본 문서
+        """
+        self.chunk_ids = defaultdict(list)
+        self.documents_by_name = {doc["filename"]: doc for doc in self.documents}
+        self.filenames = list(self.documents_by_name)
+        codes = {filename: code for code, filename in enumerate(self.filenames)}
+        
+        index_to_docstore_id = self.vector_store.index_to_docstore_id
+        self.row_doc_codes = np.zeros(len(index_to_docstore_id), dtype=np.int64)
+        for row, doc_id in index_to_docstore_id.items():
+            filename = self.vector_store.docstore.search(doc_id).metadata["filename"]
+            self.chunk_ids[filename].append(doc_id)
+            self.row_doc_codes[row] = codes[filename]
+
+    def add_documents(self, documents):
+        """
+        문서를 인덱스에 추가합니다. 같은 파일명이 이미 있으면 내용이 바뀐 경우에만 교체합니다.
+        
+        documents: [{"filename": "파일명", "content": "내용"}, ...] 형태의 리스트
+        
+        Returns:
+            {"added": 추가된 문서 수, "updated": 교체된 문서 수, "removed": 0, "unchanged": 변경 없는 문서 수}
+        """
+        return self.apply_changes(documents, [])
+
+    def remove_documents(self, filenames):
+        """
+        파일명에 해당하는 문서와 그 청크들을 인덱스에서 제거합니다.
         
-    def __call__(self, prompt, k=3):
+        Returns:
+            {"added": 0, "updated": 0, "removed": 제거된 문서 수, "unchanged": 0}
+        """
+        return self.apply_changes([], filenames)
+
+    def refresh_from_directory(self, directory_path):
+        """
+        디렉토리의 txt 파일들과 현재 인덱스를 내용 해시로 비교하여 바뀐 문서만 반영합니다.
+        """
+        documents = load_documents_from_directory(directory_path)
+        current = {doc["filename"] for doc in documents}
+        removed = [doc["filename"] for doc in self.documents if doc["filename"] not in current]
+        return self.apply_changes(documents, removed)
+
+    def apply_changes(self, upserts, removals):
+        """
+        추가/교체할 문서와 제거할 파일명을 받아 변경된 청크만 FAISS와 docstore에 반영합니다.
+        임베딩 생성은 lock 밖에서 수행하므로 그동안에도 검색은 계속 처리됩니다.
+        """
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        indexed_hashes = {
+            doc["filename"]: hashlib.md5(doc["content"].encode()).hexdigest()
+            for doc in self.documents
+        }
+        
+        changed = []
+        for doc in upserts:
+            old_hash = indexed_hashes.get(doc["filename"])
+            if old_hash is None:
+                stats["added"] += 1
+            elif old_hash != hashlib.md5(doc["content"].encode()).hexdigest():
+                stats["updated"] += 1
+            else:
+                stats["unchanged"] += 1
+                continue
+            changed.append(doc)
+        removals = [filename for filename in removals if filename in indexed_hashes]
+        stats["removed"] = len(removals)
+        
+        if not changed and not removals:
+            return stats
+        
+        # 변경된 문서만 청크 분할 및 임베딩
+        texts, metadatas, filenames = self.split_documents(changed)
+        text_embeddings, metadatas = self.embed_chunks(texts, metadatas, filenames)
+        
+        with self._lock:
+            stale = set(removals) | {doc["filename"] for doc in changed}
+            stale_ids = [doc_id for filename in stale for doc_id in self.chunk_ids.get(filename, [])]
+            self.replace_chunks(stale_ids, text_embeddings, metadatas)
+            
+            self.documents = [doc for doc in self.documents if doc["filename"] not in stale] + list(changed)
+            self.build_chunk_ids()
+            self.fingerprint = self.get_fingerprint(self.documents)
+            self.save_snapshot(self.fingerprint)
+        
+        print(f"인덱스 갱신: 추가 {stats['added']}, 교체 {stats['updated']}, 제거 {stats['removed']}")
+        return stats
+        
+    def __call__(self, prompt, k=3, chunk_k=3):
+        """
+        프롬프트와 유사한 문서를 검색합니다.
+        
+        prompt: 검색 프롬프트 (길면 여러 청크로 분할되어 한 번에 검색)
+        k: 반환할 문서 수
+        chunk_k: 프롬프트 청크마다 가져올 청크 수
+        """
         # 프롬프트의 임베딩 생성
         chunk_embeddings = self.embedding_manager.get_embedding_for_prompt(prompt)
+        if not chunk_embeddings:
+            return []
+        queries = np.asarray(chunk_embeddings, dtype=np.float32)
+        faiss.normalize_L2(queries)
         
-        # 모든 청크에 대한 검색 결과 수집
-        all_results = []
-        for chunk_embedding in chunk_embeddings:
-            docs_and_scores = self.vector_store.similarity_search_with_score_by_vector(
-                chunk_embedding,
-                k=3  # 충분히 많은 결과를 가져옴
-            )
-            all_results.extend(docs_and_scores)
-        
-        # 문서별 최고 유사도 집계
-        doc_max_scores = defaultdict(float)
-        for doc, score in all_results:
-            filename = doc.metadata["filename"]
-            # 최고 유사도만 저장
-            doc_max_scores[filename] = max(doc_max_scores[filename], float(score))
-        
-        # 문서별 최고 유사도로 정렬하여 상위 k개 문서 선택
-        sorted_docs = sorted(
-            doc_max_scores.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:k]  # 상위 k개 문서만 선택
-        
-        # 최종 결과 생성
-        results = []
-        for filename, doc_score in sorted_docs:
-            # 해당 문서의 모든 청크 찾기
-            doc_chunks = [
-                (doc.page_content, score)
-                for doc, score in all_results
-                if doc.metadata["filename"] == filename
-            ]
+        with self._lock:
+            index = self.vector_store.index
+            if index.ntotal == 0:
+                return []
             
-            # 원본 문서 내용 찾기
-            original_doc = next(
-                doc for doc in self.documents 
-                if doc["filename"] == filename
-            )
+            # 모든 프롬프트 청크를 (n_chunks × dim) 행렬로 한 번에 검색
+            scores, rows = index.search(queries, min(chunk_k, index.ntotal))
+            scores, rows = scores.ravel(), rows.ravel()
+            valid = rows >= 0
+            scores, rows = scores[valid], rows[valid]
+            codes = self.row_doc_codes[rows]
+            
+            # 문서별 최고 유사도 집계 (내적 점수이므로 클수록 유사)
+            doc_scores = np.full(len(self.filenames), -np.inf, dtype=np.float32)
+            np.maximum.at(doc_scores, codes, scores)
+            
+            # 문서별 최고 유사도로 정렬하여 상위 k개 문서 선택
+            hit_codes = np.unique(codes)
+            top_codes = hit_codes[np.argsort(-doc_scores[hit_codes], kind="stable")][:k]
             
-            # 결과 추가
-            results.append({
-                "filename": filename,
-                "content": original_doc["content"],  # 원본 문서 전체 내용
-                "document_similarity": doc_score,  # 문서의 최고 유사도
-                "chunk_similarities": [  # 각 청크별 유사도
-                    {
-                        "content": chunk,
-                        "similarity": score
-                    }
-                    for chunk, score in doc_chunks
+            # 최종 결과 생성
+            results = []
+            for code in top_codes:
+                filename = self.filenames[code]
+                # 해당 문서의 모든 청크 찾기
+                chunk_mask = codes == code
+                doc_chunks = [
+                    (self.vector_store.docstore.search(self.vector_store.index_to_docstore_id[int(row)]).page_content, float(score))
+                    for row, score in zip(rows[chunk_mask], scores[chunk_mask])
                 ]
-            })
+                
+                # 결과 추가
+                results.append({
+                    "filename": filename,
+                    "content": self.documents_by_name[filename]["content"],  # 원본 문서 전체 내용
+                    "document_similarity": float(doc_scores[code]),  # 문서의 최고 유사도
+                    "chunk_similarities": [  # 각 청크별 유사도
+                        {
+                            "content": chunk,
+                            "similarity": score
+                        }
+                        for chunk, score in doc_chunks
+                    ]
+                })
         
         return results
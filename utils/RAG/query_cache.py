@@ -0,0 +1,130 @@
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize_query(text):
+    """공백과 대소문자 차이만 있는 질문이 같은 키를 갖도록 정규화합니다."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class QueryEmbeddingCache:
+    """
+    프롬프트 임베딩 캐시 (프로세스 내 LRU + 크기/TTL 제한이 있는 SQLite 저장소)
+
+    문서 임베딩 저장소와 분리하여, 질문마다 캐시가 끝없이 늘어나지 않도록 합니다.
+    """
+
+    def __init__(self, db_path, max_memory_items=1024, max_disk_items=10000, ttl_seconds=30 * 24 * 3600):
+        """
+        db_path: SQLite 파일 경로
+        max_memory_items: 메모리 LRU에 유지할 최대 항목 수
+        max_disk_items: 디스크에 유지할 최대 항목 수 (초과 시 오래 사용하지 않은 항목부터 삭제)
+        ttl_seconds: 디스크 항목의 유효 기간(초)
+        """
+        self.db_path = db_path
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._puts = 0
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS query_embeddings (
+                    key TEXT PRIMARY KEY,
+                    embedding BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_query_embeddings_last_used ON query_embeddings (last_used)")
+            conn.commit()
+        self.evict()
+
+    def make_key(self, text):
+        """정규화된 텍스트의 해시를 캐시 키로 사용"""
+        return hashlib.md5(normalize_query(text).encode()).hexdigest()
+
+    def get(self, text):
+        """캐시된 임베딩(np.ndarray)을 반환하고, 없으면 None을 반환합니다."""
+        key = self.make_key(text)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self._memory[key]
+
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT embedding FROM query_embeddings WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl_seconds)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE query_embeddings SET last_used = ? WHERE key = ?", (now, key))
+                conn.commit()
+
+        if row is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        embedding = np.frombuffer(row[0], dtype=np.float32)
+        with self._lock:
+            self.stats["disk_hits"] += 1
+            self._remember(key, embedding)
+        return embedding
+
+    def put(self, text, embedding):
+        """임베딩을 메모리와 디스크에 저장합니다."""
+        key = self.make_key(text)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            self._remember(key, embedding)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO query_embeddings (key, embedding, created_at, last_used)
+                VALUES (?, ?, ?, ?)
+            """, (key, embedding.tobytes(), now, now))
+            conn.commit()
+
+        # 쓰기가 일정 횟수 쌓일 때마다 디스크 정리
+        self._puts += 1
+        if self._puts % 100 == 0:
+            self.evict()
+
+    def _remember(self, key, embedding):
+        """메모리 LRU에 추가 (lock을 잡은 상태에서 호출)"""
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def evict(self):
+        """만료된 항목과 최대 개수를 넘는 오래된 항목을 디스크에서 삭제합니다."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM query_embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            conn.execute("""
+                DELETE FROM query_embeddings WHERE key IN (
+                    SELECT key FROM query_embeddings
+                    ORDER BY last_used DESC
+                    LIMIT -1 OFFSET ?
+                )
+            """, (self.max_disk_items,))
+            conn.commit()
+
+    def hit_rate(self):
+        """전체 조회 중 캐시 적중 비율"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
@@ -1,16 +1,39 @@
 import os
+import re
 import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from .database import db
 from .request_rag import call_rag_api
-import requests
+from .rag_cache import ReferenceSummaryCache
+from .rag_router import rag_router
+from .summarizer import summarize_long_document
+from .http_client import upstage_client
+from .text_utils import estimate_tokens
 from typing import Dict, List, Optional, Union, Generator
 
 load_dotenv()
 
 # 환경 변수에서 API 키 가져오기
 API_KEY = os.getenv("UPSTAGE_API_KEY")
-API_URL = "https://api.upstage.ai/v1/chat/completions"
+TURN_WORKERS = 8  # 대화 턴 단계(판단/검색/참고 자료 요약) 동시 실행 수 (전체 세션 공유)
+# RAG 필요성 판단을 기다리지 않고 검색을 함께 시작 (기본값: 사용 안 함)
+# 검색에는 질문 번역과 결과 번역 LLM 호출이 포함되므로, 판단이 no이면 그 비용이 그대로 낭비됨
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+NO_REFERENCE_MESSAGE = "참고할 수 있는 사례를 찾을 수 없습니다."
+ROUTING_CONTEXT_CHARS = 1000  # 문서 요약이 없을 때 RAG 필요 여부 판단에 사용할 문서 앞부분 길이
+RECENT_COUNT = 7  # 요약하지 않고 그대로 보낼 최근 대화 수 (사용자/AI 한 쌍 기준)
+DOCUMENT_CONTEXT_TOKENS = 8000  # 답변에 포함할 문서 페이지의 최대 추정 토큰 수
+DISPLAY_REFERENCE_HEADER = '### 📚 참고 사례\n\n'
+REFERENCE_SUMMARY_MODEL = "solar-1-mini-chat"
+
+# 대화 턴 단계 실행용 공유 executor
+turn_executor = ThreadPoolExecutor(max_workers=TURN_WORKERS)
+
+# 참고 문서 표시용 요약 캐시 (파일명 + 내용 해시)
+reference_summary_cache = ReferenceSummaryCache()
 
 def chat_with_upstage(messages, model="solar-pro2-preview", stream=False, reasoning_effort="medium"):
     """
@@ -26,18 +49,15 @@ def chat_with_upstage(messages, model="solar-pro2-preview", stream=False, reason
         응답 텍스트 또는 스트림 객체
     """
     try:
-        response = requests.post(
-            API_URL,
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            },
+        response = upstage_client.post(
+            "chat/completions",
             json={
                 "model": model,
                 "messages": messages,
                 "reasoning_effort": reasoning_effort,
                 "stream": stream
-            }
+            },
+            stream=stream
         )
         
         if response.status_code == 200:
@@ -69,14 +89,7 @@ def summarize_conversation_history(chat_history):
         return ""
     
     # 대화 내용을 텍스트로 변환
-    conversation_text = ""
-    for msg in chat_history:
-        if msg["role"] in ["user", "assistant"]:
-            role_name = "사용자" if msg["role"] == "user" else "AI"
-            content = msg["content"]
-            # 특수 형식 메시지 제외
-            if not content.startswith("📄") and not content.startswith("❌"):
-                conversation_text += f"{role_name}: {content}\n\n"
+    conversation_text = format_conversation(chat_history)
     
     if not conversation_text.strip():
         return ""
@@ -109,6 +122,93 @@ def summarize_conversation_history(chat_history):
     except:
         return ""
 
+def format_conversation(chat_history):
+    """대화 기록을 요약용 텍스트로 변환 (특수 형식 메시지 제외)"""
+    conversation_text = ""
+    for msg in chat_history:
+        if msg["role"] in ["user", "assistant"]:
+            role_name = "사용자" if msg["role"] == "user" else "AI"
+            content = msg["content"]
+            # 특수 형식 메시지 제외
+            if not content.startswith("📄") and not content.startswith("❌"):
+                conversation_text += f"{role_name}: {content}\n\n"
+    return conversation_text
+
+def hash_history(chat_history):
+    """대화 기록(역할, 내용)의 해시"""
+    raw = json.dumps([[msg["role"], msg["content"]] for msg in chat_history], ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def fold_conversation_summary(previous_summary, new_messages):
+    """
+    기존 대화 요약에 새로 요약 범위에 들어온 대화만 반영합니다.
+    
+    Returns:
+        갱신된 요약 (반영할 내용이 없으면 기존 요약, 실패하면 None)
+    """
+    conversation_text = format_conversation(new_messages)
+    if not conversation_text.strip():
+        return previous_summary
+    
+    messages = [
+        {
+            "role": "system",
+            "content": """당신은 대화 요약 전문가입니다. 
+기존 대화 요약에 이어진 새 대화 내용을 반영하여 요약을 갱신해주세요.
+요약은 다음 형식으로 작성해주세요:
+
+**현재 세션 대화 요약:**
+- 주요 질문과 답변 내용을 불릿 포인트로 정리
+- 중요한 맥락이나 정보를 포함
+- 3-5개 문장으로 간결하게 작성
+
+기존 요약의 중요한 내용은 유지하면서 대화의 흐름과 핵심 내용을 간결하게 요약해주세요.
+이 요약은 현재 세션의 맥락 유지를 위한 것입니다."""
+        },
+        {
+            "role": "user",
+            "content": f"기존 대화 요약:\n{previous_summary}\n\n이어진 대화:\n\n{conversation_text}"
+        }
+    ]
+    
+    try:
+        return chat_with_upstage(messages, reasoning_effort="medium") or None
+    except:
+        return None
+
+def get_rolling_conversation_summary(session_id, old_history):
+    """
+    세션의 누적 대화 요약을 반환합니다.
+    DB에 저장된 요약에 새로 요약 범위에 들어온 메시지만 반영하므로 비용은 새 메시지 수에 비례합니다.
+    이전 대화가 바뀌었으면(삭제/수정) 처음부터 다시 요약합니다.
+    
+    Args:
+        session_id: 세션 ID
+        old_history: 요약 대상 대화 기록 (세션 처음부터, 최근 대화 제외)
+    
+    Returns:
+        요약된 대화 내용
+    """
+    stored = db.get_conversation_summary(session_id)
+    if (
+        stored
+        and stored["message_count"] <= len(old_history)
+        and stored["history_hash"] == hash_history(old_history[:stored["message_count"]])
+    ):
+        new_messages = old_history[stored["message_count"]:]
+        if not new_messages:
+            return stored["summary"]
+        summary = fold_conversation_summary(stored["summary"], new_messages)
+        if summary is None:
+            # 실패하면 기존 요약을 사용하고, 다음 턴에 다시 반영
+            return stored["summary"]
+    else:
+        summary = summarize_conversation_history(old_history)
+    
+    if summary:
+        db.save_conversation_summary(session_id, summary, len(old_history), hash_history(old_history))
+    return summary
+
 
 
 
@@ -208,6 +308,7 @@ def process_rag_response(tool_calls):
 def should_use_rag(user_input: str, pdf_summary: str = None, conversation_history: List[Dict] = None) -> bool:
     """
     RAG 사용 여부를 판단하는 함수
+    로컬 라우터로 먼저 판단하고, 확신이 낮을 때만 LLM에 묻습니다.
     
     Args:
         user_input: 사용자 입력
@@ -217,6 +318,15 @@ def should_use_rag(user_input: str, pdf_summary: str = None, conversation_histor
     Returns:
         bool: RAG 사용 여부
     """
+    return rag_router.decide(user_input, pdf_summary, fallback=lambda: llm_should_use_rag(user_input, pdf_summary))
+
+def llm_should_use_rag(user_input: str, pdf_summary: str = None) -> Optional[bool]:
+    """
+    LLM으로 RAG 사용 여부를 판단합니다.
+    
+    Returns:
+        bool: RAG 사용 여부 (판단에 실패하면 None)
+    """
     try:
         # RAG 필요성 판단을 위한 프롬프트 구성
         rag_decision_prompt = f"""다음 사용자 질문과 대화 맥락을 바탕으로 RAG(Retrieval Augmented Generation)가 필요한지 판단해주세요.
@@ -240,12 +350,8 @@ RAG가 필요하지 않은 경우는 다음과 같습니다:
 RAG가 필요한지 여부를 'yes' 또는 'no'로만 답변해주세요."""
 
         # LLM을 사용하여 RAG 필요성 판단
-        response = requests.post(
-            API_URL,
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            },
+        response = upstage_client.post(
+            "chat/completions",
             json={
                 "model": "solar-1-mini-chat",
                 "messages": [
@@ -262,14 +368,198 @@ RAG가 필요한지 여부를 'yes' 또는 'no'로만 답변해주세요."""
         
     except Exception as e:
         print(f"RAG 필요성 판단 중 오류 발생: {str(e)}")
-        return False
+        return None
+
+def run_timed(timings: Dict, stage: str, func, *args, **kwargs):
+    """func를 실행하고 소요 시간(초)을 timings[stage]에 기록합니다."""
+    started = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        timings[stage] = round(time.perf_counter() - started, 3)
+
+def format_timings(timings: Dict) -> str:
+    """단계별 소요 시간을 로그용 문자열로 변환"""
+    return ", ".join(f"{stage} {seconds:.2f}초" for stage, seconds in timings.items())
+
+def prepare_rag_context(
+    user_input: str,
+    pdf_summary: str = None,
+    messages: List[Dict] = None,
+    use_rag: bool = False,
+    timings: Dict = None
+):
+    """
+    RAG 필요성을 로컬 라우터로 판단하고, 필요하면 검색 결과를 반환합니다.
+    로컬 라우터의 확신이 낮으면 LLM 판단 후 yes일 때만 검색합니다.
+    SPECULATIVE_RETRIEVAL이 켜져 있으면 판단과 검색을 동시에 시작하고,
+    판단이 no이면 검색 결과는 사용하지 않습니다. (검색은 끝까지 실행되어 결과 캐시에 남음)
+    
+    Returns:
+        tuple: (RAG 사용 여부, 검색 결과 리스트 - 결과가 없으면 빈 리스트)
+    """
+    if not use_rag:
+        return False, []
+    timings = {} if timings is None else timings
+    
+    # PDF 요약이 있는 경우 검색 쿼리에 포함
+    search_query = user_input
+    if pdf_summary:
+        search_query = f"PDF 내용: {pdf_summary}\n\n질문: {user_input}"
+    
+    # 로컬 라우터가 확신하면 LLM 판단 없이 바로 결정
+    fallback = lambda: llm_should_use_rag(user_input, pdf_summary)
+    decision = run_timed(timings, "rag_decision", rag_router.route, user_input, pdf_summary, fallback)
+    search_future = None
+    if decision is None:
+        # 로컬 라우터는 이미 실행했으므로 LLM 판단만 요청하고, 결과는 라우터에 한 번만 기록
+        if SPECULATIVE_RETRIEVAL:
+            search_future = turn_executor.submit(run_timed, timings, "retrieval", call_rag_api, search_query)
+        llm_decision = run_timed(timings, "rag_llm_decision", fallback)
+        decision = rag_router.resolve(user_input, pdf_summary, llm_decision)
+    
+    if not decision:
+        return False, []
+    
+    rag_response = search_future.result() if search_future else run_timed(timings, "retrieval", call_rag_api, search_query)
+    if rag_response and "results" in rag_response and rag_response["results"]:
+        return True, rag_response["results"][:3]
+    return True, []
+
+def format_system_reference(results: List[Dict]) -> str:
+    """시스템 프롬프트용 참고 자료 (원본)"""
+    system_reference = '### 📚 참고 사례\n\n'
+    system_reference += '아래는 참고용 사례입니다. 이 사례들은 답변의 참고 자료로만 사용되며, 직접적인 답변은 아닙니다.\n\n'
+    for i, result in enumerate(results, 1):
+        system_reference += f'**사례 {i}**\n'
+        system_reference += f'**파일명**: {result.get("filename", "N/A")}\n\n'
+        system_reference += f'**내용**:\n{result.get("content", "내용 없음")}\n\n'
+        system_reference += f'**유사도**: {result.get("similarity", 0):.3f}\n\n'
+        system_reference += '---\n\n'
+    return system_reference
+
+def summarize_reference(result: Dict) -> str:
+    """
+    검색된 참고 문서의 표시용 요약을 반환합니다.
+    (파일명, 내용 해시)로 캐시를 먼저 확인하고, 요약에 성공한 경우만 저장합니다.
+    """
+    filename = result.get("filename", "N/A")
+    content = result.get("content", "내용 없음")
+    summary = reference_summary_cache.get(filename, content, REFERENCE_SUMMARY_MODEL)
+    if summary is not None:
+        return summary
+    summary = request_content_summary(content)
+    if summary is None:
+        return content[:100] + "..."
+    reference_summary_cache.put(filename, content, REFERENCE_SUMMARY_MODEL, summary)
+    return summary
+
+def submit_reference_summaries(results: List[Dict]) -> List:
+    """사용자에게 보여줄 참고 자료 요약을 동시에 요청합니다. (답변은 요약을 기다리지 않음)"""
+    return [turn_executor.submit(summarize_reference, result) for result in results]
+
+def format_reference_case(i: int, result: Dict, summarized_content: str) -> str:
+    """표시용 참고 사례 하나"""
+    case = f'**사례 {i}**\n'
+    case += f'**파일명**: {result.get("filename", "N/A")}\n\n'
+    case += f'**내용**:\n{summarized_content}\n\n'
+    case += f'**유사도**: {result.get("similarity", 0):.3f}\n\n'
+    case += '---\n\n'
+    return case
+
+def format_display_reference(results: List[Dict], summaries: List[str]) -> str:
+    """사용자에게 보여줄 참고 자료 (요약)"""
+    return DISPLAY_REFERENCE_HEADER + "".join(
+        format_reference_case(i, result, summarized_content)
+        for i, (result, summarized_content) in enumerate(zip(results, summaries), 1)
+    )
+
+def iter_display_reference(results: List[Dict], summary_futures: List, timings: Dict) -> Generator[str, None, None]:
+    """표시용 참고 자료를 사례 순서대로, 요약이 끝나는 대로 하나씩 yield 합니다. (답변 이후 추가로 기다린 시간 기록)"""
+    started = time.perf_counter()
+    yield DISPLAY_REFERENCE_HEADER
+    for i, (result, future) in enumerate(zip(results, summary_futures), 1):
+        yield format_reference_case(i, result, future.result())
+    timings["reference_wait"] = round(time.perf_counter() - started, 3)
+
+def collect_display_reference(results: List[Dict], summary_futures: List, timings: Dict) -> str:
+    """참고 자료 요약이 끝나기를 기다려 표시용 참고 자료를 만듭니다. (답변 이후 추가로 기다린 시간 기록)"""
+    summaries = run_timed(timings, "reference_wait", lambda: [future.result() for future in summary_futures])
+    return format_display_reference(results, summaries)
+
+def query_bigrams(text: str) -> set:
+    """단어별 글자 2-gram 집합 (조사가 붙은 한국어 단어도 매칭되도록 사용)"""
+    return {
+        word[i:i + 2]
+        for word in re.findall(r"\w+", text.lower())
+        for i in range(len(word) - 1)
+    }
+
+def select_document_context(document_id: Optional[int], query: str, fallback: str = None,
+                            max_tokens: int = DOCUMENT_CONTEXT_TOKENS) -> Optional[str]:
+    """
+    질문과 관련된 페이지를 문서의 페이지별 원문(document_pages)에서 골라 답변용 문서 내용을 만듭니다.
+    토큰 제한으로 잘린 문서 내용 대신 사용하므로 문서 뒷부분에 대한 질문에도 답변할 수 있습니다.
+    
+    Args:
+        document_id: 문서 ID (없으면 fallback 사용)
+        query: 사용자 질문
+        fallback: 페이지 구조가 없을 때 사용할 문서 내용 (이전 방식으로 저장된 문서)
+        max_tokens: 포함할 페이지의 최대 추정 토큰 수
+    
+    Returns:
+        str: 관련도 순으로 고른 페이지를 페이지 순서로 합친 텍스트
+    """
+    if document_id is None:
+        return fallback
+    pages = db.get_document_pages(document_id)
+    if not pages:
+        return fallback
+    
+    bigrams = query_bigrams(query)
+    def score(page):
+        text = page['text'].lower()
+        return sum(1 for bigram in bigrams if bigram in text)
+    
+    # 관련도가 같으면 앞 페이지 우선
+    selected = []
+    used_tokens = 0
+    for page in sorted(pages, key=lambda page: (-score(page), page['page'])):
+        page_tokens = estimate_tokens(page['text'])
+        if used_tokens + page_tokens > max_tokens:
+            continue
+        selected.append(page)
+        used_tokens += page_tokens
+    
+    if not selected:
+        return fallback
+    selected.sort(key=lambda page: page['page'])
+    return "\n\n".join(f"[{page['page']} 페이지]\n{page['text']}" for page in selected)
+
+def build_answer_system_prompt(system_prompt: str, results: List[Dict], pdf_summary: str = None) -> str:
+    """참고 사례와 PDF 요약을 포함한 답변용 시스템 프롬프트"""
+    if results:
+        system_prompt = f"""{system_prompt}
+
+아래의 참고 사례를 바탕으로 답변해주세요. 이 사례들은 참고용이며, 질문과는 관련이 없습니다. 
+문서를 분석할 때 아래의 사례를 적절히 인용하여 답변하십시오.
+
+{format_system_reference(results)}"""
+    if pdf_summary:
+        system_prompt += f"""아래의 사례는 유저가 직접적으로 입력한 pdf의 요약입니다. 위 사례를 바탕으로 아래 문서에 대한 유저의 질문에 답변해주세요.
+            \n\n
+{pdf_summary}"""
+    return system_prompt
 
 def get_chat_response(
     messages: List[Dict],
     system_prompt: str,
     user_input: str,
     use_rag: bool = False,
-    pdf_summary: str = None
+    pdf_summary: str = None,
+    timings: Optional[Dict] = None,
+    session_id: Optional[str] = None,
+    document_id: Optional[int] = None
 ) -> Dict:
     """
     채팅 응답을 생성하는 함수
@@ -280,97 +570,50 @@ def get_chat_response(
         user_input: 사용자 입력
         use_rag: RAG 사용 여부
         pdf_summary: PDF 요약
+        timings: 단계별 소요 시간(초)을 기록할 dict (선택)
+        session_id: 세션 ID (주어지면 저장된 누적 요약에 반영된 기록을 요약으로 대체하고, 답변 후 요약을 갱신)
+        document_id: 활성 문서 ID (주어지면 질문과 관련된 페이지를 골라 답변에 포함)
     
     Returns:
         Dict: 응답 정보
     """
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
     try:
-        # RAG 필요성 판단
-        should_use_rag_flag = should_use_rag(user_input, pdf_summary, messages) if use_rag else False
+        should_use_rag_flag, results = prepare_rag_context(user_input, pdf_summary, messages, use_rag, timings)
+        # 표시용 요약은 답변 생성과 동시에 진행
+        summary_futures = submit_reference_summaries(results)
         
-        if should_use_rag_flag:
-            # PDF 요약이 있는 경우 검색 쿼리에 포함
-            search_query = user_input
-            if pdf_summary:
-                search_query = f"PDF 내용: {pdf_summary}\n\n질문: {user_input}"
-            
-            # RAG API 호출
-            rag_response = call_rag_api(search_query)
-            
-            if rag_response and "results" in rag_response and rag_response["results"]:
-                # 시스템 프롬프트용 참고 자료 (원본)
-                system_reference = '### 📚 참고 사례\n\n'
-                system_reference += '아래는 참고용 사례입니다. 이 사례들은 답변의 참고 자료로만 사용되며, 직접적인 답변은 아닙니다.\n\n'
-                
-                # 사용자에게 보여줄 참고 자료 (요약)
-                display_reference = '### 📚 참고 사례\n\n'
-                
-                for i, result in enumerate(rag_response["results"][:3], 1):
-                    content = result.get("content", "내용 없음")
-                    filename = result.get("filename", "N/A")
-                    similarity = result.get("similarity", 0)
-                    
-                    # 시스템 프롬프트용 원본 내용
-                    system_reference += f'**사례 {i}**\n'
-                    system_reference += f'**파일명**: {filename}\n\n'
-                    system_reference += f'**내용**:\n{content}\n\n'
-                    system_reference += f'**유사도**: {similarity:.3f}\n\n'
-                    system_reference += '---\n\n'
-                    
-                    # 사용자에게 보여줄 요약 내용
-                    summarized_content = summarize_content(content)
-                    display_reference += f'**사례 {i}**\n'
-                    display_reference += f'**파일명**: {filename}\n\n'
-                    display_reference += f'**내용**:\n{summarized_content}\n\n'
-                    display_reference += f'**유사도**: {similarity:.3f}\n\n'
-                    display_reference += '---\n\n'
-                
-                system_prompt = f"""{system_prompt}
-
-아래의 참고 사례를 바탕으로 답변해주세요. 이 사례들은 참고용이며, 질문과는 관련이 없습니다. 
-문서를 분석할 때 아래의 사례를 적절히 인용하여 답변하십시오.
-
-{system_reference}"""
-            else:
-                system_reference = "참고할 수 있는 사례를 찾을 수 없습니다."
-                display_reference = system_reference
-        else:
-            system_reference = ""
-            display_reference = ""
-            
-        if pdf_summary:
-            system_prompt += f"""아래의 사례는 유저가 직접적으로 입력한 pdf의 요약입니다. 위 사례를 바탕으로 아래 문서에 대한 유저의 질문에 답변해주세요.
-            \n\n
-{pdf_summary}"""
-
-        response = requests.post(
-            API_URL,
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            },
+        answer_started = time.perf_counter()
+        response = upstage_client.post(
+            "chat/completions",
             json={
                 "model": "solar-1-mini-chat",
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    *messages,
-                    {"role": "user", "content": user_input}
-                ],
+                "messages": build_turn_messages(
+                    build_answer_system_prompt(
+                        system_prompt, results, select_document_context(document_id, user_input, pdf_summary)
+                    ),
+                    messages, user_input, session_id
+                ),
                 "temperature": 0.7,
                 "max_tokens": 1000
             }
         )
+        timings["answer"] = round(time.perf_counter() - answer_started, 3)
+        refresh_conversation_summary(messages, session_id)
         
         if response.status_code == 200:
             response_data = response.json()
             if 'choices' in response_data and len(response_data['choices']) > 0:
                 content = response_data['choices'][0]['message']['content']
-                # 참고 자료가 있는 경우 마지막에 추가 (요약된 버전)
-                if should_use_rag_flag and display_reference:
+                display_reference = ""
+                if should_use_rag_flag:
+                    display_reference = collect_display_reference(results, summary_futures, timings) if results else NO_REFERENCE_MESSAGE
+                    # 참고 자료가 있는 경우 마지막에 추가 (요약된 버전)
                     content += f"\n\n{display_reference}"
                 return {
                     "response": content,
-                    "reference": display_reference if should_use_rag_flag else ""
+                    "reference": display_reference
                 }
         
         return {
@@ -384,17 +627,17 @@ def get_chat_response(
             "response": f"오류가 발생했습니다: {str(e)}",
             "reference": ""
         }
+    finally:
+        timings["total"] = round(time.perf_counter() - started, 3)
+        print(f"응답 단계별 소요 시간: {format_timings(timings)}")
 
-def summarize_content(content: str) -> str:
+def request_content_summary(content: str) -> Optional[str]:
+    """참고 문서 요약 API를 호출합니다. 실패하면 None을 반환합니다."""
     try:
-        response = requests.post(
-            API_URL,
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            },
+        response = upstage_client.post(
+            "chat/completions",
             json={
-                "model": "solar-1-mini-chat",
+                "model": REFERENCE_SUMMARY_MODEL,
                 "messages": [
                     {"role": "system", "content": "주어진 내용을 1-2줄로 요약해주세요."},
                     {"role": "user", "content": content}
@@ -408,91 +651,53 @@ def summarize_content(content: str) -> str:
             response_data = response.json()
             if 'choices' in response_data and len(response_data['choices']) > 0:
                 return response_data['choices'][0]['message']['content']
-        return content[:100] + "..."
+        return None
     except Exception as e:
         print(f"요약 중 오류 발생: {str(e)}")
-        return content[:100] + "..."
+        return None
+
+def summarize_content(content: str) -> str:
+    summary = request_content_summary(content)
+    return summary if summary is not None else content[:100] + "..."
 
 def stream_chat_response_with_memory(
     messages: List[Dict],
     system_prompt: str,
     user_input: str,
     use_rag: bool = False,
-    pdf_summary: str = None
+    pdf_summary: str = None,
+    timings: Optional[Dict] = None,
+    session_id: Optional[str] = None,
+    document_id: Optional[int] = None
 ) -> Generator[str, None, None]:
+    """
+    채팅 응답을 스트리밍합니다.
+    RAG 필요성 판단과 검색을 동시에 시작하고, 참고 자료 요약은 답변이 스트리밍되는 동안 만듭니다.
+    
+    timings: 단계별 소요 시간(초)을 기록할 dict (선택)
+        rag_decision(로컬 라우터), rag_llm_decision(확신이 낮을 때만), retrieval, first_token(턴 시작부터 첫 토큰까지), answer, reference_wait, total
+    session_id: 세션 ID (주어지면 저장된 누적 요약에 반영된 기록을 요약으로 대체하고, 답변 후 요약을 갱신)
+    document_id: 활성 문서 ID (주어지면 질문과 관련된 페이지를 골라 답변에 포함)
+    """
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
     try:
-        # RAG 필요성 판단
-        should_use_rag_flag = should_use_rag(user_input, pdf_summary, messages) if use_rag else False
-        
-        if should_use_rag_flag:
-            # PDF 요약이 있는 경우 검색 쿼리에 포함
-            search_query = user_input
-            if pdf_summary:
-                search_query = f"PDF 내용: {pdf_summary}\n\n질문: {user_input}"
-            
-            # RAG API 호출
-            rag_response = call_rag_api(search_query)
-            
-            if rag_response and "results" in rag_response and rag_response["results"]:
-                # 시스템 프롬프트용 참고 자료 (원본)
-                system_reference = '### 📚 참고 사례\n\n'
-                system_reference += '아래는 참고용 사례입니다. 이 사례들은 답변의 참고 자료로만 사용되며, 직접적인 답변은 아닙니다.\n\n'
-                
-                # 사용자에게 보여줄 참고 자료 (요약)
-                display_reference = '### 📚 참고 사례\n\n'
-                
-                for i, result in enumerate(rag_response["results"][:3], 1):
-                    content = result.get("content", "내용 없음")
-                    filename = result.get("filename", "N/A")
-                    similarity = result.get("similarity", 0)
-                    
-                    # 시스템 프롬프트용 원본 내용
-                    system_reference += f'**사례 {i}**\n'
-                    system_reference += f'**파일명**: {filename}\n\n'
-                    system_reference += f'**내용**:\n{content}\n\n'
-                    system_reference += f'**유사도**: {similarity:.3f}\n\n'
-                    system_reference += '---\n\n'
-                    
-                    # 사용자에게 보여줄 요약 내용
-                    summarized_content = summarize_content(content)
-                    display_reference += f'**사례 {i}**\n'
-                    display_reference += f'**파일명**: {filename}\n\n'
-                    display_reference += f'**내용**:\n{summarized_content}\n\n'
-                    display_reference += f'**유사도**: {similarity:.3f}\n\n'
-                    display_reference += '---\n\n'
-                
-                system_prompt = f"""{system_prompt}
-
-아래의 참고 사례를 바탕으로 답변해주세요. 이 사례들은 참고용이며, 질문과는 관련이 없습니다. 
-문서를 분석할 때 아래의 사례를 적절히 인용하여 답변하십시오.
-
-{system_reference}"""
-            else:
-                system_reference = "참고할 수 있는 사례를 찾을 수 없습니다."
-                display_reference = system_reference
-        else:
-            system_reference = ""
-            display_reference = ""
-            
-        if pdf_summary:
-            system_prompt += f"""아래의 사례는 유저가 직접적으로 입력한 pdf의 요약입니다. 위 사례를 바탕으로 아래 문서에 대한 유저의 질문에 답변해주세요.
-            \n\n
-{pdf_summary}"""
+        should_use_rag_flag, results = prepare_rag_context(user_input, pdf_summary, messages, use_rag, timings)
+        # 표시용 요약은 답변 스트리밍과 동시에 진행
+        summary_futures = submit_reference_summaries(results)
 
         # Upstage API 호출
-        response = requests.post(
-            API_URL,
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            },
+        answer_started = time.perf_counter()
+        response = upstage_client.post(
+            "chat/completions",
             json={
                 "model": "solar-1-mini-chat",
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    *messages,
-                    {"role": "user", "content": user_input}
-                ],
+                "messages": build_turn_messages(
+                    build_answer_system_prompt(
+                        system_prompt, results, select_document_context(document_id, user_input, pdf_summary)
+                    ),
+                    messages, user_input, session_id
+                ),
                 "temperature": 0.7,
                 "max_tokens": 1000,
                 "stream": True
@@ -514,6 +719,8 @@ def stream_chat_response_with_memory(
                                 if 'choices' in chunk and len(chunk['choices']) > 0:
                                     delta = chunk['choices'][0].get('delta', {})
                                     if 'content' in delta:
+                                        if "first_token" not in timings:
+                                            timings["first_token"] = round(time.perf_counter() - started, 3)
                                         yield delta['content']
                             except json.JSONDecodeError as e:
                                 print(f"JSON 디코딩 오류: {e}")
@@ -521,10 +728,16 @@ def stream_chat_response_with_memory(
                     except UnicodeDecodeError as e:
                         print(f"유니코드 디코딩 오류: {e}")
                         continue
+            timings["answer"] = round(time.perf_counter() - answer_started, 3)
+            refresh_conversation_summary(messages, session_id)
             
-            # 참고 자료가 있는 경우 마지막에 추가 (요약된 버전)
-            if should_use_rag_flag and display_reference:
-                yield f"\n\n{display_reference}"
+            # 참고 자료가 있는 경우 마지막에 추가 (요약된 버전, 사례별로 요약이 끝나는 대로 표시)
+            if should_use_rag_flag:
+                yield "\n\n"
+                if results:
+                    yield from iter_display_reference(results, summary_futures, timings)
+                else:
+                    yield NO_REFERENCE_MESSAGE
         else:
             print(f"API 호출 실패: {response.status_code} - {response.text}")
             yield "죄송합니다. 응답을 생성하는 중에 오류가 발생했습니다."
@@ -532,61 +745,57 @@ def stream_chat_response_with_memory(
     except Exception as e:
         print(f"Error in stream_chat_response_with_memory: {str(e)}")
         yield f"오류가 발생했습니다: {str(e)}"
+    finally:
+        timings["total"] = round(time.perf_counter() - started, 3)
+        print(f"응답 단계별 소요 시간: {format_timings(timings)}")
 
 def summarize_document(content):
-    """문서를 요약합니다."""
+    """문서를 요약합니다. (긴 문서는 섹션별로 나누어 요약한 뒤 합침)"""
     try:
-        response = requests.post(
-            API_URL,
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            },
+        return summarize_long_document(content)
+    except Exception as e:
+        return f"문서 요약 중 오류가 발생했습니다: {str(e)}"
+
+def agent_needs_rag(document_content, user_input):
+    """agent에게 문서 기반 질문에 추가 정보가 필요한지 묻습니다. 실패하면 None을 반환합니다."""
+    try:
+        agent_response = upstage_client.post(
+            "chat/completions",
             json={
                 "model": "solar-pro2-preview",
                 "messages": [
-                    {"role": "system", "content": "문서의 내용을 간단히 한국어로로 요약해주세요."},
-                    {"role": "user", "content": content}
+                    {"role": "system", "content": "당신은 사용자의 질문에 답변하기 위해 추가 정보가 필요한지 판단하는 AI 어시스턴트입니다. 'yes' 또는 'no'로만 답변해주세요."},
+                    {"role": "user", "content": f"다음 질문에 답변하기 위해 추가 정보나 참고 자료가 필요할까요?\n\n문서: {document_content}\n\n질문: {user_input}"}
                 ]
             }
         )
-        return response.json()["choices"][0]["message"]["content"]
+        return agent_response.json()["choices"][0]["message"]["content"].lower().strip() == "yes"
     except Exception as e:
-        return f"문서 요약 중 오류가 발생했습니다: {str(e)}"
+        print(f"RAG 필요성 판단 중 오류 발생: {str(e)}")
+        return None
 
-def document_based_qa_with_memory(document_content, user_input, messages, system_prompt, use_rag=False):
-    """문서 기반 질문 답변을 생성합니다."""
+def document_based_qa_with_memory(document_content, user_input, messages, system_prompt, use_rag=False, document_summary=None):
+    """
+    문서 기반 질문 답변을 생성합니다.
+    
+    document_summary: 문서 요약 또는 제목 (RAG 필요 여부 판단에 문서 전체 대신 사용 - 없으면 문서 앞부분 사용)
+    """
     try:
         reference_info = ""
         
         # RAG 검색이 필요한 경우
         if use_rag:
-            # 먼저 agent에게 RAG 검색이 필요한지 물어봄
-            agent_response = requests.post(
-                API_URL,
-                headers={
-                    "Authorization": f"Bearer {API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "solar-pro2-preview",
-                    "messages": [
-                        {"role": "system", "content": "당신은 사용자의 질문에 답변하기 위해 추가 정보가 필요한지 판단하는 AI 어시스턴트입니다. 'yes' 또는 'no'로만 답변해주세요."},
-                        {"role": "user", "content": f"다음 질문에 답변하기 위해 추가 정보나 참고 자료가 필요할까요?\n\n문서: {document_content}\n\n질문: {user_input}"}
-                    ]
-                }
+            # 먼저 RAG 검색이 필요한지 판단 (로컬 라우터의 확신이 낮을 때만 agent에게 물어봄)
+            routing_context = document_summary or document_content[:ROUTING_CONTEXT_CHARS]
+            needs_rag = rag_router.decide(
+                user_input, routing_context,
+                fallback=lambda: agent_needs_rag(routing_context, user_input)
             )
             
-            needs_rag = agent_response.json()["choices"][0]["message"]["content"].lower().strip() == "yes"
-            
             if needs_rag:
                 # RAG 검색 실행
-                response = requests.post(
-                    API_URL,
-                    headers={
-                        "Authorization": f"Bearer {API_KEY}",
-                        "Content-Type": "application/json"
-                    },
+                response = upstage_client.post(
+                    "chat/completions",
                     json={
                         "model": "solar-pro2-preview",
                         "messages": [{"role": "user", "content": user_input}],
@@ -605,12 +814,8 @@ def document_based_qa_with_memory(document_content, user_input, messages, system
                     system_prompt += f"\n\n참고 자료:\n{reference_info}"
         
         # 문서 기반 응답 생성
-        response = requests.post(
-            API_URL,
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            },
+        response = upstage_client.post(
+            "chat/completions",
             json={
                 "model": "solar-pro2-preview",
                 "messages": [
@@ -632,48 +837,46 @@ def document_based_qa_with_memory(document_content, user_input, messages, system
         }
 
 # 기존 함수들 (하위 호환성 유지)
-def build_conversation_messages(chat_history, system_prompt, current_input, recent_count=7):
+def get_history_context(chat_history, recent_count=RECENT_COUNT, session_id=None):
     """
-    대화 기록을 포함한 메시지 구성 (프로필 기능 없음)
+    대화 기록을 (이전 대화 요약, 그대로 유지할 최근 대화)로 나눕니다.
     
     Args:
         chat_history: 현재 세션의 메시지 히스토리
-        system_prompt: 기본 시스템 프롬프트
-        current_input: 현재 사용자 입력
         recent_count: 그대로 유지할 최근 대화 수 (기본값: 7)
+        session_id: 세션 ID (주어지면 DB에 저장된 누적 요약을 갱신하여 사용)
     
     Returns:
-        OpenAI 형식의 메시지 리스트
+        tuple: (이전 대화 요약 - 없으면 "", 최근 대화 리스트)
     """
+    # 현재 세션의 대화 기록이 recent_count*2 개 이하이면 모든 대화 유지
+    if len(chat_history) <= recent_count * 2:
+        return "", chat_history
+    
+    # 이전 대화들 (요약 대상) - 현재 세션만
+    old_history = chat_history[:-recent_count*2]
+    # 최근 대화들 (그대로 유지) - 현재 세션만
+    recent_history = chat_history[-recent_count*2:]
+    
+    # 현재 세션의 이전 대화 요약 (세션 ID가 있으면 저장된 요약에 새 메시지만 반영)
+    if session_id:
+        return get_rolling_conversation_summary(session_id, old_history), recent_history
+    return summarize_conversation_history(old_history), recent_history
+
+def compose_conversation_messages(system_prompt, conversation_summary, history, current_input):
+    """시스템 프롬프트, 이전 대화 요약, 최근 대화, 현재 입력으로 OpenAI 형식의 메시지 리스트를 만듭니다."""
     messages = [{"role": "system", "content": system_prompt}]
     
-    # 현재 세션의 대화 기록이 recent_count*2 개를 초과하는 경우
-    if len(chat_history) > recent_count * 2:
-        # 이전 대화들 (요약 대상) - 현재 세션만
-        old_history = chat_history[:-recent_count*2]
-        # 최근 대화들 (그대로 유지) - 현재 세션만
-        recent_history = chat_history[-recent_count*2:]
-        
-        # 현재 세션의 이전 대화 요약 생성
-        conversation_summary = summarize_conversation_history(old_history)
-        
-        # 요약이 있으면 시스템 메시지에 추가
-        if conversation_summary:
-            enhanced_system_prompt = f"""{system_prompt}
+    # 요약이 있으면 시스템 메시지에 추가
+    if conversation_summary:
+        messages[0]["content"] = f"""{system_prompt}
 
 {conversation_summary}
 
 위는 현재 세션의 이전 대화 요약입니다. 이를 참고하여 답변해주세요."""
-            messages[0]["content"] = enhanced_system_prompt
-        
-        # 최근 대화만 메시지에 추가
-        target_history = recent_history
-    else:
-        # 대화가 적으면 현재 세션의 모든 대화 유지
-        target_history = chat_history
     
     # 현재 세션의 대화 기록을 OpenAI 형식으로 변환
-    for msg in target_history:
+    for msg in history:
         if msg["role"] in ["user", "assistant"]:
             content = msg["content"]
             # 특수 형식 메시지 제외
@@ -688,6 +891,61 @@ def build_conversation_messages(chat_history, system_prompt, current_input, rece
     
     return messages
 
+def build_conversation_messages(chat_history, system_prompt, current_input, recent_count=RECENT_COUNT, session_id=None):
+    """
+    대화 기록을 포함한 메시지 구성 (프로필 기능 없음)
+    
+    Args:
+        chat_history: 현재 세션의 메시지 히스토리
+        system_prompt: 기본 시스템 프롬프트
+        current_input: 현재 사용자 입력
+        recent_count: 그대로 유지할 최근 대화 수 (기본값: 7)
+        session_id: 세션 ID (주어지면 DB에 저장된 누적 요약을 갱신하여 사용)
+    
+    Returns:
+        OpenAI 형식의 메시지 리스트
+    """
+    conversation_summary, history = get_history_context(chat_history, recent_count, session_id)
+    return compose_conversation_messages(system_prompt, conversation_summary, history, current_input)
+
+def get_stored_history_context(chat_history, recent_count=RECENT_COUNT, session_id=None):
+    """
+    DB에 저장된 누적 요약과 아직 요약에 반영되지 않은 대화를 반환합니다. (LLM을 호출하지 않음)
+    저장된 요약이 없거나 이전 대화가 바뀌었으면 대화 기록을 그대로 반환합니다.
+    
+    Returns:
+        tuple: (저장된 요약 - 없으면 "", 요약에 반영되지 않은 대화 리스트)
+    """
+    if not session_id or len(chat_history) <= recent_count * 2:
+        return "", chat_history
+    
+    stored = db.get_conversation_summary(session_id)
+    if (
+        not stored
+        or stored["message_count"] > len(chat_history)
+        or stored["history_hash"] != hash_history(chat_history[:stored["message_count"]])
+    ):
+        return "", chat_history
+    return stored["summary"], chat_history[stored["message_count"]:]
+
+def build_turn_messages(system_prompt, messages, user_input, session_id=None):
+    """
+    답변 요청에 보낼 메시지 리스트
+    session_id가 있으면 저장된 누적 요약에 반영된 대화를 그 요약으로 대체합니다. (요약 갱신은 답변 후 refresh_conversation_summary에서)
+    """
+    if not session_id:
+        return [{"role": "system", "content": system_prompt}, *messages, {"role": "user", "content": user_input}]
+    conversation_summary, history = get_stored_history_context(messages, session_id=session_id)
+    return compose_conversation_messages(system_prompt, conversation_summary, history, user_input)
+
+def refresh_conversation_summary(messages, session_id):
+    """
+    답변이 끝난 뒤 최근 대화 범위를 벗어난 기록을 세션의 누적 요약에 반영합니다. (백그라운드 - 다음 턴부터 사용)
+    """
+    if not session_id or len(messages) <= RECENT_COUNT * 2:
+        return None
+    return turn_executor.submit(get_rolling_conversation_summary, session_id, messages[:-RECENT_COUNT * 2])
+
 def answer_question(question, context=None):
     """
     질문 답변 함수 (메모리 없음 - 하위 호환성)
@@ -698,7 +956,7 @@ def document_based_qa(document_summary, user_question):
     """
     문서 기반 질문 답변 함수 (메모리 없음 - 하위 호환성)
     """
-    return document_based_qa_with_memory(document_summary, user_question, [], "")
+    return document_based_qa_with_memory(document_summary, user_question, [], "", document_summary=document_summary)
 
 def stream_chat_response(messages):
     """
@@ -717,12 +975,8 @@ def stream_chat_response(messages):
 def summarize_text(text, max_length=100):
     """텍스트를 간단히 요약합니다."""
     try:
-        response = requests.post(
-            API_URL,
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            },
+        response = upstage_client.post(
+            "chat/completions",
             json={
                 "model": "solar-pro2-preview",
                 "messages": [
@@ -739,12 +993,8 @@ def summarize_text(text, max_length=100):
 def get_llm_response(system_prompt, user_input):
     """LLM을 사용하여 응답을 생성합니다."""
     try:
-        response = requests.post(
-            API_URL,
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            },
+        response = upstage_client.post(
+            "chat/completions",
             json={
                 "model": "solar-pro2-preview",
                 "messages": [
@@ -761,12 +1011,8 @@ def get_llm_response(system_prompt, user_input):
 def stream_llm_response(system_prompt, user_input):
     """LLM을 사용하여 스트리밍 응답을 생성합니다."""
     try:
-        response = requests.post(
-            API_URL,
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            },
+        response = upstage_client.post(
+            "chat/completions",
             json={
                 "model": "solar-pro2-preview",
                 "messages": [
@@ -58,6 +58,54 @@ class ChatDatabase:
                 )
             """)
             
+            # 문서 페이지 테이블 (페이지별 텍스트와 요소 구조)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS document_pages (
+                    document_id INTEGER NOT NULL,
+                    page INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    elements TEXT,
+                    PRIMARY KEY (document_id, page),
+                    FOREIGN KEY (document_id) REFERENCES documents (id)
+                )
+            """)
+            
+            # 대화 요약 테이블 (최근 대화 범위를 벗어난 이전 대화의 누적 요약)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_summaries (
+                    session_id TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    message_count INTEGER NOT NULL,
+                    history_hash TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (session_id) REFERENCES sessions (session_id)
+                )
+            """)
+            
+            # PDF 처리 작업 테이블 (utils/ingestion.py의 작업 큐)
+            # owner/heartbeat_at: 처리 중인 프로세스와 마지막 생존 신호 시각 (오래된 작업만 다시 대기열로)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    force_ocr INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL DEFAULT 0,
+                    message TEXT,
+                    notices TEXT,
+                    error TEXT,
+                    document_id INTEGER,
+                    owner TEXT,
+                    heartbeat_at REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    FOREIGN KEY (session_id) REFERENCES sessions (session_id)
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status ON ingestion_jobs (status, created_at)")
+            
             conn.commit()
     
     def create_session(self, session_name: str = None) -> str:
@@ -87,6 +135,9 @@ class ChatDatabase:
                 for (old_session_id,) in old_sessions:
                     # 관련 데이터 모두 삭제
                     cursor.execute("DELETE FROM messages WHERE session_id = ?", (old_session_id,))
+                    cursor.execute("DELETE FROM conversation_summaries WHERE session_id = ?", (old_session_id,))
+                    cursor.execute("DELETE FROM ingestion_jobs WHERE session_id = ?", (old_session_id,))
+                    cursor.execute("DELETE FROM document_pages WHERE document_id IN (SELECT id FROM documents WHERE session_id = ?)", (old_session_id,))
                     cursor.execute("DELETE FROM documents WHERE session_id = ?", (old_session_id,))
                     cursor.execute("DELETE FROM sessions WHERE session_id = ?", (old_session_id,))
                     print(f"🗑️ 오래된 세션 삭제: {old_session_id[:8]}...")
@@ -140,6 +191,9 @@ class ChatDatabase:
             
             # 관련 데이터 모두 삭제
             cursor.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            cursor.execute("DELETE FROM conversation_summaries WHERE session_id = ?", (session_id,))
+            cursor.execute("DELETE FROM ingestion_jobs WHERE session_id = ?", (session_id,))
+            cursor.execute("DELETE FROM document_pages WHERE document_id IN (SELECT id FROM documents WHERE session_id = ?)", (session_id,))
             cursor.execute("DELETE FROM documents WHERE session_id = ?", (session_id,))
             cursor.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
             
@@ -186,22 +240,71 @@ class ChatDatabase:
             
             return messages
     
-    def save_document(self, session_id: str, filename: str, content: str = None, summary: str = None):
-        """문서 정보 저장"""
+    def save_document(self, session_id: str, filename: str, content: str = None, summary: str = None, pages: List[Dict] = None) -> int:
+        """문서 정보 저장 (pages가 주어지면 페이지별 구조도 함께 저장)"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO documents (session_id, filename, content, summary)
                 VALUES (?, ?, ?, ?)
             """, (session_id, filename, content, summary))
+            document_id = cursor.lastrowid
             conn.commit()
+        
+        if pages:
+            self.save_document_pages(document_id, pages)
+        return document_id
+    
+    def save_document_pages(self, document_id: int, pages: List[Dict]):
+        """
+        문서의 페이지별 텍스트와 요소 구조 저장 (이미 저장된 페이지는 덮어씀)
+        
+        pages: [{"page": 페이지, "text": 텍스트, "elements": [{"category", "bbox", "start", "end"}, ...]}, ...]
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT OR REPLACE INTO document_pages (document_id, page, text, elements)
+                VALUES (?, ?, ?, ?)
+            """, [
+                (document_id, page['page'], page['text'], json.dumps(page.get('elements', []), ensure_ascii=False, separators=(',', ':')))
+                for page in pages
+            ])
+            conn.commit()
+    
+    def get_document_pages(self, document_id: int, page_numbers: List[int] = None) -> List[Dict]:
+        """문서의 페이지별 구조 조회 (page_numbers가 주어지면 해당 페이지만)"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            if page_numbers is None:
+                cursor.execute("""
+                    SELECT page, text, elements FROM document_pages
+                    WHERE document_id = ?
+                    ORDER BY page ASC
+                """, (document_id,))
+            else:
+                placeholders = ",".join("?" * len(page_numbers))
+                cursor.execute(f"""
+                    SELECT page, text, elements FROM document_pages
+                    WHERE document_id = ? AND page IN ({placeholders})
+                    ORDER BY page ASC
+                """, (document_id, *page_numbers))
+            
+            return [
+                {
+                    'page': row[0],
+                    'text': row[1],
+                    'elements': json.loads(row[2]) if row[2] else []
+                }
+                for row in cursor.fetchall()
+            ]
     
     def get_document(self, session_id: str) -> Optional[Dict]:
         """세션의 문서 정보 조회"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT filename, content, summary, uploaded_at
+                SELECT filename, content, summary, uploaded_at, id
                 FROM documents
                 WHERE session_id = ?
                 ORDER BY uploaded_at DESC
@@ -214,15 +317,75 @@ class ChatDatabase:
                     'filename': row[0],
                     'content': row[1],
                     'summary': row[2],
-                    'uploaded_at': row[3]
+                    'uploaded_at': row[3],
+                    'id': row[4]
+                }
+            return None
+    
+    def get_document_by_id(self, document_id: int) -> Optional[Dict]:
+        """문서 ID로 문서 정보 조회"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT filename, content, summary, uploaded_at, id, session_id
+                FROM documents
+                WHERE id = ?
+            """, (document_id,))
+            
+            row = cursor.fetchone()
+            if row:
+                return {
+                    'filename': row[0],
+                    'content': row[1],
+                    'summary': row[2],
+                    'uploaded_at': row[3],
+                    'id': row[4],
+                    'session_id': row[5]
+                }
+            return None
+    
+    def get_conversation_summary(self, session_id: str) -> Optional[Dict]:
+        """세션의 누적 대화 요약 조회"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT summary, message_count, history_hash
+                FROM conversation_summaries
+                WHERE session_id = ?
+            """, (session_id,))
+            
+            row = cursor.fetchone()
+            if row:
+                return {
+                    'summary': row[0],
+                    'message_count': row[1],
+                    'history_hash': row[2]
                 }
             return None
     
+    def save_conversation_summary(self, session_id: str, summary: str, message_count: int, history_hash: str):
+        """
+        세션의 누적 대화 요약 저장
+        
+        message_count: 요약에 반영된 메시지 수 (세션 처음부터)
+        history_hash: 요약에 반영된 메시지들의 해시 (이전 대화가 바뀌었는지 확인용)
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT OR REPLACE INTO conversation_summaries (session_id, summary, message_count, history_hash, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (session_id, summary, message_count, history_hash))
+            conn.commit()
+    
     def clear_all_data(self):
         """모든 데이터 삭제 (개발/테스트용)"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM messages")
+            cursor.execute("DELETE FROM conversation_summaries")
+            cursor.execute("DELETE FROM ingestion_jobs")
+            cursor.execute("DELETE FROM document_pages")
             cursor.execute("DELETE FROM documents")
             cursor.execute("DELETE FROM sessions")
             conn.commit()
@@ -230,17 +393,8 @@ class ChatDatabase:
     def update_session_title_from_first_message(self, session_id: str, first_user_message: str):
         """첫 번째 사용자 메시지를 기반으로 세션 제목 생성 및 업데이트"""
         try:
-            # OpenAI 클라이언트를 직접 사용하여 제목 생성
-            from openai import OpenAI
-            import os
-            from dotenv import load_dotenv
-            
-            load_dotenv()
-            
-            client = OpenAI(
-                api_key=os.getenv("UPSTAGE_API_KEY"),
-                base_url="https://api.upstage.ai/v1"
-            )
+            # 공용 HTTP 클라이언트로 제목 생성 (연결 재사용, 타임아웃/재시도 적용)
+            from .http_client import upstage_client
             
             # 문서 업로드가 포함된 메시지인지 확인
             document_info = ""
@@ -282,12 +436,10 @@ class ChatDatabase:
                 {"role": "user", "content": title_prompt}
             ]
             
-            response = client.chat.completions.create(
-                model="solar-pro2-preview",
-                messages=messages
-            )
-            
-            generated_title = response.choices[0].message.content
+            generated_title = upstage_client.chat({
+                "model": "solar-pro2-preview",
+                "messages": messages
+            }, timeout=30)
             
             if generated_title and len(generated_title.strip()) > 0:
                 # 생성된 제목 정리 (따옴표, 개행 등 제거)
@@ -0,0 +1,164 @@
+''' Upstage API 공용 HTTP 클라이언트 '''
+
+import os
+import time
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 모든 Upstage API 호출의 기준 주소 (로컬 스텁 서버 주소로 교체 가능)
+UPSTAGE_API_URL = os.getenv("UPSTAGE_API_URL", "https://api.upstage.ai/v1").rstrip("/")
+UPSTAGE_API_KEY = os.getenv("UPSTAGE_API_KEY")
+
+# 엔드포인트별 동시 요청 수 제한 (프로세스 전체 공유)
+ENDPOINT_LIMITS = {
+    "chat/completions": int(os.getenv("UPSTAGE_CHAT_CONNECTIONS", "16")),
+    "embeddings": int(os.getenv("UPSTAGE_EMBEDDING_CONNECTIONS", "8")),
+    "document-digitization": int(os.getenv("UPSTAGE_PARSE_CONNECTIONS", "4")),
+}
+DEFAULT_ENDPOINT_LIMIT = 8
+CONNECT_TIMEOUT = 10  # 연결 타임아웃(초)
+READ_TIMEOUT = 120  # 기본 응답 타임아웃(초)
+MAX_RETRIES = 2  # 기본 재시도 횟수
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class UpstageClient:
+    """
+    Upstage API 호출용 공유 HTTP 클라이언트
+
+    - 하나의 requests.Session을 모든 스레드가 공유하여 keep-alive 연결을 재사용 (요청마다 TLS 핸드셰이크 없음)
+    - 엔드포인트별 세마포어로 동시 요청 수를 제한하고, 연결 풀 크기도 그 합에 맞춤
+    - 429/5xx 및 연결 오류는 지터가 포함된 지수 백오프로 재시도 (Retry-After 헤더 우선)
+    - 기준 주소(base_url)를 바꾸면 모든 호출이 같은 서버로 향함
+    """
+
+    def __init__(
+        self,
+        base_url=UPSTAGE_API_URL,
+        api_key=UPSTAGE_API_KEY,
+        endpoint_limits=None,
+        max_retries=MAX_RETRIES,
+        backoff_base=1.0,
+        backoff_max=30.0,
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+    ):
+        """
+        base_url: API 기준 주소
+        api_key: Upstage API 키
+        endpoint_limits: {엔드포인트 경로: 최대 동시 요청 수}
+        max_retries: 기본 재시도 횟수
+        backoff_base, backoff_max: 재시도 대기 시간(초)의 기준값과 상한
+        timeout: 기본 타임아웃 (연결, 응답) 초
+        """
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.endpoint_limits = dict(ENDPOINT_LIMITS if endpoint_limits is None else endpoint_limits)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+        pool_size = sum(self.endpoint_limits.values()) + DEFAULT_ENDPOINT_LIMIT
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def url(self, endpoint):
+        """엔드포인트 경로의 전체 주소 (이미 전체 주소이면 그대로 반환)"""
+        if endpoint.startswith(("http://", "https://")):
+            return endpoint
+        return f"{self.base_url}/{endpoint.lstrip('/')}"
+
+    def _semaphore(self, endpoint):
+        """엔드포인트별 동시 요청 제한 세마포어 (전체 주소로 요청해도 경로가 같으면 같은 제한을 공유)"""
+        path = endpoint.rstrip("/")
+        endpoint = next((name for name in self.endpoint_limits if path.endswith(name)), path)
+        with self._lock:
+            if endpoint not in self._semaphores:
+                limit = self.endpoint_limits.get(endpoint, DEFAULT_ENDPOINT_LIMIT)
+                self._semaphores[endpoint] = threading.BoundedSemaphore(max(1, limit))
+            return self._semaphores[endpoint]
+
+    def _backoff(self, attempt, response=None):
+        """재시도 전 대기 시간 계산 (Retry-After 헤더가 있으면 우선 사용)"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def post(self, endpoint, json=None, data=None, files=None, stream=False, timeout=None, max_retries=None, api_key=None):
+        """
+        POST 요청을 보내고 최종 응답을 반환합니다.
+        재시도 가능한 상태 코드는 재시도 후 마지막 응답을 그대로 반환하므로 상태 코드는 호출하는 쪽에서 확인합니다.
+        stream=True이면 응답 헤더를 받은 시점에 동시 요청 슬롯을 반환합니다.
+
+        Args:
+            endpoint: 엔드포인트 경로 (예: "chat/completions") 또는 전체 주소
+            json, data, files: 요청 본문
+            stream: 스트리밍 응답 여부
+            timeout: 타임아웃(초) - 숫자 하나이면 응답 타임아웃으로 사용
+            max_retries: 재시도 횟수 (기본값: 클라이언트 설정)
+            api_key: 이 요청에만 사용할 API 키
+
+        Returns:
+            requests.Response
+
+        Raises:
+            requests.RequestException: 재시도 후에도 연결 오류/타임아웃이 발생한 경우
+        """
+        if isinstance(timeout, (int, float)):
+            timeout = (CONNECT_TIMEOUT, timeout)
+        timeout = timeout or self.timeout
+        max_retries = self.max_retries if max_retries is None else max_retries
+        headers = {"Authorization": f"Bearer {api_key or self.api_key}"}
+        semaphore = self._semaphore(endpoint)
+        url = self.url(endpoint)
+
+        for attempt in range(max_retries + 1):
+            response = None
+            try:
+                with semaphore:
+                    response = self.session.post(
+                        url, headers=headers, json=json, data=data, files=files, stream=stream, timeout=timeout
+                    )
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+                    return response
+                reason = f"{response.status_code}"
+                response.close()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= max_retries:
+                    raise
+                reason = str(e)
+
+            delay = self._backoff(attempt, response)
+            self.logger.warning(f"{endpoint} 요청 재시도 {attempt + 1}/{max_retries} ({delay:.1f}초 후): {reason}")
+            time.sleep(delay)
+
+    def chat(self, payload, timeout=None, max_retries=None):
+        """
+        채팅 API를 호출하고 응답 메시지 내용을 반환합니다.
+
+        Raises:
+            requests.HTTPError: 최종 응답이 200이 아닌 경우
+        """
+        response = self.post("chat/completions", json=payload, timeout=timeout, max_retries=max_retries)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+
+# 전역 클라이언트 인스턴스
+upstage_client = UpstageClient()
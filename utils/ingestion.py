@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional
+from .database import db
+from .pdf_upload import process_document
+from .chat import summarize_document
+
+UPLOAD_DIR = os.path.join("/tmp", "ingestion_uploads")  # 처리 대기 중인 PDF 임시 저장 위치
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))  # 동시에 처리할 PDF 수 (프로세스 전체)
+ACTIVE_STATUSES = ("queued", "running")
+HEARTBEAT_INTERVAL = 10  # 처리 중인 작업의 생존 신호 갱신 간격(초)
+STALE_AFTER = 60  # 이 시간(초) 동안 생존 신호가 없는 running 작업은 처리하던 프로세스가 종료된 것으로 보고 다시 대기열로
+
+
+class JobReporter:
+    """process_document의 메시지와 진행률을 작업 상태에 기록합니다. (StreamlitReporter 대신 사용)"""
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.job_id = job_id
+        self.notices = []  # 사용자에게 보여줄 경고/오류 메시지
+
+    def info(self, message):
+        self.queue.update(self.job_id, message=message)
+
+    def warning(self, message):
+        self.notices.append(message)
+        self.queue.update(self.job_id, message=message, notices=json.dumps(self.notices, ensure_ascii=False))
+
+    def error(self, message):
+        self.warning(message)
+
+    def success(self, message):
+        self.queue.update(self.job_id, message=message)
+
+    def progress(self, fraction, text):
+        self.queue.update(self.job_id, progress=fraction, message=text)
+
+    def clear(self):
+        pass
+
+
+class IngestionQueue:
+    """
+    PDF 처리(파싱 + 요약) 작업 큐
+
+    작업 상태는 채팅 DB의 ingestion_jobs 테이블에 저장되고, 프로세스 내 worker 스레드가 처리합니다.
+    업로드한 Streamlit 실행이 끝나거나 연결이 끊겨도 작업은 계속되며, 결과는 documents 테이블에 저장됩니다.
+    대기 중인 작업은 실행 중인 작업이 적은 세션부터, 같은 조건이면 먼저 들어온 순서로 처리합니다.
+    처리 중인 작업에는 담당 큐(owner)와 생존 신호(heartbeat_at)를 기록하고, 생존 신호가 끊긴 작업만 다시 대기열에 넣습니다.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, upload_dir: str = UPLOAD_DIR, num_workers: int = INGESTION_WORKERS):
+        """
+        db_path: SQLite 파일 경로 (기본값: 채팅 DB - ChatDatabase로 초기화된 DB여야 함)
+        upload_dir: 처리 대기 중인 PDF를 저장할 디렉토리
+        num_workers: worker 스레드 수
+        """
+        self.db_path = db_path or db.db_path
+        self.upload_dir = upload_dir
+        self.num_workers = max(1, num_workers)
+        self.logger = logging.getLogger(__name__)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"  # 이 큐가 처리 중인 작업 표시
+        self._workers = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+        # ingestion_jobs 테이블은 ChatDatabase.init_database에서 생성
+        os.makedirs(self.upload_dir, exist_ok=True)
+
+    def start(self):
+        """worker 스레드와 생존 신호 스레드를 시작합니다. (여러 번 호출해도 한 번만 시작)"""
+        with self._lock:
+            if self._workers:
+                return
+            self.remove_orphan_uploads()
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f"ingestion-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            heartbeat = threading.Thread(target=self._heartbeat_loop, name="ingestion-heartbeat", daemon=True)
+            heartbeat.start()
+            self._workers.append(heartbeat)
+
+    def _heartbeat_loop(self):
+        """이 큐가 처리 중인 작업의 생존 신호를 주기적으로 갱신합니다."""
+        while True:
+            try:
+                with sqlite3.connect(self.db_path, timeout=30) as conn:
+                    conn.execute(
+                        "UPDATE ingestion_jobs SET heartbeat_at = ? WHERE owner = ? AND status = 'running'",
+                        (time.time(), self.owner)
+                    )
+                    conn.commit()
+            except Exception as e:
+                self.logger.warning(f"작업 생존 신호 갱신 실패: {e}")
+            time.sleep(HEARTBEAT_INTERVAL)
+
+    def remove_orphan_uploads(self):
+        """대기/처리 중인 작업이 없는 업로드 파일을 삭제합니다. (세션 삭제 등으로 작업이 사라진 경우)"""
+        with sqlite3.connect(self.db_path) as conn:
+            active_paths = {
+                row[0] for row in conn.execute(
+                    "SELECT file_path FROM ingestion_jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+                )
+            }
+        cutoff = time.time() - STALE_AFTER  # 방금 저장되어 아직 작업이 등록되지 않은 파일은 유지
+        for name in os.listdir(self.upload_dir):
+            path = os.path.join(self.upload_dir, name)
+            try:
+                if path not in active_paths and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def enqueue(self, session_id: str, filename: str, file_bytes: bytes, force_ocr: bool) -> str:
+        """PDF 처리 작업을 등록하고 작업 ID를 반환합니다."""
+        job_id = str(uuid.uuid4())
+        file_path = os.path.join(self.upload_dir, f"{job_id}.pdf")
+        with open(file_path, "wb") as f:
+            f.write(file_bytes)
+
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT INTO ingestion_jobs (job_id, session_id, filename, file_path, force_ocr, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)
+            """, (job_id, session_id, filename, file_path, int(force_ocr), now, now))
+            conn.commit()
+
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        """작업 상태 필드를 갱신합니다."""
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(f"UPDATE ingestion_jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+            conn.commit()
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """작업 상태 조회"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM ingestion_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def get_active_job(self, session_id: str) -> Optional[Dict]:
+        """세션에서 대기 중이거나 처리 중인 가장 최근 작업 조회"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("""
+                SELECT * FROM ingestion_jobs
+                WHERE session_id = ? AND status IN (?, ?)
+                ORDER BY created_at DESC
+                LIMIT 1
+            """, (session_id, *ACTIVE_STATUSES)).fetchone()
+        return self._to_dict(row)
+
+    def _to_dict(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["notices"] = json.loads(job["notices"]) if job["notices"] else []
+        return job
+
+    def claim_next(self) -> Optional[Dict]:
+        """대기 중인 작업 하나를 running 상태로 바꾸고 반환합니다. 없으면 None"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # 생존 신호가 끊긴 작업(처리하던 프로세스가 종료됨)은 다시 대기열로
+            now = time.time()
+            reclaimed = conn.execute("""
+                UPDATE ingestion_jobs SET status = 'queued', owner = NULL, updated_at = ?
+                WHERE status = 'running' AND COALESCE(heartbeat_at, updated_at) < ?
+            """, (now, now - STALE_AFTER)).rowcount
+            if reclaimed:
+                self.logger.warning(f"중단된 PDF 처리 작업 {reclaimed}건을 다시 대기열에 추가")
+            row = conn.execute("""
+                SELECT * FROM ingestion_jobs AS job
+                WHERE status = 'queued'
+                ORDER BY (
+                    SELECT COUNT(*) FROM ingestion_jobs AS running
+                    WHERE running.session_id = job.session_id AND running.status = 'running'
+                ), created_at
+                LIMIT 1
+            """).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE ingestion_jobs SET status = 'running', owner = ?, heartbeat_at = ?, updated_at = ? WHERE job_id = ?",
+                    (self.owner, now, now, row["job_id"])
+                )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return self._to_dict(row)
+
+    def _worker_loop(self):
+        while True:
+            try:
+                job = self.claim_next()
+            except Exception as e:
+                self.logger.error(f"작업 조회 실패: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(timeout=2)
+                self._wakeup.clear()
+                continue
+            self.run_job(job)
+
+    def run_job(self, job: Dict):
+        """PDF를 파싱하고 요약하여 documents 테이블에 저장합니다."""
+        job_id = job["job_id"]
+        started = time.time()
+        reporter = JobReporter(self, job_id)
+        try:
+            with open(job["file_path"], "rb") as f:
+                file_bytes = f.read()
+
+            plain_text, error, pages = process_document(
+                file_bytes, bool(job["force_ocr"]), return_pages=True, reporter=reporter
+            )
+            if error or not plain_text:
+                self.update(job_id, status="failed", error=error or "PDF에서 텍스트를 추출할 수 없습니다.")
+                return
+
+            # 요약은 토큰 제한으로 잘리기 전의 전체 페이지 텍스트로 생성
+            self.update(job_id, progress=1.0, message="📝 문서 요약 중...")
+            full_text = "\n\n".join(page["text"] for page in pages) if pages else plain_text
+            summary = summarize_document(full_text)
+            if self.get_job(job_id) is None:
+                # 처리 중 세션이 삭제됨
+                self.logger.info(f"세션이 삭제되어 처리 결과를 저장하지 않음: {job['filename']}")
+                return
+            document_id = db.save_document(
+                session_id=job["session_id"],
+                filename=job["filename"],
+                content=plain_text,
+                summary=summary,
+                pages=pages
+            )
+            self.update(job_id, status="done", document_id=document_id, message="✅ 처리 완료")
+            self.logger.info(f"PDF 처리 완료: {job['filename']} ({time.time() - started:.1f}초)")
+        except Exception as e:
+            self.logger.error(f"PDF 처리 실패: {job['filename']} - {e}")
+            self.update(job_id, status="failed", error=str(e))
+        finally:
+            if os.path.exists(job["file_path"]):
+                os.remove(job["file_path"])
+
+
+# 전역 작업 큐 인스턴스
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+
+
+class ParseResultCache:
+    """
+    Document Parse 결과 캐시 (SQLite)
+
+    (PDF 원본 SHA-256, 페이지 범위, OCR 모드, API 파라미터)를 키로 파싱 결과(요소 리스트)를 JSON으로 저장합니다.
+    분할된 PDF는 페이지 범위 청크별로 저장되므로, 일부 청크가 실패해도 재시도 시 실패한 청크만 다시 요청합니다.
+    전체 크기가 max_bytes를 넘으면 오래 사용하지 않은 결과부터 삭제합니다.
+    """
+
+    def __init__(self, db_path=None, max_bytes=512 * 1024 * 1024):
+        """
+        db_path: SQLite 파일 경로 (기본값: /tmp/parse_cache.db)
+        max_bytes: 저장할 결과의 최대 총 크기(바이트)
+        """
+        if db_path is None:
+            db_path = os.path.join("/tmp", "parse_cache.db")
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS parse_results (
+                    key TEXT PRIMARY KEY,
+                    file_hash TEXT NOT NULL,
+                    pages TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_parse_results_last_used ON parse_results (last_used)")
+            conn.commit()
+
+    @staticmethod
+    def hash_bytes(file_bytes):
+        """PDF 원본 해시"""
+        return hashlib.sha256(file_bytes).hexdigest()
+
+    def make_key(self, file_hash, pages, ocr_mode, params):
+        """(원본 해시, 페이지 범위, OCR 모드, API 파라미터)의 해시"""
+        raw = json.dumps([file_hash, pages, ocr_mode, params], sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, file_hash, pages, ocr_mode, params):
+        """캐시된 결과를 반환하고, 없으면 None을 반환합니다."""
+        key = self.make_key(file_hash, pages, ocr_mode, params)
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute("SELECT result FROM parse_results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE parse_results SET last_used = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+        return json.loads(row[0]) if row else None
+
+    def put(self, file_hash, pages, ocr_mode, params, result):
+        """파싱 결과를 저장하고, 최대 크기를 넘으면 오래된 결과를 삭제합니다."""
+        key = self.make_key(file_hash, pages, ocr_mode, params)
+        data = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO parse_results (key, file_hash, pages, result, size, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (key, file_hash, pages, data, len(data.encode()), now, now))
+            conn.commit()
+        self.evict()
+
+    def evict(self):
+        """최근 사용 순으로 누적 크기가 max_bytes를 넘는 결과를 삭제합니다."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                DELETE FROM parse_results WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS running_size
+                        FROM parse_results
+                    )
+                    WHERE running_size > ?
+                )
+            """, (self.max_bytes,))
+            conn.commit()
+
+    def total_size(self):
+        """저장된 결과의 총 크기(바이트)"""
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM parse_results").fetchone()[0]
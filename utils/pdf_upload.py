@@ -3,187 +3,399 @@ import requests
 import os
 import json
 import io
+import bisect
+import itertools
+import hashlib
+import logging
+import threading
 import tiktoken
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 from PyPDF2 import PdfReader, PdfWriter
-from langchain_upstage import ChatUpstage
+from .parse_cache import ParseResultCache
+from .http_client import upstage_client
+from .text_utils import estimate_tokens, truncate_by_estimated_tokens
 load_dotenv()
 
-UPSTAGE_API_KEY = os.getenv("UPSTAGE_API_KEY")
+logger = logging.getLogger(__name__)
+
 MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB in bytes
 MAX_PAGES_PER_CHUNK = 90  # Upstage Synchronous API 제한: 100페이지 (안정성을 위해 90페이지로 설정)
 MAX_TOKENS = 30000  # 토큰 제한
+PARSE_WORKERS = int(os.getenv("DOCUMENT_PARSE_WORKERS", "4"))  # 분할된 청크 동시 요청 수
+PARSE_MAX_RETRIES = 3  # 청크별 일시적 오류 재시도 횟수
+PARSE_TIMEOUT = 300  # Document Parse 요청 타임아웃(초)
+
+# OCR 모드를 제외한 Document Parse 요청 파라미터 (캐시 키에도 사용)
+PARSE_OPTIONS = {
+    "coordinates": "true",
+    "chart_recognition": "false",
+    "output_formats": json.dumps(["html"]),
+    "model": "document-parse",
+    "base64_encoding": json.dumps([])
+}
+
+# 파싱 결과 캐시 (같은 PDF를 다시 업로드하면 API를 호출하지 않음)
+parse_cache = ParseResultCache(max_bytes=int(os.getenv("PARSE_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+# 토큰 계산 (tiktoken cl100k_base 인코딩으로 로컬에서 계산 - Upstage 모델 토크나이저의 근사치)
+# 인코딩 파일은 처음 사용할 때 내려받으므로, 오프라인이라 불러오지 못하면 글자 수 기반 추정치를 사용
+TOKEN_ENCODING = "cl100k_base"
+TOKEN_COUNT_CACHE_SIZE = 1024  # 토큰 수를 기억할 최대 텍스트 수
+_encoding = None
+_encoding_failed = False
+_token_counts = OrderedDict()  # 텍스트 해시 -> 토큰 수
+_token_lock = threading.Lock()
+token_stats = {"tokenizer_calls": 0, "cache_hits": 0}
+
+def get_encoding():
+    """tiktoken 인코딩을 처음 사용할 때 한 번만 불러옵니다. 불러올 수 없으면 None을 반환합니다."""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+        except Exception as e:
+            _encoding_failed = True
+            logger.warning(f"tiktoken 인코딩({TOKEN_ENCODING})을 불러올 수 없어 글자 수 기반 추정치를 사용합니다: {e}")
+    return _encoding
+
+def _remember_token_count(key, count):
+    with _token_lock:
+        _token_counts[key] = count
+        _token_counts.move_to_end(key)
+        while len(_token_counts) > TOKEN_COUNT_CACHE_SIZE:
+            _token_counts.popitem(last=False)
 
-upstage_llm = ChatUpstage(
-    api_key=UPSTAGE_API_KEY,
-    model="solar-pro2-preview"
-)
+def encode_text(text: str) -> list:
+    """텍스트를 토큰 ID로 인코딩하고, 토큰 수를 기억해 둡니다."""
+    tokens = get_encoding().encode(text, disallowed_special=())
+    with _token_lock:
+        token_stats["tokenizer_calls"] += 1
+    _remember_token_count(hashlib.md5(text.encode()).hexdigest(), len(tokens))
+    return tokens
 
 def count_tokens(text: str) -> int:
-    """Upstage 모델을 사용하여 텍스트의 토큰 수를 계산합니다."""
-    return upstage_llm.get_num_tokens(text)
+    """텍스트의 토큰 수를 계산합니다. 같은 텍스트는 다시 인코딩하지 않습니다."""
+    key = hashlib.md5(text.encode()).hexdigest()
+    with _token_lock:
+        if key in _token_counts:
+            _token_counts.move_to_end(key)
+            token_stats["cache_hits"] += 1
+            return _token_counts[key]
+    if get_encoding() is None:
+        return estimate_tokens(text)
+    return len(encode_text(text))
 
 def truncate_text_by_tokens(text: str, max_tokens: int) -> tuple[str, int, int]:
-    """Upstage 토큰 카운팅을 사용하여 텍스트를 자릅니다."""
-    original_token_count = count_tokens(text)
+    """
+    텍스트를 max_tokens 이내로 자릅니다.
+    한 번 인코딩한 결과의 토큰 위치로 자른 뒤, 문장이 중간에 잘리지 않도록 마지막 문장 경계로 맞춥니다.
+    
+    Returns:
+        tuple: (잘린 텍스트, 원본 토큰 수, 최종 토큰 수)
+    """
+    if get_encoding() is None:
+        truncated = truncate_by_estimated_tokens(text, max_tokens)
+        return truncated, estimate_tokens(text), estimate_tokens(truncated)
+    
+    tokens = encode_text(text)
+    original_token_count = len(tokens)
     
     if original_token_count <= max_tokens:
         return text, original_token_count, original_token_count
     
-    # 이진 탐색으로 적절한 길이 찾기
-    left, right = 0, len(text)
-    best_text = text[:right//2]
-    
-    while left < right:
-        mid = (left + right + 1) // 2
-        candidate_text = text[:mid]
-        token_count = count_tokens(candidate_text)
-        
-        if token_count <= max_tokens:
-            best_text = candidate_text
-            left = mid
-        else:
-            right = mid - 1
+    # 허용된 토큰까지의 텍스트 (토큰 경계에서 잘린 멀티바이트 문자는 제외)와 각 토큰의 끝 위치(바이트)
+    encoding = get_encoding()
+    kept_tokens = tokens[:max_tokens]
+    best_text = encoding.decode_bytes(kept_tokens).decode("utf-8", errors="ignore")
+    token_ends = list(itertools.accumulate(len(encoding.decode_single_token_bytes(token)) for token in kept_tokens))
     
     # 문장이 중간에 잘리는 것을 방지
-    sentences = best_text.split('.')
-    if len(sentences) > 1:
-        best_text = '.'.join(sentences[:-1]) + '.'
+    boundary = best_text.rfind('.')
+    if boundary > 0:
+        best_text = best_text[:boundary + 1]
     
-    final_token_count = count_tokens(best_text)
+    # 잘린 위치 안에 온전히 포함된 토큰 수 (다시 인코딩하지 않음)
+    final_token_count = bisect.bisect_right(token_ends, len(best_text.encode()))
+    _remember_token_count(hashlib.md5(best_text.encode()).hexdigest(), final_token_count)
+    logger.debug(f"토큰 계산: 토크나이저 호출 {token_stats['tokenizer_calls']}회, 캐시 적중 {token_stats['cache_hits']}회")
     return best_text, original_token_count, final_token_count
 
-def split_pdf_by_pages(file_bytes, max_size_bytes):
-    """PDF를 페이지별로 분할하여 각 부분이 최대 크기와 페이지 수를 넘지 않도록 합니다."""
-    try:
-        pdf_reader = PdfReader(io.BytesIO(file_bytes))
-        total_pages = len(pdf_reader.pages)
-        
-        if total_pages == 0:
-            return None, "PDF에 페이지가 없습니다."
-        
-        # 총 페이지 수 확인 및 경고
-        if total_pages > MAX_PAGES_PER_CHUNK:
-            st.warning(f"⚠️ 총 {total_pages}페이지입니다. {MAX_PAGES_PER_CHUNK}페이지씩 분할하여 처리합니다.")
-        
-        # 평균 페이지 크기 추정
-        avg_page_size = len(file_bytes) / total_pages
-        pages_per_chunk_by_size = max(1, int(max_size_bytes / avg_page_size))
-        
-        # 페이지 제한과 크기 제한 중 더 작은 값 사용
-        pages_per_chunk = min(pages_per_chunk_by_size, MAX_PAGES_PER_CHUNK)
+def write_pdf_pages(pdf_reader, start, end):
+    """start ~ end-1 페이지를 새 PDF로 직렬화하여 bytes로 반환합니다."""
+    pdf_writer = PdfWriter()
+    for page_num in range(start, end):
+        pdf_writer.add_page(pdf_reader.pages[page_num])
+    output_buffer = io.BytesIO()
+    pdf_writer.write(output_buffer)
+    return output_buffer.getvalue()
+
+def iter_pdf_chunks(pdf_reader, file_size, max_size_bytes=MAX_FILE_SIZE):
+    """
+    PDF를 크기와 페이지 수 제한을 넘지 않는 페이지 범위 청크로 나누어 하나씩 yield 합니다.
+    이미 파싱된 PdfReader를 재사용하며, 청크는 요청할 때마다 하나씩 직렬화되므로
+    모든 청크를 메모리에 동시에 보관하지 않습니다.
+    
+    원본 파일이 max_size_bytes를 넘으면 평균 페이지 크기 대신 페이지별 실제 직렬화 크기를
+    누적하여 청크를 구성합니다.
+    
+    Yields:
+        dict: data(청크 bytes), pages("시작-끝"), page_count, size, start, end
+    """
+    total_pages = len(pdf_reader.pages)
+    # 페이지 없이 직렬화한 PDF 크기 (헤더, 트레일러 등 페이지와 무관한 고정 크기)
+    base_size = len(write_pdf_pages(pdf_reader, 0, 0))
+    start = 0
+    
+    while start < total_pages:
+        end = min(start + MAX_PAGES_PER_CHUNK, total_pages)
         
-        chunks = []
-        current_chunk_start = 0
+        if file_size > max_size_bytes:
+            # 페이지별 실제 크기를 누적하여 크기 제한 안에서 최대한 많은 페이지를 담음
+            accumulated = base_size
+            for page_num in range(start, end):
+                page_size = len(write_pdf_pages(pdf_reader, page_num, page_num + 1)) - base_size
+                if page_num > start and accumulated + page_size > max_size_bytes:
+                    end = page_num
+                    break
+                accumulated += page_size
         
-        while current_chunk_start < total_pages:
-            # 청크 생성
-            pdf_writer = PdfWriter()
-            current_chunk_end = min(current_chunk_start + pages_per_chunk, total_pages)
-            
-            # 페이지 추가
-            for page_num in range(current_chunk_start, current_chunk_end):
-                pdf_writer.add_page(pdf_reader.pages[page_num])
-            
-            # 메모리에 PDF 작성
-            output_buffer = io.BytesIO()
-            pdf_writer.write(output_buffer)
-            chunk_bytes = output_buffer.getvalue()
-            output_buffer.close()
-            
-            # 청크 크기가 여전히 너무 큰 경우 페이지를 더 줄임
-            if len(chunk_bytes) > max_size_bytes and pages_per_chunk > 1:
-                pages_per_chunk = max(1, min(pages_per_chunk // 2, MAX_PAGES_PER_CHUNK))
-                continue
-            
-            # 페이지 수 제한 체크
-            actual_pages = current_chunk_end - current_chunk_start
-            if actual_pages > MAX_PAGES_PER_CHUNK:
-                return None, f"청크 크기가 페이지 제한({MAX_PAGES_PER_CHUNK}페이지)을 초과합니다."
-            
-            chunks.append({
-                'data': chunk_bytes,
-                'pages': f"{current_chunk_start + 1}-{current_chunk_end}",
-                'page_count': actual_pages,
-                'size': len(chunk_bytes)
-            })
-            
-            current_chunk_start = current_chunk_end
+        chunk_bytes = write_pdf_pages(pdf_reader, start, end)
         
-        return chunks, None
+        # 페이지 간 공유 리소스 때문에 누적 크기와 실제 크기가 다를 수 있으므로 최종 확인
+        while len(chunk_bytes) > max_size_bytes and end - start > 1:
+            end = start + (end - start) // 2
+            chunk_bytes = write_pdf_pages(pdf_reader, start, end)
         
-    except Exception as e:
-        return None, f"PDF 분할 중 오류 발생: {str(e)}"
+        yield {
+            'data': chunk_bytes,
+            'pages': f"{start + 1}-{end}",
+            'page_count': end - start,
+            'size': len(chunk_bytes),
+            'start': start,
+            'end': end
+        }
+        start = end
 
-def process_single_document(file_bytes, force_ocr: bool, chunk_info=None):
-    """단일 문서(또는 문서 청크)를 처리합니다."""
-    url = "https://api.upstage.ai/v1/document-digitization"
-    headers = {"Authorization": f"Bearer {UPSTAGE_API_KEY}"}
+def parse_elements(result):
+    """
+    Document Parse 응답을 요소별 구조로 변환합니다.
+    
+    Returns:
+        list: [{"page": 페이지(요청한 PDF 기준, 1부터), "category": 요소 종류,
+                "bbox": [x0, y0, x1, y1] (페이지 기준 상대 좌표) 또는 None, "text": 텍스트}, ...]
+    """
+    elements = []
+    for element in result.get("elements", []):
+        html = element.get("content", {}).get("html", "")
+        text = BeautifulSoup(html, "html.parser").get_text("\n").strip() if html else ""
+        if not text:
+            continue
+        points = element.get("coordinates") or []
+        bbox = None
+        if points:
+            xs = [point["x"] for point in points]
+            ys = [point["y"] for point in points]
+            bbox = [round(min(xs), 4), round(min(ys), 4), round(max(xs), 4), round(max(ys), 4)]
+        elements.append({
+            "page": element.get("page", 1),
+            "category": element.get("category", ""),
+            "bbox": bbox,
+            "text": text
+        })
+    
+    # 요소 정보가 없는 응답은 전체 HTML을 하나의 요소로 취급
+    if not elements:
+        html_content = result.get("content", {}).get("html", "").strip()
+        if html_content:
+            text = BeautifulSoup(html_content, "html.parser").get_text("\n")
+            elements.append({"page": 1, "category": "document", "bbox": None, "text": text})
+    return elements
+
+def elements_to_text(elements):
+    """요소들의 텍스트를 순서대로 이어 붙입니다."""
+    return "\n".join(element["text"] for element in elements)
+
+def build_pages(elements):
+    """
+    요소 리스트를 페이지별 구조로 묶습니다. (ChatDatabase.save_document_pages 형식)
+    
+    Returns:
+        list: [{"page": 페이지, "text": 페이지 텍스트,
+                "elements": [{"category", "bbox", "start", "end"}, ...]}, ...]
+                start/end는 페이지 텍스트 안에서 요소 텍스트의 위치
+    """
+    pages = {}
+    for element in elements:
+        page = pages.setdefault(element["page"], {"page": element["page"], "text": "", "elements": []})
+        if page["text"]:
+            page["text"] += "\n"
+        start = len(page["text"])
+        page["text"] += element["text"]
+        page["elements"].append({
+            "category": element["category"],
+            "bbox": element["bbox"],
+            "start": start,
+            "end": len(page["text"])
+        })
+    return [pages[number] for number in sorted(pages)]
+
+def request_document_parse(file_bytes, force_ocr: bool, max_retries: int = PARSE_MAX_RETRIES):
+    """
+    Document Parse API를 호출하여 요소별 파싱 결과를 반환합니다.
+    429/5xx 및 연결 오류는 공용 HTTP 클라이언트(upstage_client)가 지수 백오프로 재시도합니다.
+    Streamlit UI를 호출하지 않으므로 worker 스레드에서 사용할 수 있습니다.
+    
+    Returns:
+        tuple: (요소 리스트 - parse_elements 참고, 오류 메시지)
+    """
     files = {
         "document": ("document.pdf", file_bytes, "application/pdf")
     }
     data = {
         "ocr": "force" if force_ocr else "auto",
-        "coordinates": "true",
-        "chart_recognition": "false",
-        "output_formats": json.dumps(["html"]),
-        "model": "document-parse",
-        "base64_encoding": json.dumps([])
+        **PARSE_OPTIONS
     }
 
     try:
-        response = requests.post(url, headers=headers, files=files, data=data)
-        response.raise_for_status()
-        result = response.json()
-
-        html_content = result.get("content", {}).get("html", "").strip()
+        response = upstage_client.post(
+            "document-digitization", files=files, data=data, timeout=PARSE_TIMEOUT, max_retries=max_retries
+        )
+        if response.status_code == 200:
+            elements = parse_elements(response.json())
+            if not elements:
+                return None, "청크에서 텍스트를 찾을 수 없습니다."
+            return elements, None
+        if response.status_code == 413:
+            return None, "파일 크기가 너무 큽니다 (413 오류)."
+        return None, f"HTTP 오류 {response.status_code}: {response.text[:200]}"
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        return None, f"연결 오류: {str(e)}"
+    except Exception as e:
+        return None, f"처리 중 오류 발생: {str(e)}"
 
-        if not html_content:
-            return None, f"청크에서 텍스트를 찾을 수 없습니다. {chunk_info or ''}"
+def cached_document_parse(file_bytes, force_ocr: bool, file_hash: str, pages: str):
+    """
+    파싱 결과 캐시를 먼저 확인하고, 없을 때만 Document Parse API를 호출합니다.
+    성공한 결과만 저장하므로 실패한 청크는 다음 업로드 때 다시 요청됩니다.
+    
+    Args:
+        file_bytes: 요청할 PDF (또는 청크) bytes
+        force_ocr: OCR 강제 여부
+        file_hash: 업로드된 PDF 원본의 SHA-256
+        pages: 원본 기준 페이지 범위 ("all" 또는 "시작-끝")
         
-        soup = BeautifulSoup(html_content, "html.parser")
-        plain_text = soup.get_text("\n")
+    Returns:
+        tuple: (요소 리스트, 오류 메시지)
+    """
+    ocr_mode = "force" if force_ocr else "auto"
+    cached = parse_cache.get(file_hash, pages, ocr_mode, PARSE_OPTIONS)
+    if cached is not None:
+        print(f"파싱 결과 캐시 사용: {file_hash[:12]} ({pages})")
+        return cached, None
+    
+    elements, error = request_document_parse(file_bytes, force_ocr)
+    if error is None:
+        parse_cache.put(file_hash, pages, ocr_mode, PARSE_OPTIONS, elements)
+    return elements, error
 
-        # 토큰 수 계산 및 제한 적용
-        original_token_count = count_tokens(plain_text)
-        
-        if original_token_count > MAX_TOKENS:
-            truncated_text, original_tokens, final_tokens = truncate_text_by_tokens(plain_text, MAX_TOKENS)
-            st.warning(f"⚠️ 텍스트가 토큰 제한을 초과하여 잘림: {original_tokens:,} → {final_tokens:,} 토큰 {chunk_info or ''}")
-            return truncated_text, None
-        else:
-            st.info(f"📊 추출된 텍스트: {original_token_count:,} 토큰 {chunk_info or ''}")
-            return plain_text, None
-    
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 413:
-            return None, f"파일 크기가 너무 큽니다 (413 오류). {chunk_info or ''}"
-        else:
-            return None, f"HTTP 오류 {e.response.status_code}: {str(e)} {chunk_info or ''}"
-    except Exception as e:
-        return None, f"처리 중 오류 발생: {str(e)} {chunk_info or ''}"
+class StreamlitReporter:
+    """
+    process_document의 메시지와 진행률을 Streamlit UI에 표시합니다.
+    (백그라운드 작업에서는 같은 메서드를 가진 다른 reporter를 전달)
+    """
+
+    def __init__(self):
+        self._progress_bar = None
+        self._status_text = None
+
+    def info(self, message):
+        st.info(message)
+
+    def warning(self, message):
+        st.warning(message)
+
+    def error(self, message):
+        st.error(message)
+
+    def success(self, message):
+        st.success(message)
+
+    def progress(self, fraction, text):
+        if self._progress_bar is None:
+            self._progress_bar = st.progress(0)
+            self._status_text = st.empty()
+        self._progress_bar.progress(fraction)
+        self._status_text.text(text)
 
-def process_document(file_bytes, force_ocr: bool):
+    def clear(self):
+        if self._progress_bar is not None:
+            self._progress_bar.empty()
+            self._status_text.empty()
+            self._progress_bar = None
+            self._status_text = None
+
+def apply_token_limit(plain_text, chunk_info=None, reporter=None):
+    """추출된 텍스트에 토큰 제한을 적용하고 결과를 표시합니다."""
+    reporter = reporter or StreamlitReporter()
+    truncated_text, original_tokens, final_tokens = truncate_text_by_tokens(plain_text, MAX_TOKENS)
+    
+    if original_tokens > MAX_TOKENS:
+        reporter.warning(f"⚠️ 텍스트가 토큰 제한을 초과하여 잘림: {original_tokens:,} → {final_tokens:,} 토큰 {chunk_info or ''}")
+    else:
+        reporter.info(f"📊 추출된 텍스트: {original_tokens:,} 토큰 {chunk_info or ''}")
+    return truncated_text
+
+def process_single_document(file_bytes, force_ocr: bool, chunk_info=None, file_hash=None):
+    """단일 문서(또는 문서 청크)를 처리합니다."""
+    if file_hash is None:
+        file_hash = ParseResultCache.hash_bytes(file_bytes)
+    elements, error = cached_document_parse(file_bytes, force_ocr, file_hash, "all")
+    if error:
+        return None, f"{error} {chunk_info or ''}"
+    return apply_token_limit(elements_to_text(elements), chunk_info), None
+
+def process_document(file_bytes, force_ocr: bool, return_pages: bool = False, reporter=None):
     """
     문서를 처리합니다. 파일 크기가 20MB를 초과하거나 페이지가 90페이지를 초과하면 자동으로 분할합니다.
+    
+    Args:
+        file_bytes: PDF bytes
+        force_ocr: OCR 강제 여부
+        return_pages: True이면 토큰 제한 없이 페이지/요소별 구조(build_pages 형식)도 함께 반환
+        reporter: 메시지/진행률 표시 대상 (기본값: StreamlitReporter)
+        
+    Returns:
+        tuple: (텍스트, 오류 메시지) 또는 return_pages=True일 때 (텍스트, 오류 메시지, 페이지 리스트)
     """
+    def result(text, error, pages=None):
+        return (text, error, pages) if return_pages else (text, error)
+    
+    reporter = reporter or StreamlitReporter()
+    
     file_size_mb = len(file_bytes) / (1024 * 1024)
     
-    # 먼저 페이지 수 확인 (분할 필요성 판단을 위해)
+    # PDF는 한 번만 파싱하여 페이지 수 확인과 분할에 함께 사용
     try:
         pdf_reader = PdfReader(io.BytesIO(file_bytes))
         total_pages = len(pdf_reader.pages)
     except Exception as e:
-        return None, f"PDF 페이지 정보를 읽을 수 없습니다: {str(e)}"
+        return result(None, f"PDF 페이지 정보를 읽을 수 없습니다: {str(e)}")
+    
+    file_hash = ParseResultCache.hash_bytes(file_bytes)
     
     # 파일 크기와 페이지 수 체크
     needs_splitting = len(file_bytes) > MAX_FILE_SIZE or total_pages > MAX_PAGES_PER_CHUNK
     
     if not needs_splitting:
         # 20MB 이하이고 90페이지 이하인 경우 직접 처리
-        st.info(f"📄 파일 정보: {file_size_mb:.2f}MB, {total_pages}페이지 - 직접 처리합니다.")
-        return process_single_document(file_bytes, force_ocr)
+        reporter.info(f"📄 파일 정보: {file_size_mb:.2f}MB, {total_pages}페이지 - 직접 처리합니다.")
+        elements, error = cached_document_parse(file_bytes, force_ocr, file_hash, "all")
+        if error:
+            return result(None, error)
+        return result(apply_token_limit(elements_to_text(elements), reporter=reporter), None, build_pages(elements))
     
     # 20MB 초과이거나 90페이지 초과인 경우 분할 처리
     split_reasons = []
@@ -192,66 +404,84 @@ def process_document(file_bytes, force_ocr: bool):
     if total_pages > MAX_PAGES_PER_CHUNK:
         split_reasons.append(f"페이지 수 {total_pages}페이지 > {MAX_PAGES_PER_CHUNK}페이지")
     
-    st.warning(f"📄 분할 처리 사유: {', '.join(split_reasons)}")
+    reporter.warning(f"📄 분할 처리 사유: {', '.join(split_reasons)}")
     
-    # PDF 분할
-    with st.spinner("PDF를 분할하는 중..."):
-        chunks, error = split_pdf_by_pages(file_bytes, MAX_FILE_SIZE)
-        
-        if error:
-            return None, error
-        
-        if not chunks:
-            return None, "PDF 분할에 실패했습니다."
-    
-    st.info(f"📑 PDF를 {len(chunks)}개 부분으로 분할했습니다.")
-    
-    # 각 청크를 처리
-    all_text_parts = []
+    # 청크를 분할하는 대로 병렬로 처리 (동시에 메모리에 있는 청크는 최대 PARSE_WORKERS개)
+    # 완료 순서와 관계없이 마지막에 페이지 순서로 합침
+    chunks = iter_pdf_chunks(pdf_reader, len(file_bytes), MAX_FILE_SIZE)
+    max_workers = max(1, PARSE_WORKERS)
+    results = []  # (시작 페이지, 텍스트, 원본 기준 페이지 번호의 요소 리스트)
+    pending = {}
+    chunk_count = 0
+    completed_pages = 0
+    processed_pages = 0
     total_tokens = 0
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    reporter.progress(0, f"📄 PDF를 분할하여 최대 {max_workers}개씩 동시에 처리 중...")
     
-    for i, chunk in enumerate(chunks):
-        progress = (i + 1) / len(chunks)
-        status_text.text(f"📄 처리 중: {chunk['pages']} 페이지 ({chunk['page_count']}페이지, {chunk['size'] / (1024*1024):.2f}MB)")
-        progress_bar.progress(progress)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit_next_chunk():
+            """다음 청크를 분할하여 요청을 시작합니다. 남은 청크가 없으면 False"""
+            nonlocal chunk_count
+            chunk = next(chunks, None)
+            if chunk is None:
+                return False
+            chunk_count += 1
+            # 청크 bytes는 요청 작업만 참조하므로 업로드가 끝나면 해제됨
+            future = executor.submit(cached_document_parse, chunk.pop('data'), force_ocr, file_hash, chunk['pages'])
+            pending[future] = (chunk_count, chunk)
+            return True
         
-        chunk_info = f"(페이지 {chunk['pages']}, {chunk['page_count']}페이지)"
-        text_part, error = process_single_document(chunk['data'], force_ocr, chunk_info)
-        
-        if error:
-            st.error(f"청크 {i+1} 처리 실패: {error}")
-            continue
-        
-        if text_part:
-            # 각 청크의 토큰 수 누적 계산
-            chunk_tokens = count_tokens(text_part)
-            total_tokens += chunk_tokens
+        try:
+            while len(pending) < max_workers and submit_next_chunk():
+                pass
             
-            all_text_parts.append(f"\n\n=== 페이지 {chunk['pages']} ({chunk['page_count']}페이지, {chunk_tokens:,} 토큰) ===\n\n{text_part}")
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk_number, chunk = pending.pop(future)
+                    completed_pages += chunk['page_count']
+                    reporter.progress(completed_pages / total_pages, f"📄 처리 완료: {chunk['pages']} 페이지 ({chunk['page_count']}페이지, {chunk['size'] / (1024*1024):.2f}MB) - {completed_pages}/{total_pages}페이지")
+                    
+                    chunk_info = f"(페이지 {chunk['pages']}, {chunk['page_count']}페이지)"
+                    elements, error = future.result()
+                    
+                    if error:
+                        reporter.error(f"청크 {chunk_number} 처리 실패: {error} {chunk_info}")
+                    else:
+                        # 청크 기준 페이지 번호를 원본 기준으로 변환
+                        elements = [{**element, "page": element["page"] + chunk['start']} for element in elements]
+                        text_part = apply_token_limit(elements_to_text(elements), chunk_info, reporter)
+                        if text_part:
+                            # 각 청크의 토큰 수 누적 계산
+                            chunk_tokens = count_tokens(text_part)
+                            total_tokens += chunk_tokens
+                            processed_pages += chunk['page_count']
+                            results.append((chunk['start'], f"\n\n=== 페이지 {chunk['pages']} ({chunk['page_count']}페이지, {chunk_tokens:,} 토큰) ===\n\n{text_part}", elements))
+                    
+                    submit_next_chunk()
+        except Exception as e:
+            reporter.clear()
+            return result(None, f"PDF 분할 중 오류 발생: {str(e)}")
+    
+    results.sort(key=lambda item: item[0])
+    all_text_parts = [part for _, part, _ in results]
     
     # 진행률 바 정리
-    progress_bar.empty()
-    status_text.empty()
+    reporter.clear()
     
     if not all_text_parts:
-        return None, "모든 PDF 청크 처리에 실패했습니다."
+        return result(None, "모든 PDF 청크 처리에 실패했습니다.")
     
     # 모든 텍스트 합치기
     combined_text = "\n".join(all_text_parts)
     
     # 전체 텍스트의 토큰 수 최종 확인 및 제한 적용
-    final_token_count = count_tokens(combined_text)
+    combined_text, original_tokens, final_token_count = truncate_text_by_tokens(combined_text, MAX_TOKENS)
     
-    if final_token_count > MAX_TOKENS:
-        st.warning(f"⚠️ 전체 텍스트가 토큰 제한을 초과하여 잘림: {final_token_count:,} → {MAX_TOKENS:,} 토큰")
-        truncated_text, original_tokens, final_tokens = truncate_text_by_tokens(combined_text, MAX_TOKENS)
-        combined_text = truncated_text
-        final_token_count = final_tokens
+    if original_tokens > MAX_TOKENS:
+        reporter.warning(f"⚠️ 전체 텍스트가 토큰 제한을 초과하여 잘림: {original_tokens:,} → {final_token_count:,} 토큰")
     
-    processed_pages = sum(chunk['page_count'] for chunk in chunks if any(f"페이지 {chunk['pages']}" in part for part in all_text_parts))
-    st.success(f"✅ {len(chunks)}개 부분 중 {len(all_text_parts)}개 성공적으로 처리완료! (총 {processed_pages}페이지, {final_token_count:,} 토큰)")
+    reporter.success(f"✅ {chunk_count}개 부분 중 {len(all_text_parts)}개 성공적으로 처리완료! (총 {processed_pages}페이지, {final_token_count:,} 토큰)")
     
-    return combined_text, None
+    return result(combined_text, None, build_pages([element for _, _, elements in results for element in elements]))
     
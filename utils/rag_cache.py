@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from .RAG.query_cache import normalize_query
+
+
+class RagResultCache:
+    """
+    call_rag_api의 최종 결과(번역 포함) 캐시
+
+    (정규화된 프롬프트, top_k, 인덱스 버전)을 키로 메모리와 SQLite에 저장하며,
+    인덱스 버전이 바뀌면 이전 버전의 결과는 모두 삭제됩니다.
+    """
+
+    def __init__(self, db_path=None, ttl_seconds=24 * 3600, max_memory_items=256):
+        """
+        db_path: SQLite 파일 경로 (기본값: /tmp/rag_result_cache.db)
+        ttl_seconds: 결과 유효 기간(초)
+        max_memory_items: 메모리에 유지할 최대 결과 수
+        """
+        if db_path is None:
+            db_path = os.path.join("/tmp", "rag_result_cache.db")
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_items = max_memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rag_results (
+                    key TEXT PRIMARY KEY,
+                    index_version TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+
+    def make_key(self, prompt, top_k, index_version):
+        """(정규화된 프롬프트, top_k, 인덱스 버전)의 해시"""
+        raw = json.dumps([normalize_query(prompt), top_k, index_version], ensure_ascii=False)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def check_version(self, index_version):
+        """인덱스 버전이 바뀌었으면 이전 버전의 결과를 모두 삭제합니다."""
+        if index_version == self._version:
+            return
+        with self._lock:
+            self._memory.clear()
+            self._version = index_version
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM rag_results WHERE index_version != ?", (index_version,))
+            conn.commit()
+
+    def get(self, prompt, top_k, index_version):
+        """캐시된 결과를 반환하고, 없거나 만료되었으면 None을 반환합니다."""
+        self.check_version(index_version)
+        key = self.make_key(prompt, top_k, index_version)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] < self.ttl_seconds:
+                self._memory.move_to_end(key)
+                return entry[1]
+
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT result, created_at FROM rag_results WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl_seconds)
+            ).fetchone()
+        if row is None:
+            return None
+
+        result = json.loads(row[0])
+        self._remember(key, row[1], result)
+        return result
+
+    def put(self, prompt, top_k, index_version, result):
+        """결과를 메모리와 SQLite에 저장합니다."""
+        self.check_version(index_version)
+        key = self.make_key(prompt, top_k, index_version)
+        now = time.time()
+        self._remember(key, now, result)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO rag_results (key, index_version, result, created_at)
+                VALUES (?, ?, ?, ?)
+            """, (key, index_version, json.dumps(result, ensure_ascii=False), now))
+            conn.execute("DELETE FROM rag_results WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.commit()
+
+    def _remember(self, key, created_at, result):
+        with self._lock:
+            self._memory[key] = (created_at, result)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+
+class ReferenceSummaryCache:
+    """
+    검색된 참고 문서의 표시용 요약 캐시 (SQLite)
+
+    (파일명, 내용 해시, 모델)을 키로 저장하므로, 같은 문서가 다시 검색되면 요약 API를 호출하지 않습니다.
+    유효 기간이 지났거나 최대 개수를 넘은 요약은 저장할 때 오래된 것부터 삭제됩니다.
+    """
+
+    def __init__(self, db_path=None, ttl_seconds=30 * 24 * 3600, max_items=5000):
+        """
+        db_path: SQLite 파일 경로 (기본값: /tmp/reference_summary_cache.db)
+        ttl_seconds: 요약 유효 기간(초)
+        max_items: 유지할 최대 요약 수
+        """
+        if db_path is None:
+            db_path = os.path.join("/tmp", "reference_summary_cache.db")
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_items = max_items
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reference_summaries (
+                    filename TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (filename, content_hash, model)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reference_summaries_created_at ON reference_summaries (created_at)")
+            conn.commit()
+
+    @staticmethod
+    def hash_content(content):
+        """문서 내용 해시"""
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def get(self, filename, content, model):
+        """저장된 요약을 반환하고, 없거나 만료되었으면 None을 반환합니다."""
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute("""
+                SELECT summary FROM reference_summaries
+                WHERE filename = ? AND content_hash = ? AND model = ? AND created_at >= ?
+            """, (filename, self.hash_content(content), model, time.time() - self.ttl_seconds)).fetchone()
+        return row[0] if row else None
+
+    def put(self, filename, content, model, summary):
+        """요약을 저장하고, 만료되었거나 최신 max_items개 밖인 요약을 삭제합니다."""
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO reference_summaries (filename, content_hash, model, summary, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (filename, self.hash_content(content), model, summary, now))
+            conn.execute("DELETE FROM reference_summaries WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute("""
+                DELETE FROM reference_summaries WHERE created_at < (
+                    SELECT created_at FROM reference_summaries ORDER BY created_at DESC LIMIT 1 OFFSET ?
+                )
+            """, (self.max_items - 1,))
+            conn.commit()
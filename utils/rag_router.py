@@ -0,0 +1,318 @@
+''' RAG 사용 여부 판단 (로컬 라우터 + LLM 대체) '''
+
+import os
+import re
+import json
+import math
+import time
+import random
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .RAG.query_cache import normalize_query
+
+CONFIDENT_YES = 0.75  # 이 확률 이상이면 LLM 없이 RAG 사용
+CONFIDENT_NO = 0.25  # 이 확률 이하이면 LLM 없이 RAG 미사용
+AUDIT_RATE = float(os.getenv("RAG_ROUTER_AUDIT_RATE", "0.05"))  # 로컬 판단을 LLM과 비교 검증할 비율
+
+# 구체적인 정보/자료가 필요한 질문 (가중치는 키워드 수만큼 누적, 최대 2개)
+RETRIEVAL_PATTERN = re.compile(
+    r"사례|예시|자료|문서|보고서|리포트|통계|데이터|수치|근거|출처|연구|조사|정책|법률|법안|규정|제도|예산|"
+    r"찾아|검색|비교|현황|동향|얼마|몇\s*[개명건년%]|언제|어디|누가|"
+    r"\b(?:report|case|example|data|statistic|evidence|source|study|policy|regulation|law|budget|"
+    r"search|find|compare|how many|how much|when|where|who)\b"
+)
+# 인사, 감사 등 일반 대화
+SMALL_TALK_PATTERN = re.compile(
+    r"^(안녕|하이|반가|고마|감사|수고|잘\s*지내|좋은\s*(아침|하루)|ㅎㅎ|ㅋㅋ|"
+    r"hello|hi\b|hey\b|thanks|thank you|good (morning|night))"
+)
+# 의견, 추천 등 추상적인 질문
+OPINION_PATTERN = re.compile(r"생각|의견|느낌|추천|어떨까|좋을까|\b(think|opinion|recommend)\b")
+# 간단한 정의/설명
+DEFINITION_PATTERN = re.compile(r"(이|가)?\s*뭐(야|예요|에요|지)|(이)?란\??$|정의|뜻|\bwhat is\b|\bdefine\b")
+# 이전 대화만으로 답할 수 있는 요청
+CONTEXT_PATTERN = re.compile(r"방금|위\s*(내용|답변)|다시|요약해|번역해|정리해|더\s*짧게|\b(again|rephrase|shorter)\b")
+NUMBER_PATTERN = re.compile(r"\d")
+
+# (특징 이름, 가중치) - 점수는 로지스틱 함수로 확률로 변환
+FEATURE_WEIGHTS = {
+    "bias": -0.5,
+    "retrieval": 1.5,
+    "small_talk": -3.0,
+    "opinion": -1.5,
+    "definition": -1.0,
+    "context": -1.0,
+    "number": 0.8,
+    "pdf": 0.5,
+    "long": 0.3,
+    "short": -1.0,
+}
+
+
+def extract_features(query, has_pdf=False):
+    """
+    질문에서 라우팅 특징을 추출합니다.
+
+    Returns:
+        dict: {특징 이름: 값}
+    """
+    text = normalize_query(query)
+    return {
+        "bias": 1,
+        "retrieval": min(2, len(RETRIEVAL_PATTERN.findall(text))),
+        "small_talk": int(bool(SMALL_TALK_PATTERN.search(text))),
+        "opinion": int(bool(OPINION_PATTERN.search(text))),
+        "definition": int(bool(DEFINITION_PATTERN.search(text))),
+        "context": int(bool(CONTEXT_PATTERN.search(text))),
+        "number": int(bool(NUMBER_PATTERN.search(text))),
+        "pdf": int(has_pdf),
+        "long": int(len(text) > 40),
+        "short": int(len(text) < 8),
+    }
+
+
+class RagRouter:
+    """
+    RAG 사용 여부를 로컬에서 판단하는 라우터
+
+    - 키워드 특징의 선형 점수로 확률을 계산하고, 확신이 높으면 API 호출 없이 바로 결정
+    - 확신이 낮을 때만 LLM 판단(fallback)을 사용
+    - 결정은 (정규화된 질문, PDF 요약 해시)별로 메모리에 저장하고, LLM 판단은 SQLite에도 저장
+    - 로컬 결정 일부(AUDIT_RATE)와 LLM으로 넘긴 결정은 LLM 판단과 비교하여 일치율을 기록
+    - 저장된 결정과 비교 기록은 유효 기간이 지나거나 최대 개수를 넘으면 오래된 것부터 삭제
+    """
+
+    def __init__(
+        self,
+        db_path=None,
+        max_memory_items=1024,
+        audit_rate=AUDIT_RATE,
+        ttl_seconds=7 * 24 * 3600,
+        max_routes=10000,
+        max_audits=10000
+    ):
+        """
+        db_path: SQLite 파일 경로 (기본값: /tmp/rag_router.db)
+        max_memory_items: 메모리에 유지할 최대 결정 수
+        audit_rate: 확신이 높은 로컬 결정 중 LLM과 비교할 비율 (0이면 비교하지 않음)
+        ttl_seconds: 저장된 결정과 비교 기록의 유효 기간(초)
+        max_routes: SQLite에 유지할 최대 결정 수
+        max_audits: SQLite에 유지할 최대 비교 기록 수
+        """
+        if db_path is None:
+            db_path = os.path.join("/tmp", "rag_router.db")
+        self.db_path = db_path
+        self.max_memory_items = max_memory_items
+        self.audit_rate = audit_rate
+        self.ttl_seconds = ttl_seconds
+        self.max_routes = max_routes
+        self.max_audits = max_audits
+        self.logger = logging.getLogger(__name__)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._audit_executor = ThreadPoolExecutor(max_workers=1)
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rag_routes (
+                    key TEXT PRIMARY KEY,
+                    decision INTEGER NOT NULL,
+                    source TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rag_route_audits (
+                    key TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    probability REAL NOT NULL,
+                    confident INTEGER NOT NULL,
+                    local_decision INTEGER NOT NULL,
+                    llm_decision INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_rag_routes_created_at ON rag_routes (created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_rag_route_audits_created_at ON rag_route_audits (created_at)")
+            conn.commit()
+            # 일치율은 메모리에서 누적 (시작할 때 한 번만 저장된 기록으로 초기화)
+            rows = conn.execute("""
+                SELECT confident, COUNT(*), COALESCE(SUM(local_decision = llm_decision), 0)
+                FROM rag_route_audits
+                GROUP BY confident
+            """).fetchall()
+        self._agreement = {True: [0, 0], False: [0, 0]}  # {로컬 결정 여부: [비교 수, 일치 수]}
+        for confident, total, agreed in rows:
+            self._agreement[bool(confident)] = [total, agreed]
+
+    def make_key(self, query, pdf_summary=None):
+        """(정규화된 질문, PDF 요약)의 해시"""
+        raw = json.dumps([normalize_query(query), pdf_summary or ""], ensure_ascii=False)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def probability(self, query, pdf_summary=None):
+        """RAG가 필요할 확률 (로컬 선형 모델)"""
+        features = extract_features(query, has_pdf=bool(pdf_summary))
+        score = sum(FEATURE_WEIGHTS[name] * value for name, value in features.items())
+        return 1 / (1 + math.exp(-score))
+
+    def get_cached(self, key):
+        """저장된 결정을 반환하고, 없으면 None을 반환합니다."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT decision FROM rag_routes WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.ttl_seconds)
+            ).fetchone()
+        if row is None:
+            return None
+        self._remember(key, bool(row[0]))
+        return bool(row[0])
+
+    def put(self, key, decision, source):
+        """결정을 메모리와 SQLite에 저장합니다."""
+        self._remember(key, decision)
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO rag_routes (key, decision, source, created_at)
+                VALUES (?, ?, ?, ?)
+            """, (key, int(decision), source, now))
+            self._evict(conn, "rag_routes", self.max_routes, now)
+            conn.commit()
+
+    def _evict(self, conn, table, max_rows, now):
+        """유효 기간이 지났거나 최신 max_rows개 밖인 행을 삭제합니다."""
+        conn.execute(f"DELETE FROM {table} WHERE created_at < ?", (now - self.ttl_seconds,))
+        conn.execute(f"""
+            DELETE FROM {table} WHERE created_at < (
+                SELECT created_at FROM {table} ORDER BY created_at DESC LIMIT 1 OFFSET ?
+            )
+        """, (max_rows - 1,))
+
+    def _remember(self, key, decision):
+        with self._lock:
+            self._memory[key] = decision
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def route(self, query, pdf_summary=None, fallback=None):
+        """
+        LLM 없이 결정할 수 있으면 결정을 반환합니다.
+
+        Args:
+            query: 사용자 질문
+            pdf_summary: PDF 요약 (선택)
+            fallback: 검증용 LLM 판단 함수 (인자 없이 bool 반환, 실패하면 None - 선택)
+
+        Returns:
+            bool: RAG 사용 여부 (확신이 낮아 LLM 판단이 필요하면 None)
+        """
+        key = self.make_key(query, pdf_summary)
+        cached = self.get_cached(key)
+        if cached is not None:
+            return cached
+
+        probability = self.probability(query, pdf_summary)
+        if CONFIDENT_NO < probability < CONFIDENT_YES:
+            return None
+
+        decision = probability >= CONFIDENT_YES
+        self._remember(key, decision)  # 로컬 결정은 다시 계산해도 같으므로 메모리에만 저장
+        if fallback is not None and random.random() < self.audit_rate:
+            self._audit_executor.submit(self._audit, key, query, probability, decision, fallback)
+        return decision
+
+    def record_llm_decision(self, query, pdf_summary, decision):
+        """LLM 판단을 저장하고 로컬 모델의 판단과 비교하여 기록합니다."""
+        key = self.make_key(query, pdf_summary)
+        self.put(key, decision, "llm")
+        probability = self.probability(query, pdf_summary)
+        self._record_agreement(key, query, probability, False, probability >= 0.5, decision)
+
+    def decide(self, query, pdf_summary=None, fallback=None):
+        """
+        RAG 사용 여부를 결정합니다. 로컬 라우터의 확신이 낮을 때만 fallback(LLM 판단)을 호출합니다.
+
+        Returns:
+            bool: RAG 사용 여부
+        """
+        decision = self.route(query, pdf_summary, fallback)
+        if decision is not None:
+            return decision
+        return self.resolve(query, pdf_summary, fallback() if fallback is not None else None)
+
+    def resolve(self, query, pdf_summary, llm_decision):
+        """
+        route가 None을 반환한 질문의 최종 결정 (LLM 판단을 저장하고 비교 기록)
+
+        Args:
+            llm_decision: LLM 판단 (실패했으면 None)
+
+        Returns:
+            bool: RAG 사용 여부
+        """
+        if llm_decision is None:
+            # LLM 판단을 사용할 수 없으면 로컬 추정을 사용 (저장하지 않음)
+            return self.probability(query, pdf_summary) >= 0.5
+        self.record_llm_decision(query, pdf_summary, bool(llm_decision))
+        return bool(llm_decision)
+
+    def _audit(self, key, query, probability, local_decision, fallback):
+        """확신이 높았던 로컬 결정을 LLM 판단과 비교합니다. (백그라운드)"""
+        try:
+            llm_decision = fallback()
+            if llm_decision is not None:
+                self._record_agreement(key, query, probability, True, local_decision, bool(llm_decision))
+        except Exception as e:
+            self.logger.warning(f"RAG 라우터 검증 실패: {e}")
+
+    def _record_agreement(self, key, query, probability, confident, local_decision, llm_decision):
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT INTO rag_route_audits (key, query, probability, confident, local_decision, llm_decision, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (key, query, probability, int(confident), int(local_decision), int(llm_decision), now))
+            self._evict(conn, "rag_route_audits", self.max_audits, now)
+            conn.commit()
+        with self._lock:
+            counts = self._agreement[bool(confident)]
+            counts[0] += 1
+            counts[1] += int(local_decision == llm_decision)
+        stats = self.agreement_stats()
+        self.logger.info(
+            f"RAG 라우터 {'검증' if confident else 'LLM 판단'}: 로컬 {local_decision} / LLM {llm_decision} "
+            f"(p={probability:.2f}) - 로컬 결정 일치율 {stats['confident_agreement']:.1%} ({stats['confident_samples']}건)"
+        )
+
+    def agreement_stats(self):
+        """
+        로컬 판단과 LLM 판단의 일치율 (시작 시점의 저장된 기록 + 이후 기록, 메모리에서 계산)
+
+        Returns:
+            dict: confident_samples/confident_agreement (LLM 없이 결정한 경우),
+                  uncertain_samples/uncertain_agreement (LLM으로 넘긴 경우의 로컬 추정)
+        """
+        with self._lock:
+            confident_total, confident_agreed = self._agreement[True]
+            uncertain_total, uncertain_agreed = self._agreement[False]
+        return {
+            "confident_samples": confident_total,
+            "confident_agreement": confident_agreed / confident_total if confident_total else 0.0,
+            "uncertain_samples": uncertain_total,
+            "uncertain_agreement": uncertain_agreed / uncertain_total if uncertain_total else 0.0,
+        }
+
+
+# 전역 RAG 라우터 인스턴스
+rag_router = RagRouter()
@@ -1,16 +1,27 @@
 import requests
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from .RAG import rag
-from .translation import translate_text_direct
+from .RAG import rag, load_documents_from_directory
+from .translation import translate_text_with_status
+from .rag_cache import RagResultCache
 import re
 load_dotenv()
 
 RAG_ENDPOINT = os.getenv("RAG_ENDPOINT", "http://localhost:8000/query")
+TRANSLATION_WORKERS = 4  # 검색 결과 번역 동시 요청 수 (전체 세션 공유)
+TRANSLATION_TIMEOUT = 60  # 검색 결과 번역 대기 시간(초)
+
+# 검색 결과 번역용 공유 executor
+translation_executor = ThreadPoolExecutor(max_workers=TRANSLATION_WORKERS)
 
 # 전역 rag_instance 변수 선언
 rag_instance = None
 
+# 검색 + 번역 결과 캐시 (인덱스가 바뀌면 자동 무효화)
+rag_result_cache = RagResultCache()
+
 def is_korean(text: str) -> bool:
     """
     텍스트가 한국어를 포함하는지 확인합니다.
@@ -44,34 +55,42 @@ def initialize_rag_instance():
         rag_instance = rag(
             documents=load_documents_from_directory(documents_dir),
             api_key=os.getenv("UPSTAGE_API_KEY"),
-            create_embeddings=True
+            create_embeddings=True,
+            index_type=os.getenv("RAG_INDEX_TYPE", "flat")
         )
         print("RAG 인스턴스 초기화 완료")
 
-def load_documents_from_directory(directory_path):
-    """
-    디렉토리에서 txt 파일들을 읽어서 {filename, content} 형태의 딕셔너리 리스트로 반환
+def translate_documents(contents, timeout=TRANSLATION_TIMEOUT):
     """
-    documents = []
+    검색된 문서들을 동시에 영어 → 한국어로 번역합니다.
+    시간 안에 끝나지 않거나 실패한 문서는 원문을 그대로 사용합니다.
     
-    # 디렉토리 내의 모든 파일 검색
-    for filename in os.listdir(directory_path):
-        # txt 파일만 처리
-        if filename.endswith('.txt'):
-            file_path = os.path.join(directory_path, filename)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    # 확장자를 제외한 파일 이름
-                    name_without_ext = os.path.splitext(filename)[0]
-                    documents.append({
-                        "filename": name_without_ext,
-                        "content": content
-                    })
-            except Exception as e:
-                print(f"파일 {filename} 읽기 실패: {e}")
+    Args:
+        contents (list): 번역할 문서 내용 리스트
+        timeout (float): 전체 번역 대기 시간(초)
+        
+    Returns:
+        tuple: (번역된 내용 리스트, 모두 번역되었는지 여부)
+    """
+    futures = [
+        translation_executor.submit(translate_text_with_status, content, target_language='ko', source_language='en')
+        for content in contents
+    ]
+    deadline = time.monotonic() + timeout
     
-    return documents
+    translated = []
+    all_translated = True
+    for content, future in zip(contents, futures):
+        try:
+            result, ok = future.result(timeout=max(0, deadline - time.monotonic()))
+        except Exception as e:
+            print(f"문서 번역 실패, 원문을 사용합니다: {e!r}")
+            future.cancel()
+            result, ok = content, False
+        # 일부 세그먼트만 실패한 경우도 번역 실패로 처리 (원문이 섞인 결과)
+        all_translated = all_translated and ok
+        translated.append(result)
+    return translated, all_translated
 
 def call_rag_api(prompt: str, top_k: int = 3):
     """
@@ -82,26 +101,40 @@ def call_rag_api(prompt: str, top_k: int = 3):
         # RAG 인스턴스 초기화 확인
         initialize_rag_instance()
         
+        # 같은 질문에 대한 결과가 캐시되어 있으면 바로 반환
+        cached = rag_result_cache.get(prompt, top_k, rag_instance.fingerprint)
+        if cached is not None:
+            print("RAG 결과 캐시 적중")
+            return cached
+        
         # 프롬프트가 한국어인 경우에만 영어로 번역
         if is_korean(prompt):
             print("한국어 프롬프트 감지됨, 영어로 번역합니다.")
-            english_prompt = translate_text_direct(prompt, source_lang='ko', target_lang='en')
+            english_prompt, prompt_translated = translate_text_with_status(prompt, target_language='en', source_language='ko')
             print(f"원본 프롬프트: {prompt}")
             print(f"번역된 프롬프트: {english_prompt}")
         else:
             print("영어 프롬프트 감지됨, 번역 없이 진행합니다.")
             english_prompt = prompt
+            prompt_translated = True
         
         # RAG 검색 수행
         responses = rag_instance(english_prompt, k=top_k)
         
+        # 검색된 문서 동시 번역
+        contents, all_translated = translate_documents([response['content'] for response in responses])
+        
         # 결과 포맷팅
         out = [{'filename': response['filename'].replace("_summarized", ""),
-        'content': translate_text_direct(response['content'], source_lang='en', target_lang='ko'),
-        'similarity': response['document_similarity']} for response in responses]
+        'content': content,
+        'similarity': response['document_similarity']} for response, content in zip(responses, contents)]
         
         print(f"검색 결과 수: {len(out)}")
-        return {'results': out}
+        result = {'results': out}
+        # 질문이나 문서 번역이 일부라도 실패하면 원문 결과가 남지 않도록 캐시하지 않음
+        if prompt_translated and all_translated:
+            rag_result_cache.put(prompt, top_k, rag_instance.fingerprint, result)
+        return result
     except Exception as e:
         print(f"RAG API 호출 중 오류 발생: {e}")
         return None
\ No newline at end of file
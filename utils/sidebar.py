@@ -27,6 +27,7 @@ def render_sidebar():
                 st.session_state.messages = []
                 st.session_state.processed_pdf = None
                 st.session_state.pdf_summary = None
+                st.session_state.document_id = None
                 st.rerun()
         else:
             st.button("➕ 새 대화", use_container_width=True, disabled=True, 
@@ -164,9 +165,11 @@ def load_session_data(session_id: str):
         if document:
             st.session_state.processed_pdf = document['content']
             st.session_state.pdf_summary = document['summary']
+            st.session_state.document_id = document['id']
         else:
             st.session_state.processed_pdf = None
             st.session_state.pdf_summary = None
+            st.session_state.document_id = None
         
         # 로드한 데이터를 세션별 메모리에도 저장
         st.session_state.session_memory[session_id] = {
@@ -183,6 +186,7 @@ def load_session_data(session_id: str):
         st.session_state.messages = []
         st.session_state.processed_pdf = None
         st.session_state.pdf_summary = None
+        st.session_state.document_id = None
 
 def save_message_to_db(role: str, content: str):
     """메시지를 데이터베이스에 저장"""
@@ -0,0 +1,229 @@
+''' 긴 문서의 계층적(map-reduce) 요약 '''
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from .text_utils import estimate_tokens, split_into_segments, truncate_by_estimated_tokens
+from .http_client import upstage_client
+
+load_dotenv()
+
+SUMMARY_MODEL = "solar-pro2-preview"
+SECTION_MAX_TOKENS = 6000  # 섹션(요약 요청 1회) 최대 입력 토큰 수
+SUMMARY_WORKERS = 4  # 섹션 동시 요약 수
+MAX_REDUCE_ROUNDS = 3  # 섹션 요약을 다시 요약하는 최대 단계 수
+REQUEST_TIMEOUT = 120  # 요약 API 요청 타임아웃(초)
+
+SECTION_PROMPT = """다음은 긴 문서의 일부입니다. 이후 다른 부분의 요약과 합쳐 전체 요약을 만들 예정이므로,
+이 부분의 핵심 내용, 중요한 수치와 결론을 빠짐없이 한국어로 간결하게 요약해주세요."""
+
+DOCUMENT_PROMPT = "문서의 내용을 간단히 한국어로 요약해주세요."
+
+REDUCE_PROMPT = """다음은 한 문서를 순서대로 나눈 부분별 요약입니다.
+이를 바탕으로 문서 전체의 내용을 간단히 한국어로 요약해주세요."""
+
+
+class SummaryCache:
+    """
+    요약 결과 저장소 (SQLite)
+
+    (요약 종류, 모델, 원문 해시)를 키로 요약문을 저장합니다.
+    섹션 단위로 저장되므로 문서를 다시 업로드하거나 일부만 바뀐 경우 바뀐 섹션만 다시 요약합니다.
+    유효 기간이 지났거나 최대 개수를 넘은 요약은 저장할 때 오래된 것부터 삭제됩니다.
+    """
+
+    def __init__(self, db_path=None, ttl_seconds=30 * 24 * 3600, max_items=20000):
+        """
+        db_path: SQLite 파일 경로 (기본값: /tmp/summary_cache.db)
+        ttl_seconds: 요약 유효 기간(초)
+        max_items: 유지할 최대 요약 수
+        """
+        if db_path is None:
+            db_path = os.path.join("/tmp", "summary_cache.db")
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_items = max_items
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    key TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_created_at ON summaries (created_at)")
+            conn.commit()
+
+    def make_key(self, kind, text):
+        """(요약 종류, 모델, 원문)의 해시"""
+        raw = json.dumps([kind, SUMMARY_MODEL, hashlib.sha256(text.encode()).hexdigest()])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, kind, text):
+        """저장된 요약문을 반환하고, 없거나 만료되었으면 None을 반환합니다."""
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT summary FROM summaries WHERE key = ? AND created_at >= ?",
+                (self.make_key(kind, text), time.time() - self.ttl_seconds)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, kind, text, summary):
+        """요약문을 저장하고, 만료되었거나 최신 max_items개 밖인 요약을 삭제합니다."""
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO summaries (key, summary, created_at)
+                VALUES (?, ?, ?)
+            """, (self.make_key(kind, text), summary, now))
+            conn.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute("""
+                DELETE FROM summaries WHERE created_at < (
+                    SELECT created_at FROM summaries ORDER BY created_at DESC LIMIT 1 OFFSET ?
+                )
+            """, (self.max_items - 1,))
+            conn.commit()
+
+
+# 섹션/문서 요약 캐시
+summary_cache = SummaryCache()
+
+# 섹션 요약용 공유 executor
+summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS)
+
+def request_summary(system_prompt, text):
+    """요약 API를 호출합니다. 실패하면 None을 반환합니다."""
+    try:
+        response = upstage_client.post(
+            "chat/completions",
+            json={
+                "model": SUMMARY_MODEL,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": text}
+                ]
+            },
+            timeout=REQUEST_TIMEOUT
+        )
+        if response.status_code == 200:
+            return response.json()["choices"][0]["message"]["content"]
+        print(f"요약 API 호출 실패: {response.status_code} - {response.text}")
+        return None
+    except Exception as e:
+        print(f"요약 API 호출 중 오류: {e}")
+        return None
+
+def cached_summary(kind, system_prompt, text):
+    """
+    캐시를 먼저 확인하고, 없을 때만 요약을 요청합니다. (성공한 요약만 저장)
+
+    Returns:
+        str: 요약문 (실패하면 None)
+    """
+    summary = summary_cache.get(kind, text)
+    if summary is not None:
+        return summary
+    summary = request_summary(system_prompt, text)
+    if summary:
+        summary_cache.put(kind, text, summary)
+    return summary
+
+def split_sections(text, max_tokens=SECTION_MAX_TOKENS):
+    """
+    텍스트를 요약 섹션으로 나눕니다.
+    작은 단위(문단)로 먼저 나눈 뒤 섹션이 절반 이상 찼을 때 내용 해시로 경계를 정하므로,
+    문서 앞부분이 수정되어도 이후 섹션 경계가 다시 맞춰져 캐시된 섹션 요약을 재사용할 수 있습니다.
+
+    Returns:
+        list: 섹션 리스트 (이어 붙이면 원문)
+    """
+    sections = []
+    current = ""
+    current_tokens = 0
+    for unit in split_into_segments(text, max_tokens=max(1, max_tokens // 8)):
+        unit_tokens = estimate_tokens(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            sections.append(current)
+            current = ""
+            current_tokens = 0
+        current += unit
+        current_tokens += unit_tokens
+        # 내용 기반 경계 (약 1/4 확률로 문단 끝에서 섹션을 마침)
+        if current_tokens >= max_tokens // 2 and hashlib.md5(unit.encode()).digest()[0] % 4 == 0:
+            sections.append(current)
+            current = ""
+            current_tokens = 0
+    if current:
+        sections.append(current)
+    return sections
+
+def summarize_sections(sections):
+    """
+    섹션들을 동시에 요약하여 원래 순서대로 반환합니다.
+    요약에 실패한 섹션은 None으로 표시됩니다.
+    """
+    futures = [
+        summary_executor.submit(cached_summary, "section", SECTION_PROMPT, section)
+        for section in sections
+    ]
+    return [future.result() for future in futures]
+
+def summarize_long_document(text, section_max_tokens=SECTION_MAX_TOKENS):
+    """
+    문서를 요약합니다. 한 번에 요약할 수 없을 만큼 길면 토큰 기준 섹션으로 나누어 동시에 요약(map)한 뒤,
+    섹션 요약들을 다시 합쳐 요약(reduce)합니다. 섹션 요약도 너무 길면 같은 과정을 반복합니다.
+
+    Args:
+        text (str): 요약할 문서 전체 텍스트
+        section_max_tokens (int): 섹션 최대 추정 토큰 수
+
+    Returns:
+        str: 문서 요약
+    """
+    started = time.time()
+    summary = summary_cache.get("document", text)
+    if summary is not None:
+        return summary
+
+    current = text
+    prompt = DOCUMENT_PROMPT
+    complete = True
+    for round_number in range(1, MAX_REDUCE_ROUNDS + 1):
+        if estimate_tokens(current) <= section_max_tokens:
+            break
+
+        sections = split_sections(current, max_tokens=section_max_tokens)
+        section_summaries = summarize_sections(sections)
+        succeeded = [summary for summary in section_summaries if summary is not None]
+        print(f"문서 요약 {round_number}단계: {len(sections)}개 섹션 요약 (실패 {len(sections) - len(succeeded)}개)")
+        if not succeeded:
+            return "문서 요약 중 오류가 발생했습니다."
+
+        complete = complete and len(succeeded) == len(sections)
+        current = "\n\n".join(
+            f"[부분 {i}/{len(sections)}]\n{summary}"
+            for i, summary in enumerate(section_summaries, 1)
+            if summary is not None
+        )
+        prompt = REDUCE_PROMPT
+
+    # 최대 단계까지 줄여도 길면 한 번에 보낼 수 있는 길이로 자름
+    if estimate_tokens(current) > section_max_tokens:
+        print(f"문서 요약: {MAX_REDUCE_ROUNDS}단계 후에도 입력이 길어 {section_max_tokens} 토큰으로 자릅니다.")
+        current = truncate_by_estimated_tokens(current, section_max_tokens)
+
+    # 일부 섹션이 빠진 요약은 저장하지 않음 (다시 요약할 때 실패한 섹션만 요청)
+    summary = cached_summary("final", prompt, current) if complete else request_summary(prompt, current)
+    if summary is None:
+        return "문서 요약 중 오류가 발생했습니다."
+
+    if complete:
+        summary_cache.put("document", text, summary)
+    print(f"문서 요약 완료: {time.time() - started:.1f}초")
+    return summary
@@ -0,0 +1,146 @@
+''' 토큰 수 추정과 문장/세그먼트 분리 (번역, 요약 등에서 공통으로 사용) '''
+
+import re
+import time
+import logging
+
+# nltk는 첫 문장 분리 시점에 불러오며, import 시 데이터 다운로드는 하지 않음
+# (punkt 데이터 설치: python -m nltk.downloader punkt_tab)
+# nltk 3.9부터 sent_tokenize는 punkt_tab만 사용하므로 예전 punkt 데이터만으로는 사용할 수 없음
+PUNKT_RESOURCE = "tokenizers/punkt_tab"
+_sent_tokenize = None
+
+def estimate_tokens(text):
+    """
+    토크나이저 없이 토큰 수를 추정합니다. (ASCII 약 4자당 1토큰, 한글 등은 1자당 1토큰)
+    
+    Args:
+        text (str): 대상 텍스트
+        
+    Returns:
+        int: 추정 토큰 수
+    """
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+def truncate_by_estimated_tokens(text, max_tokens):
+    """
+    추정 토큰 수가 max_tokens 이내가 되도록 텍스트 앞부분만 남깁니다.
+    문장이 중간에 잘리지 않도록 마지막 문장 경계로 맞춥니다.
+    
+    Returns:
+        str: 잘린 텍스트 (이미 max_tokens 이내이면 그대로)
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    
+    # 추정 토큰 수는 길이에 따라 단조 증가하므로 남길 길이를 이분 탐색
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    
+    truncated = text[:low]
+    boundary = truncated.rfind('.')
+    if boundary > 0:
+        truncated = truncated[:boundary + 1]
+    return truncated
+
+def regex_sent_tokenize(text):
+    """문장 부호 뒤 공백 기준 문장 분리 (nltk를 사용할 수 없을 때)"""
+    return re.split(r'(?<=[.!?。])\s+', text)
+
+def get_sent_tokenize():
+    """
+    문장 분리 함수를 처음 사용할 때 불러옵니다.
+    로컬 nltk 데이터 경로에 punkt가 없으면 다운로드하지 않고 정규식 기반 분리로 대체합니다.
+    
+    Returns:
+        callable: 텍스트를 받아 문장 리스트를 반환하는 함수
+    """
+    global _sent_tokenize
+    if _sent_tokenize is not None:
+        return _sent_tokenize
+    
+    started = time.perf_counter()
+    try:
+        import nltk
+        try:
+            nltk.data.find(PUNKT_RESOURCE)
+            from nltk.tokenize import sent_tokenize
+            _sent_tokenize = sent_tokenize
+        except LookupError:
+            logging.warning("nltk punkt_tab 데이터가 없어 정규식으로 문장을 분리합니다. (설치: python -m nltk.downloader punkt_tab)")
+    except ImportError:
+        logging.warning("nltk가 설치되어 있지 않아 정규식으로 문장을 분리합니다.")
+    
+    if _sent_tokenize is None:
+        _sent_tokenize = regex_sent_tokenize
+    logging.info(f"문장 분리기 로드: {time.perf_counter() - started:.3f}초")
+    return _sent_tokenize
+
+def split_into_sentences(text):
+    """
+    텍스트를 문장 단위로 분리합니다.
+    
+    Args:
+        text (str): 분리할 텍스트
+        
+    Returns:
+        list: 문장 단위로 분리된 리스트
+    """
+    # 문장 분리 (nltk 데이터 문제로 실패하면 정규식으로 분리)
+    try:
+        sentences = get_sent_tokenize()(text)
+    except LookupError as e:
+        logging.warning(f"nltk 문장 분리 실패, 정규식으로 분리합니다: {e}")
+        sentences = regex_sent_tokenize(text)
+    
+    # 각 문장의 앞뒤 공백 제거
+    sentences = [sentence.strip() for sentence in sentences]
+    
+    # 빈 문장 제거
+    sentences = [sentence for sentence in sentences if sentence]
+    
+    return sentences
+
+def split_into_segments(text, max_tokens):
+    """
+    텍스트를 세그먼트(번역/요약 요청 단위)로 분리합니다.
+    줄바꿈 단위 문단을 max_tokens 이내로 묶고, 긴 문단은 문장 경계에서 나눕니다.
+    
+    Args:
+        text (str): 분리할 텍스트
+        max_tokens (int): 세그먼트 최대 추정 토큰 수
+        
+    Returns:
+        list: 세그먼트 리스트 (이어 붙이면 원문의 줄바꿈 구조가 유지됨)
+    """
+    parts = re.split(r'(\n+)', text)
+    units = []
+    for paragraph, separator in zip(parts[0::2], parts[1::2] + ['']):
+        if estimate_tokens(paragraph) > max_tokens:
+            sentences = split_into_sentences(paragraph)
+            units.extend(sentence + ' ' for sentence in sentences[:-1])
+            if sentences:
+                units.append(sentences[-1] + separator)
+        else:
+            units.append(paragraph + separator)
+    
+    segments = []
+    current = ""
+    current_tokens = 0
+    for unit in units:
+        unit_tokens = estimate_tokens(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            segments.append(current)
+            current = ""
+            current_tokens = 0
+        current += unit
+        current_tokens += unit_tokens
+    if current:
+        segments.append(current)
+    return segments
@@ -2,21 +2,15 @@
 
 import os
 from dotenv import load_dotenv
-import requests
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from concurrent.futures import ThreadPoolExecutor
 import logging
-import textwrap
-import nltk
-from nltk.tokenize import sent_tokenize
-from transformers import AutoTokenizer
+from .translation_memory import TranslationMemory
+from .text_utils import estimate_tokens, split_into_segments
+from .http_client import upstage_client
 
 # .env 파일 로드
 load_dotenv()
 
-# NLTK 데이터 다운로드
-nltk.download('punkt')
-
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s [%(levelname)s] %(message)s',
@@ -26,58 +20,132 @@ logging.basicConfig(
     ]
 )
 
-API_KEY = os.getenv("UPSTAGE_API_KEY")
-API_URL = "https://api.upstage.ai/v1/chat/completions"
+TRANSLATION_MODEL = "solar-pro2-preview"
+SEGMENT_MAX_TOKENS = 500  # 세그먼트(번역 요청 1회) 최대 입력 토큰 수
+MIN_OUTPUT_TOKENS = 1000  # 번역 요청의 최소 max_tokens
+SEGMENT_WORKERS = 4  # 세그먼트 동시 번역 수 (전체 공유)
+REQUEST_TIMEOUT = 60  # 번역 API 요청 타임아웃(초)
 
-def split_into_sentences(text):
-    """
-    텍스트를 문장 단위로 분리합니다.
-    
-    Args:
-        text (str): 분리할 텍스트
-        
-    Returns:
-        list: 문장 단위로 분리된 리스트
-    """
-    # 문장 분리
-    sentences = sent_tokenize(text)
-    
-    # 각 문장의 앞뒤 공백 제거
-    sentences = [sentence.strip() for sentence in sentences]
-    
-    # 빈 문장 제거
-    sentences = [sentence for sentence in sentences if sentence]
-    
-    return sentences
+# 번역 메모리 (문서 전체 + 문단 세그먼트 단위)
+translation_memory = TranslationMemory()
+
+# 세그먼트 번역용 공유 executor
+segment_executor = ThreadPoolExecutor(max_workers=SEGMENT_WORKERS)
 
-def translate_text(text, target_language="ko"):
-    """텍스트를 지정된 언어로 번역합니다."""
+def request_translation(text, target_language="ko"):
+    """번역 API를 호출합니다. 실패하면 None을 반환합니다."""
     try:
-        response = requests.post(
-            API_URL,
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            },
+        response = upstage_client.post(
+            "chat/completions",
             json={
-                "model": "solar-pro2-preview",
+                "model": TRANSLATION_MODEL,
                 "messages": [
                     {"role": "system", "content": f"다음 텍스트를 {target_language}로 번역해주세요."},
                     {"role": "user", "content": text}
                 ],
                 "temperature": 0.7,
-                "max_tokens": 1000
-            }
+                # 출력이 잘리지 않도록 입력 길이에 비례하여 설정
+                "max_tokens": max(MIN_OUTPUT_TOKENS, estimate_tokens(text) * 3)
+            },
+            timeout=REQUEST_TIMEOUT
         )
         
         if response.status_code == 200:
             response_data = response.json()
             if 'choices' in response_data and len(response_data['choices']) > 0:
                 return response_data['choices'][0]['message']['content'].strip()
-        return text
+        return None
+    except Exception as e:
+        print(f"Error in request_translation: {str(e)}")
+        return None
+
+def translate_segment(segment, source_language, target_language):
+    """
+    세그먼트 하나를 번역 메모리를 거쳐 번역합니다. 앞뒤 공백/줄바꿈은 그대로 유지합니다.
+    
+    Returns:
+        tuple: (번역문, 성공 여부) - 실패하면 원문을 그대로 반환
+    """
+    body = segment.strip()
+    if not body:
+        return segment, True
+    leading = segment[:len(segment) - len(segment.lstrip())]
+    trailing = segment[len(segment.rstrip()):]
+    
+    translated = translation_memory.get(body, source_language, target_language, TRANSLATION_MODEL)
+    if translated is None:
+        translated = request_translation(body, target_language)
+        if translated is None:
+            return segment, False  # 실패한 세그먼트는 원문 유지 (캐시하지 않음)
+        translation_memory.put(body, translated, source_language, target_language, TRANSLATION_MODEL)
+    return leading + translated + trailing, True
+
+def iter_translated_segments_with_status(text, target_language="ko", source_language="auto"):
+    """
+    iter_translated_segments와 같지만 세그먼트마다 번역 성공 여부를 함께 yield 합니다.
+    
+    Yields:
+        tuple: (번역된 세그먼트, 성공 여부) - 실패한 세그먼트는 원문
+    """
+    cached = translation_memory.get(text, source_language, target_language, TRANSLATION_MODEL)
+    if cached is not None:
+        yield cached, True
+        return
+    
+    segments = split_into_segments(text, SEGMENT_MAX_TOKENS)
+    futures = [
+        segment_executor.submit(translate_segment, segment, source_language, target_language)
+        for segment in segments
+    ]
+    
+    translated_parts = []
+    all_translated = True
+    for future in futures:
+        translated, ok = future.result()
+        all_translated = all_translated and ok
+        translated_parts.append(translated)
+        yield translated, ok
+    
+    # 모든 세그먼트가 번역된 경우에만 문서 전체를 저장
+    if all_translated:
+        translation_memory.put(text, "".join(translated_parts), source_language, target_language, TRANSLATION_MODEL)
+
+def iter_translated_segments(text, target_language="ko", source_language="auto"):
+    """
+    텍스트를 세그먼트 단위로 동시에 번역하고, 번역된 세그먼트를 원문 순서대로 yield 합니다.
+    앞부분이 끝나는 대로 바로 반환되므로 UI에서 번역이 끝나기 전부터 표시할 수 있습니다.
+    
+    Args:
+        text (str): 번역할 텍스트
+        target_language (str): 대상 언어
+        source_language (str): 원본 언어
+        
+    Yields:
+        str: 번역된 세그먼트 (이어 붙이면 전체 번역문)
+    """
+    for translated, _ in iter_translated_segments_with_status(text, target_language, source_language):
+        yield translated
+
+def translate_text_with_status(text, target_language="ko", source_language="auto"):
+    """
+    텍스트를 번역하고 모든 세그먼트가 번역되었는지 함께 반환합니다.
+    
+    Returns:
+        tuple: (번역문, 성공 여부) - 일부 세그먼트가 실패하면 해당 부분은 원문이고 성공 여부는 False
+    """
+    try:
+        parts = list(iter_translated_segments_with_status(text, target_language, source_language))
+        return "".join(translated for translated, _ in parts), all(ok for _, ok in parts)
     except Exception as e:
         print(f"Error in translate_text: {str(e)}")
-        return text
+        return text, False
+
+def translate_text(text, target_language="ko", source_language="auto"):
+    """
+    텍스트를 지정된 언어로 번역합니다.
+    번역 메모리에서 문서 전체를 먼저 찾고, 없으면 세그먼트 단위로 동시에 번역하여 순서대로 합칩니다.
+    """
+    return translate_text_with_status(text, target_language, source_language)[0]
 
 def translate_file(input_path: str, output_path: str, source_lang: str = 'en', target_lang: str = 'ko'):
     """
@@ -91,9 +159,8 @@ def translate_file(input_path: str, output_path: str, source_lang: str = 'en', t
     """
     try:
         # 파일 읽기
-        loader = TextLoader(input_path, encoding='utf-8')
-        data = loader.load()
-        text = data[0].page_content if isinstance(data, list) else data.page_content
+        with open(input_path, "r", encoding="utf-8") as f:
+            text = f.read()
         
         # 번역 수행
         translated_text = translate_text(text, target_lang)
@@ -122,7 +189,45 @@ def translate_text_direct(text: str, source_lang: str = 'en', target_lang: str =
         str: 번역된 텍스트
     """
     try:
-        return translate_text(text, target_lang)
+        return translate_text(text, target_lang, source_language=source_lang)
     except Exception as e:
         logging.error(f"Error during direct translation: {str(e)}")
         return text  # 오류 발생시 원본 텍스트 반환
+
+def pretranslate_directory(directory_path: str, source_lang: str = 'en', target_lang: str = 'ko') -> int:
+    """
+    디렉토리의 모든 txt 문서를 미리 번역하여 번역 메모리에 저장합니다.
+    (검색된 문서를 번역할 때 API 호출 없이 바로 반환되도록)
+    
+    Args:
+        directory_path (str): 문서 디렉토리 경로
+        source_lang (str): 원본 언어
+        target_lang (str): 대상 언어
+        
+    Returns:
+        int: 새로 번역한 문서 수
+    """
+    filenames = sorted(f for f in os.listdir(directory_path) if f.endswith('.txt'))
+    translated = 0
+    for i, filename in enumerate(filenames, 1):
+        with open(os.path.join(directory_path, filename), 'r', encoding='utf-8') as f:
+            text = f.read()
+        if translation_memory.get(text, source_lang, target_lang, TRANSLATION_MODEL) is not None:
+            continue
+        translate_text_direct(text, source_lang=source_lang, target_lang=target_lang)
+        translated += 1
+        logging.info(f"사전 번역 {i}/{len(filenames)}: {filename}")
+    return translated
+
+if __name__ == "__main__":
+    import argparse
+    
+    # 사용법: python -m utils.translation documents --source en --target ko
+    parser = argparse.ArgumentParser(description="문서 코퍼스 사전 번역")
+    parser.add_argument("directory", nargs="?", default="documents")
+    parser.add_argument("--source", default="en")
+    parser.add_argument("--target", default="ko")
+    args = parser.parse_args()
+    
+    count = pretranslate_directory(args.directory, args.source, args.target)
+    print(f"{count}개 문서를 새로 번역했습니다. (번역 메모리: {translation_memory.count()}개 항목)")
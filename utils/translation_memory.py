@@ -0,0 +1,83 @@
+import os
+import time
+import hashlib
+import sqlite3
+from typing import Optional
+
+
+class TranslationMemory:
+    """
+    번역 결과 저장소 (SQLite)
+
+    (원문 해시, 원본 언어, 대상 언어, 모델)을 키로 번역문을 저장합니다.
+    문서 전체와 문단 단위 세그먼트를 같은 테이블에 저장하므로,
+    일부만 겹치는 텍스트도 이미 번역된 세그먼트는 재사용됩니다.
+    유효 기간이 지났거나 최대 개수를 넘은 번역은 저장할 때 오래된 것부터 삭제됩니다.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, ttl_seconds: float = 90 * 24 * 3600, max_items: int = 100000):
+        """
+        db_path: SQLite 파일 경로 (기본값: /tmp/translation_memory.db)
+        ttl_seconds: 번역 유효 기간(초)
+        max_items: 유지할 최대 번역 수 (문서와 세그먼트 포함)
+        """
+        if db_path is None:
+            db_path = os.path.join("/tmp", "translation_memory.db")
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_items = max_items
+
+        # 데이터베이스 디렉토리 생성
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    source_hash TEXT NOT NULL,
+                    source_lang TEXT NOT NULL,
+                    target_lang TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (source_hash, source_lang, target_lang, model)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_created_at ON translations (created_at)")
+            conn.commit()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """원문 해시 (번역 키)"""
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, text: str, source_lang: str, target_lang: str, model: str) -> Optional[str]:
+        """저장된 번역문을 반환하고, 없거나 만료되었으면 None을 반환합니다."""
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute("""
+                SELECT translation FROM translations
+                WHERE source_hash = ? AND source_lang = ? AND target_lang = ? AND model = ?
+                AND created_at >= ?
+            """, (self.hash_text(text), source_lang, target_lang, model, time.time() - self.ttl_seconds)).fetchone()
+        return row[0] if row else None
+
+    def put(self, text: str, translation: str, source_lang: str, target_lang: str, model: str):
+        """번역문을 저장하고, 만료되었거나 최신 max_items개 밖인 번역을 삭제합니다."""
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO translations
+                (source_hash, source_lang, target_lang, model, translation, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (self.hash_text(text), source_lang, target_lang, model, translation, now))
+            conn.execute("DELETE FROM translations WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute("""
+                DELETE FROM translations WHERE created_at < (
+                    SELECT created_at FROM translations ORDER BY created_at DESC LIMIT 1 OFFSET ?
+                )
+            """, (self.max_items - 1,))
+            conn.commit()
+
+    def count(self) -> int:
+        """저장된 번역 수"""
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]